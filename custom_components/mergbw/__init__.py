@@ -1,12 +1,442 @@
-
 """MeRGBW Light integration."""
+import asyncio
+import contextlib
 import logging
+import time
+from datetime import timedelta
+
+import voluptuous as vol
+
+from bleak_retry_connector import BleakClientWithServiceCache, establish_connection
 
+from homeassistant.components import bluetooth
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_MAC, CONF_NAME, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers import issue_registry as ir
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    CONF_DEVICES,
+    CONF_PROFILE,
+    CONF_UNDETECTED,
+    DATA_AUDIO,
+    DATA_CONNECT_SLOTS,
+    DATA_LIGHTS,
+    DATA_METRICS,
+    DATA_PRESETS,
+    DATA_PROFILING,
+    DATA_SCHEDULER,
+    DATA_SNAPSHOTS,
+    DATA_TRACER,
+    DOMAIN,
+    PROFILE_AUTO,
+    SERVICE_APPLY_PRESET,
+    SERVICE_PROFILE,
+    SERVICE_QUERY_METRICS,
+    SERVICE_RESTORE,
+    SERVICE_SAVE_PRESET,
+    SERVICE_SET_TRACING,
+    SERVICE_SNAPSHOT,
+    SERVICE_START_AUDIO,
+    SERVICE_STOP_AUDIO,
+    SERVICE_SYNC_SCENE,
+)
+from .audio import DEFAULT_BLOCK_SIZE, DEFAULT_CHANNELS, DEFAULT_SAMPLE_RATE, AudioReactiveEngine, async_open_source
+from .detect import async_detect_profile
+from .hub import entry_devices, is_hub
+from .metrics_store import RESOLUTIONS, MetricsStore
+from .presets import PresetLibrary
+from .profiler import MAX_DURATION_SECONDS, PROFILE_MODE_CPU, PROFILE_MODES, async_profile
+from .protocol import get_profile
+from .scheduler import WriteScheduler
+from .sync import STAGE_TIMEOUT_SECONDS, async_synchronized_apply
+from .tracing import DEFAULT_BACKUPS, DEFAULT_MAX_BYTES, JsonLinesExporter, MemoryExporter, Tracer
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+# Connection attempts in flight at once across all lights. Persistent lights
+# of a large hub all connect at startup; bounding this keeps adapters and
+# proxies from being flooded with simultaneous connects.
+MAX_CONCURRENT_CONNECTS = 3
+
+AUDIO_STOP_TIMEOUT_SECONDS = 2.0
+
+TRACE_FILE = "mergbw_traces.jsonl"
+
+METRICS_FILE = "mergbw_metrics.bin"
+METRICS_FLUSH_INTERVAL = timedelta(minutes=10)
+
+# How long snapshot keeps the lights connected for the flash and the restore.
+SNAPSHOT_HOLD_SECONDS = 60
+DEFAULT_SNAPSHOT = "default"
+
+PRESETS_STORAGE_KEY = f"{DOMAIN}.presets"
+PRESETS_STORAGE_VERSION = 1
+
+SERVICE_PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("duration", default=60): vol.All(vol.Coerce(float), vol.Range(min=1, max=MAX_DURATION_SECONDS)),
+        vol.Optional("mode", default=PROFILE_MODE_CPU): vol.In(PROFILE_MODES),
+    }
+)
+
+SERVICE_SYNC_SCENE_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required("entity_id"): cv.entity_ids,
+            vol.Exclusive("scene_name", "scene"): cv.string,
+            vol.Exclusive("scene_id", "scene"): vol.Coerce(int),
+            vol.Optional("scene_param"): vol.Coerce(int),
+            vol.Optional("stage_timeout", default=STAGE_TIMEOUT_SECONDS): vol.All(
+                vol.Coerce(float), vol.Range(min=1, max=120)
+            ),
+        }
+    ),
+    cv.has_at_least_one_key("scene_name", "scene_id"),
+)
+
+SERVICE_SAVE_PRESET_SCHEMA = vol.Schema(
+    {
+        vol.Required("name"): cv.string,
+        vol.Optional("power"): cv.boolean,
+        vol.Exclusive("rgb_color", "mode"): vol.All(
+            vol.ExactSequence((cv.byte, cv.byte, cv.byte)), vol.Coerce(list)
+        ),
+        vol.Exclusive("scene_name", "mode"): cv.string,
+        vol.Exclusive("scene_id", "mode"): vol.Coerce(int),
+        vol.Exclusive("music_mode", "mode"): vol.Any(vol.Coerce(int), cv.string),
+        vol.Optional("scene_param"): vol.Coerce(int),
+        vol.Optional("brightness"): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+    }
+)
+
+SERVICE_APPLY_PRESET_SCHEMA = vol.Schema(
+    {
+        vol.Required("name"): cv.string,
+        vol.Required("entity_id"): cv.entity_ids,
+    }
+)
+
+SERVICE_SET_TRACING_SCHEMA = vol.Schema(
+    {
+        vol.Required("enabled"): cv.boolean,
+        vol.Optional("file", default=False): cv.boolean,
+        vol.Optional("max_bytes", default=DEFAULT_MAX_BYTES): vol.All(vol.Coerce(int), vol.Range(min=64 * 1024)),
+        vol.Optional("backups", default=DEFAULT_BACKUPS): vol.All(vol.Coerce(int), vol.Range(min=0, max=20)),
+    }
+)
+
+SERVICE_SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Required("entity_id"): cv.entity_ids,
+        vol.Optional("snapshot_id", default=DEFAULT_SNAPSHOT): cv.string,
+        vol.Optional("hold", default=SNAPSHOT_HOLD_SECONDS): vol.All(vol.Coerce(float), vol.Range(min=0, max=600)),
+    }
+)
+
+SERVICE_RESTORE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("snapshot_id", default=DEFAULT_SNAPSHOT): cv.string,
+        vol.Optional("entity_id"): cv.entity_ids,
+    }
+)
+
+SERVICE_QUERY_METRICS_SCHEMA = vol.Schema(
+    {
+        vol.Optional("key"): cv.string,
+        vol.Optional("resolution", default="hour"): vol.In(list(RESOLUTIONS)),
+        vol.Optional("count"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    }
+)
+
+SERVICE_START_AUDIO_SCHEMA = vol.Schema(
+    {
+        vol.Required("entity_id"): cv.entity_ids,
+        vol.Required("source"): cv.string,
+        vol.Optional("sample_rate", default=DEFAULT_SAMPLE_RATE): vol.All(vol.Coerce(int), vol.Range(min=8000)),
+        vol.Optional("channels", default=DEFAULT_CHANNELS): vol.All(vol.Coerce(int), vol.Range(min=1, max=8)),
+        vol.Optional("block_size", default=DEFAULT_BLOCK_SIZE): vol.All(vol.Coerce(int), vol.Range(min=128, max=16384)),
+    }
+)
+
+
+def _async_get_loaded_entity_ids(hass: HomeAssistant) -> set:
+    return {light.entity_id for light in hass.data.get(DOMAIN, {}).get(DATA_LIGHTS, {}).values()}
+
+
+def _async_get_lights(hass: HomeAssistant, entity_ids) -> list:
+    """Return the MeRGBW lights for ``entity_ids``; raise if any is not one."""
+    lights = {light.entity_id: light for light in hass.data.get(DOMAIN, {}).get(DATA_LIGHTS, {}).values()}
+    unknown = [entity_id for entity_id in entity_ids if entity_id not in lights]
+    if unknown:
+        raise HomeAssistantError(f"Not MeRGBW lights: {', '.join(unknown)}")
+    return [lights[entity_id] for entity_id in entity_ids]
+
+
+def _service_span(hass: HomeAssistant, call: ServiceCall):
+    """Open the root span of an integration-wide service call when tracing."""
+    tracer = hass.data.get(DOMAIN, {}).get(DATA_TRACER)
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.start(call.service, context_id=call.context.id, entity_ids=call.data.get("entity_id"))
+
+
+async def _async_get_presets(hass: HomeAssistant) -> tuple[PresetLibrary, Store]:
+    """Return the preset library, loading it from storage on first use."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_PRESETS not in domain_data:
+        store = Store(hass, PRESETS_STORAGE_VERSION, PRESETS_STORAGE_KEY)
+        library = PresetLibrary.from_dict(await store.async_load())
+        domain_data.setdefault(DATA_PRESETS, (library, store))
+    return domain_data[DATA_PRESETS]
+
+
+async def async_setup(hass: HomeAssistant, config) -> bool:
+    """Register integration-wide services."""
+
+    async def _async_handle_profile(call: ServiceCall) -> None:
+        domain_data = hass.data.setdefault(DOMAIN, {})
+        if domain_data.get(DATA_PROFILING):
+            raise HomeAssistantError("A MeRGBW profile is already running.")
+        domain_data[DATA_PROFILING] = True
+        try:
+            await async_profile(hass, call.data["duration"], call.data["mode"])
+        except ValueError as err:
+            raise HomeAssistantError(f"Cannot start the MeRGBW profile: {err}") from err
+        finally:
+            domain_data[DATA_PROFILING] = False
+
+    async def _async_handle_sync_scene(call: ServiceCall) -> ServiceResponse:
+        lights = _async_get_lights(hass, call.data["entity_id"])
+        participants = {
+            light.entity_id: light.sync_scene_participant(
+                call.data.get("scene_name"),
+                call.data.get("scene_id"),
+                call.data.get("scene_param"),
+                call.data["stage_timeout"],
+            )
+            for light in lights
+        }
+        with _service_span(hass, call):
+            return await async_synchronized_apply(participants, call.data["stage_timeout"])
+
+    async def _async_handle_save_preset(call: ServiceCall) -> None:
+        library, store = await _async_get_presets(hass)
+        definition = {key: value for key, value in call.data.items() if key != "name"}
+        try:
+            library.save(call.data["name"], definition)
+        except ValueError as err:
+            raise HomeAssistantError(f"Invalid preset '{call.data['name']}': {err}") from err
+        await store.async_save(library.to_dict())
+
+    async def _async_handle_apply_preset(call: ServiceCall) -> None:
+        library, _store = await _async_get_presets(hass)
+        name = call.data["name"]
+        if name not in library:
+            raise HomeAssistantError(f"Unknown preset '{name}'")
+        lights = _async_get_lights(hass, call.data["entity_id"])
+        try:
+            bundles = [(light, library.bundle(name, light.profile_key)) for light in lights]
+        except ValueError as err:
+            raise HomeAssistantError(str(err)) from err
+        with _service_span(hass, call):
+            await asyncio.gather(*(light.async_apply_preset(bundle) for light, bundle in bundles))
+
+    async def _async_handle_snapshot(call: ServiceCall) -> ServiceResponse:
+        lights = _async_get_lights(hass, call.data["entity_id"])
+        # Capture before connecting: connection changes can write state.
+        hass.data.setdefault(DOMAIN, {}).setdefault(DATA_SNAPSHOTS, {})[call.data["snapshot_id"]] = {
+            light.entity_id: light.snapshot() for light in lights
+        }
+        results = await asyncio.gather(
+            *(light.async_prewarm(call.data["hold"]) for light in lights), return_exceptions=True
+        )
+        unreachable = {}
+        for light, result in zip(lights, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning("Cannot pre-connect %s for snapshot: %s", light.entity_id, result)
+                unreachable[light.entity_id] = str(result)
+        return {"captured": [light.entity_id for light in lights], "unreachable": unreachable}
+
+    async def _async_handle_restore(call: ServiceCall) -> ServiceResponse:
+        snapshots = hass.data.get(DOMAIN, {}).get(DATA_SNAPSHOTS, {})
+        snapshot = snapshots.get(call.data["snapshot_id"])
+        if snapshot is None:
+            raise HomeAssistantError(f"Unknown snapshot '{call.data['snapshot_id']}'")
+        # Without entity_id, restore every light of the snapshot that is still loaded.
+        entity_ids = call.data.get("entity_id") or sorted(snapshot.keys() & _async_get_loaded_entity_ids(hass))
+        lights = _async_get_lights(hass, entity_ids)
+        missing = [light.entity_id for light in lights if light.entity_id not in snapshot]
+        if missing:
+            raise HomeAssistantError(f"Not in snapshot '{call.data['snapshot_id']}': {', '.join(missing)}")
+        started = time.perf_counter()
+        with _service_span(hass, call):
+            results = await asyncio.gather(
+                *(light.async_restore_snapshot(snapshot[light.entity_id]) for light in lights),
+                return_exceptions=True,
+            )
+        restored, failed = {}, {}
+        for light, result in zip(lights, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning("Cannot restore %s: %s", light.entity_id, result)
+                failed[light.entity_id] = str(result)
+            else:
+                restored[light.entity_id] = result
+                # Restored lights leave the snapshot; failed ones stay for a retry.
+                del snapshot[light.entity_id]
+        if not snapshot:
+            del snapshots[call.data["snapshot_id"]]
+        return {
+            "restored": restored,
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    async def _async_handle_query_metrics(call: ServiceCall) -> ServiceResponse:
+        store = hass.data.get(DOMAIN, {}).get(DATA_METRICS)
+        if store is None:
+            raise HomeAssistantError("The MeRGBW metrics store is not open.")
+        key = call.data.get("key")
+        if key is None:
+            return {"keys": {name: store.summary(name) for name in store.keys()}}
+        if key.startswith("light."):
+            key = _async_get_lights(hass, [key])[0].unique_id
+        return {
+            "key": key,
+            "summary": store.summary(key),
+            "buckets": store.buckets(key, call.data["resolution"], call.data.get("count")),
+        }
+
+    async def _async_handle_start_audio(call: ServiceCall) -> None:
+        domain_data = hass.data.setdefault(DOMAIN, {})
+        lights = _async_get_lights(hass, call.data["entity_id"])
+        if DATA_AUDIO in domain_data:
+            await _async_stop_audio(hass)
+        try:
+            source = await async_open_source(call.data["source"], call.data["sample_rate"], call.data["channels"])
+        except (OSError, ValueError) as err:
+            raise HomeAssistantError(f"Cannot open audio source {call.data['source']}: {err}") from err
+        try:
+            engine = AudioReactiveEngine(source, [light.audio_stream() for light in lights], call.data["block_size"])
+        except ImportError as err:
+            await source.close()
+            raise HomeAssistantError("Audio-reactive mode needs numpy") from err
+        task = hass.async_create_background_task(engine.run(), f"{DOMAIN} audio reactive")
+        domain_data[DATA_AUDIO] = (engine, task)
+
+    async def _async_handle_stop_audio(call: ServiceCall) -> ServiceResponse:
+        return await _async_stop_audio(hass)
+
+    async def _async_handle_set_tracing(call: ServiceCall) -> None:
+        domain_data = hass.data.setdefault(DOMAIN, {})
+        previous = domain_data.pop(DATA_TRACER, None)
+        if previous is not None:
+            previous.close()
+        if not call.data["enabled"]:
+            return
+        exporters = [MemoryExporter()]
+        if call.data["file"]:
+            exporters.append(
+                JsonLinesExporter(hass.config.path(TRACE_FILE), call.data["max_bytes"], call.data["backups"])
+            )
+        domain_data[DATA_TRACER] = Tracer(exporters)
+
+    hass.services.async_register(DOMAIN, SERVICE_PROFILE, _async_handle_profile, schema=SERVICE_PROFILE_SCHEMA)
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SYNC_SCENE,
+        _async_handle_sync_scene,
+        schema=SERVICE_SYNC_SCENE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_SAVE_PRESET, _async_handle_save_preset, schema=SERVICE_SAVE_PRESET_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_APPLY_PRESET, _async_handle_apply_preset, schema=SERVICE_APPLY_PRESET_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_START_AUDIO, _async_handle_start_audio, schema=SERVICE_START_AUDIO_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_STOP_AUDIO, _async_handle_stop_audio, supports_response=SupportsResponse.OPTIONAL
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_TRACING, _async_handle_set_tracing, schema=SERVICE_SET_TRACING_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SNAPSHOT,
+        _async_handle_snapshot,
+        schema=SERVICE_SNAPSHOT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_QUERY_METRICS,
+        _async_handle_query_metrics,
+        schema=SERVICE_QUERY_METRICS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RESTORE,
+        _async_handle_restore,
+        schema=SERVICE_RESTORE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    return True
+
+
+async def _async_stop_audio(hass: HomeAssistant) -> dict:
+    """Stop the running audio-reactive engine and return its report."""
+    running = hass.data.get(DOMAIN, {}).pop(DATA_AUDIO, None)
+    if running is None:
+        return {}
+    engine, task = running
+    engine.stop()
+    # A socket source may be blocked waiting for data; do not wait on it forever.
+    await asyncio.wait({task}, timeout=AUDIO_STOP_TIMEOUT_SECONDS)
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is not None:
+        _LOGGER.warning("Audio-reactive mode ended with an error: %s", task.exception())
+    return engine.report()
+
+
+async def _async_open_metrics(hass: HomeAssistant) -> None:
+    """Open the metrics store for the lifetime of Home Assistant.
+
+    Records go to the mapped pages from the event loop; the pages are
+    flushed to disk from an executor every few minutes and on shutdown.
+    """
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    domain_data[DATA_METRICS] = None
+    try:
+        store = await hass.async_add_executor_job(MetricsStore, hass.config.path(METRICS_FILE))
+    except (OSError, ValueError) as err:
+        _LOGGER.warning("Cannot open MeRGBW metrics file, long-term metrics are off: %s", err)
+        return
+    domain_data[DATA_METRICS] = store
+
+    async def _async_flush(_now) -> None:
+        await hass.async_add_executor_job(store.flush)
+
+    unsub_flush = async_track_time_interval(hass, _async_flush, METRICS_FLUSH_INTERVAL)
+
+    async def _async_close(_event) -> None:
+        unsub_flush()
+        domain_data.pop(DATA_METRICS, None)
+        await hass.async_add_executor_job(store.close)
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_close)
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up MeRGBW Light from a config entry."""
@@ -16,10 +446,113 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         entry.title,
         entry.data,
     )
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    # One scheduler for every light so writes are shared fairly per adapter.
+    domain_data.setdefault(DATA_SCHEDULER, WriteScheduler())
+    domain_data.setdefault(DATA_LIGHTS, {})
+    domain_data.setdefault(DATA_CONNECT_SLOTS, asyncio.Semaphore(MAX_CONCURRENT_CONNECTS))
+    if DATA_METRICS not in domain_data:
+        await _async_open_metrics(hass)
     await hass.config_entries.async_forward_entry_setups(entry, ["light"])
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+    if _pending_detection(entry):
+        # Detection connects to every pending light, so it must not hold up
+        # setup; storing a result updates the entry, which reloads it.
+        entry.async_create_background_task(
+            hass, _async_detect_profiles(hass, entry), f"{DOMAIN} detect profiles {entry.entry_id}"
+        )
     return True
 
 
+def _pending_detection(entry: ConfigEntry) -> dict[str, str]:
+    """Return ``{mac: name}`` of the entry's lights that still need detection."""
+    return {
+        device[CONF_MAC]: device[CONF_NAME]
+        for device in entry_devices(entry.data)
+        if device[CONF_PROFILE] == PROFILE_AUTO and not device[CONF_UNDETECTED]
+    }
+
+
+async def _async_detect_profiles(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Probe lights configured for auto-detection and store the result in the entry.
+
+    Detected profiles replace ``auto`` in the entry data, so each light is
+    probed once. A light that was reached but sent no decisive report is
+    marked undetected in the entry and keeps the default profile without
+    being probed again; a light that could not be reached is tried again at
+    the next setup. A repair issue names both.
+    """
+    pending = _pending_detection(entry)
+    slots = hass.data[DOMAIN][DATA_CONNECT_SLOTS]
+    results = await asyncio.gather(*(_async_probe_profile(hass, mac, slots) for mac in pending))
+    detected = {mac: profile for mac, (_reached, profile) in zip(pending, results) if profile is not None}
+    undetected = {mac for mac, (reached, profile) in zip(pending, results) if reached and profile is None}
+    for mac, name in pending.items():
+        issue_id = f"profile_not_detected_{mac}"
+        if mac in detected:
+            ir.async_delete_issue(hass, DOMAIN, issue_id)
+            continue
+        _LOGGER.warning("Could not detect the profile of %s (%s); using %s", name, mac, get_profile(None).name)
+        ir.async_create_issue(
+            hass,
+            DOMAIN,
+            issue_id,
+            is_fixable=False,
+            severity=ir.IssueSeverity.WARNING,
+            translation_key="profile_not_detected",
+            translation_placeholders={"name": name, "mac": mac},
+        )
+    if not detected and not undetected:
+        return
+
+    def _result(device: dict) -> dict:
+        mac = device[CONF_MAC]
+        if mac in detected:
+            return {**device, CONF_PROFILE: detected[mac]}
+        if mac in undetected:
+            return {**device, CONF_UNDETECTED: True}
+        return device
+
+    if is_hub(entry.data):
+        data = {**entry.data, CONF_DEVICES: [_result(device) for device in entry.data[CONF_DEVICES]]}
+    else:
+        data = _result(dict(entry.data))
+    _LOGGER.info("Detected MeRGBW profiles: %s; undetected: %s", detected, sorted(undetected))
+    hass.config_entries.async_update_entry(entry, data=data)
+
+
+async def _async_probe_profile(
+    hass: HomeAssistant, mac: str, slots: asyncio.Semaphore
+) -> tuple[bool, str | None]:
+    """Connect to one light, probe its profile and disconnect.
+
+    Returns ``(reached, profile)``; ``profile`` is None when the light was
+    not reached or sent no decisive report.
+    """
+    device = bluetooth.async_ble_device_from_address(hass, mac, connectable=True)
+    if device is None:
+        _LOGGER.warning("Cannot detect profile of %s: device not in range", mac)
+        return False, None
+    async with slots:
+        try:
+            client = await establish_connection(BleakClientWithServiceCache, device, mac)
+        except Exception as err:  # noqa: BLE001 - detection is retried on the next setup
+            _LOGGER.warning("Cannot detect profile of %s: %s", mac, err)
+            return False, None
+        try:
+            return True, await async_detect_profile(client)
+        except Exception as err:  # noqa: BLE001 - detection is retried on the next setup
+            _LOGGER.warning("Profile probe of %s failed: %s", mac, err)
+            return False, None
+        finally:
+            await client.disconnect()
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     return await hass.config_entries.async_forward_entry_unload(entry, "light")
@@ -0,0 +1,339 @@
+"""Integration-side audio-reactive mode driven by a local PCM stream.
+
+Signed 16-bit PCM is read in fixed blocks from a WAV file, a raw file or
+named pipe, or a TCP/unix socket. Each block is windowed and transformed
+with one NumPy FFT; band energies come from a single matrix product with a
+precomputed band table, and are normalised by a slowly decaying peak of the
+loudest band so quiet and loud sources both use the full range. Every light gets the newest
+colour/brightness frame only: while a write is in flight newer frames replace
+the pending one, so BLE back-pressure drops frames instead of building lag.
+
+NumPy is imported when an analyzer is created, so the integration loads
+without it.
+"""
+
+import asyncio
+import colorsys
+import logging
+import os
+import time
+import wave
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CHANNELS = 1
+DEFAULT_BLOCK_SIZE = 1024
+# Band edges in Hz: sub-bass, bass, low mids, mids, presence, brilliance.
+DEFAULT_BANDS = ((20, 60), (60, 250), (250, 500), (500, 2000), (2000, 6000), (6000, 16000))
+# Peak follower decay per block; lower values adapt faster to level changes.
+PEAK_DECAY = 0.995
+MIN_BRIGHTNESS = 8
+# Brightness is quantised so noise-level changes do not cost a write.
+BRIGHTNESS_STEP = 8
+# Timing samples kept for the report.
+STATS_SAMPLES = 2048
+
+RGB = Tuple[int, int, int]
+
+
+class _FileSource:
+    """WAV file, raw PCM file or named pipe, read in an executor."""
+
+    def __init__(self, path: str, sample_rate: int, channels: int) -> None:
+        # Only a regular file is read faster than real time; a named pipe is paced by its writer.
+        self.realtime = os.path.isfile(path)
+        if path.lower().endswith(".wav"):
+            self._wav = wave.open(path, "rb")
+            if self._wav.getsampwidth() != 2:
+                self._wav.close()
+                raise ValueError("only 16-bit PCM WAV files are supported")
+            self.sample_rate = self._wav.getframerate()
+            self.channels = self._wav.getnchannels()
+            self._handle = None
+        else:
+            self._wav = None
+            # Unbuffered so a named pipe hands over data as soon as it is written.
+            self._handle = open(path, "rb", buffering=0)  # noqa: SIM115 - closed in close()
+            self.sample_rate = sample_rate
+            self.channels = channels
+
+    def _read(self, frames: int) -> bytes:
+        if self._wav is not None:
+            return self._wav.readframes(frames)
+        wanted = frames * 2 * self.channels
+        chunks = []
+        while wanted > 0:
+            chunk = self._handle.read(wanted)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            wanted -= len(chunk)
+        return b"".join(chunks)
+
+    async def read_block(self, frames: int) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(None, self._read, frames)
+
+    async def close(self) -> None:
+        (self._wav or self._handle).close()
+
+
+class _StreamSource:
+    """PCM from a TCP or unix socket; the sender paces the stream."""
+
+    realtime = False
+
+    def __init__(self, reader: asyncio.StreamReader, writer, sample_rate: int, channels: int) -> None:
+        self._reader = reader
+        self._writer = writer
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    async def read_block(self, frames: int) -> bytes:
+        try:
+            return await self._reader.readexactly(frames * 2 * self.channels)
+        except asyncio.IncompleteReadError as err:
+            return err.partial
+
+    async def close(self) -> None:
+        self._writer.close()
+
+
+async def async_open_source(
+    uri: str,
+    sample_rate: int = DEFAULT_SAMPLE_RATE,
+    channels: int = DEFAULT_CHANNELS,
+):
+    """Open ``tcp://host:port``, ``unix:///path`` or a file/FIFO path.
+
+    ``sample_rate`` and ``channels`` describe raw streams; WAV files carry
+    their own.
+    """
+    if uri.startswith("tcp://"):
+        host, _, port = uri[len("tcp://"):].rpartition(":")
+        reader, writer = await asyncio.open_connection(host, int(port))
+        return _StreamSource(reader, writer, sample_rate, channels)
+    if uri.startswith("unix://"):
+        reader, writer = await asyncio.open_unix_connection(uri[len("unix://"):])
+        return _StreamSource(reader, writer, sample_rate, channels)
+    # Opening a FIFO blocks until a writer appears.
+    return await asyncio.get_running_loop().run_in_executor(None, _FileSource, uri, sample_rate, channels)
+
+
+class BandAnalyzer:
+    """Normalised band levels (0..1) for blocks of int16 PCM."""
+
+    def __init__(
+        self,
+        sample_rate: int,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        channels: int = 1,
+        bands: Sequence[Tuple[float, float]] = DEFAULT_BANDS,
+    ) -> None:
+        import numpy as np  # Optional dependency, only needed for audio mode.
+
+        self._np = np
+        self.block_size = block_size
+        self.channels = channels
+        self._window = np.hanning(block_size).astype(np.float32)
+        freqs = np.fft.rfftfreq(block_size, 1.0 / sample_rate)
+        # bands x bins averaging matrix: every band energy in one product.
+        table = np.stack([((freqs >= low) & (freqs < high)).astype(np.float32) for low, high in bands])
+        self._table = table / np.maximum(table.sum(axis=1, keepdims=True), 1.0)
+        self._block = np.zeros(block_size, dtype=np.float32)
+        self._peak = 1e-9
+
+    def analyze(self, pcm: bytes):
+        np = self._np
+        samples = np.frombuffer(pcm[: len(pcm) - len(pcm) % (2 * self.channels)], dtype="<i2")
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        count = min(len(samples), self.block_size)
+        self._block[:count] = samples[:count]
+        self._block[count:] = 0.0
+        spectrum = np.abs(np.fft.rfft(self._block * self._window)) ** 2
+        energy = self._table @ spectrum
+        self._peak = max(float(energy.max()), self._peak * PEAK_DECAY)
+        # Amplitude rather than power, relative to the recent loudest band.
+        return np.sqrt(energy / self._peak)
+
+
+def map_levels(levels, index: int = 0, count: int = 1) -> Tuple[RGB, int]:
+    """Colour from the dominant band, brightness from the light's own band.
+
+    With several lights each follows a different band and their hues are
+    spread around the dominant one, so a wall of panels shows the spectrum.
+    """
+    bands = len(levels)
+    dominant = int(levels.argmax())
+    hue = ((dominant + index / max(count, 1)) / bands) % 1.0
+    level = float(levels[index % bands]) if count > 1 else float(levels.mean())
+    red, green, blue = colorsys.hsv_to_rgb(hue, 1.0, 1.0)
+    brightness = MIN_BRIGHTNESS + int(level * (255 - MIN_BRIGHTNESS)) // BRIGHTNESS_STEP * BRIGHTNESS_STEP
+    return (int(red * 255), int(green * 255), int(blue * 255)), brightness
+
+
+class LightStream:
+    """Send the newest frame to one light, dropping frames it cannot keep up with."""
+
+    def __init__(
+        self,
+        name: str,
+        encode: Callable[[RGB, int], List[bytes]],
+        send: Callable[[List[bytes]], Awaitable[None]],
+        changed: Optional[Callable[[List[bytes]], List[bytes]]] = None,
+        close: Optional[Callable[[], None]] = None,
+        tables=None,
+    ) -> None:
+        self.name = name
+        # Colour tables the engine applies before offering a frame; ``encode`` gets corrected colours.
+        self.tables = tables
+        self._encode = encode
+        self._send = send
+        self._changed = changed
+        self._close = close
+        self._pending: Optional[Tuple[RGB, int, float]] = None
+        self._wake = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.sent = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.errors = 0
+        self.latencies: deque = deque(maxlen=STATS_SAMPLES)
+
+    def offer(self, rgb: RGB, brightness: int, captured_at: float) -> None:
+        """Queue a frame, replacing one that has not been sent yet."""
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = (rgb, brightness, captured_at)
+        self._idle.clear()
+        self._wake.set()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await self._wake.wait()
+                self._wake.clear()
+                pending, self._pending = self._pending, None
+                if pending is not None:
+                    await self._deliver(*pending)
+                if self._pending is None:
+                    self._idle.set()
+        finally:
+            if self._close is not None:
+                self._close()
+
+    async def _deliver(self, rgb: RGB, brightness: int, captured_at: float) -> None:
+        packets = self._encode(rgb, brightness)
+        if self._changed is not None:
+            packets = self._changed(packets)
+        if not packets:
+            self.skipped += 1
+            return
+        try:
+            await self._send(packets)
+        except Exception as err:  # noqa: BLE001 - keep streaming to the other lights
+            self.errors += 1
+            _LOGGER.debug("Audio frame to %s failed: %s", self.name, err)
+            return
+        self.sent += 1
+        self.latencies.append(time.perf_counter() - captured_at)
+
+    async def drain(self) -> None:
+        await self._idle.wait()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "dropped": self.dropped, "skipped": self.skipped, "errors": self.errors}
+
+
+def _summary_ms(samples) -> dict:
+    if not samples:
+        return {"mean": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+class AudioReactiveEngine:
+    """Read blocks from a source, analyse them and feed every light stream."""
+
+    def __init__(
+        self,
+        source,
+        streams: Sequence[LightStream],
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        bands: Sequence[Tuple[float, float]] = DEFAULT_BANDS,
+        realtime: Optional[bool] = None,
+    ) -> None:
+        self.source = source
+        self.streams = list(streams)
+        self.block_size = block_size
+        self.analyzer = BandAnalyzer(source.sample_rate, block_size, source.channels, bands)
+        # Files are played at their own pace; sockets and pipes pace themselves.
+        self.realtime = getattr(source, "realtime", False) if realtime is None else realtime
+        self.blocks = 0
+        self.analysis: deque = deque(maxlen=STATS_SAMPLES)
+        self._stopping = False
+        # Streams sharing colour tables are corrected in one batch per block.
+        groups: Dict[int, Tuple[object, List[int]]] = {}
+        for index, stream in enumerate(self.streams):
+            if stream.tables is not None:
+                groups.setdefault(id(stream.tables), (stream.tables, []))[1].append(index)
+        self._calibration_groups = list(groups.values())
+
+    def _frames(self, levels) -> List[Tuple[RGB, int]]:
+        """Map the levels to one calibrated frame per stream."""
+        count = len(self.streams)
+        frames = [map_levels(levels, index, count) for index in range(count)]
+        for tables, indices in self._calibration_groups:
+            corrected = tables.correct_many([frames[index][0] for index in indices])
+            for index, rgb in zip(indices, corrected):
+                frames[index] = (tuple(int(value) for value in rgb), frames[index][1])
+        return frames
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    async def run(self) -> dict:
+        """Stream until the source ends or :meth:`stop` is called; return the report."""
+        senders = [asyncio.ensure_future(stream.run()) for stream in self.streams]
+        block_s = self.block_size / self.source.sample_rate
+        start = time.perf_counter()
+        try:
+            while not self._stopping:
+                pcm = await self.source.read_block(self.block_size)
+                if not pcm:
+                    break
+                if self.realtime:
+                    await asyncio.sleep(max(0.0, start + (self.blocks + 1) * block_s - time.perf_counter()))
+                captured = time.perf_counter()
+                levels = self.analyzer.analyze(pcm)
+                self.analysis.append(time.perf_counter() - captured)
+                self.blocks += 1
+                for stream, (rgb, brightness) in zip(self.streams, self._frames(levels)):
+                    stream.offer(rgb, brightness, captured)
+                # Let the senders pick up frames before the next block.
+                await asyncio.sleep(0)
+            await asyncio.gather(*(stream.drain() for stream in self.streams))
+        finally:
+            for sender in senders:
+                sender.cancel()
+            await self.source.close()
+        return self.report()
+
+    def report(self) -> dict:
+        latencies = [sample for stream in self.streams for sample in stream.latencies]
+        lights: Dict[str, dict] = {stream.name: stream.stats() for stream in self.streams}
+        return {
+            "blocks": self.blocks,
+            "block_ms": round(self.block_size / self.source.sample_rate * 1000, 3),
+            "analysis_ms": _summary_ms(self.analysis),
+            "latency_ms": _summary_ms(latencies),
+            "lights": lights,
+        }
@@ -0,0 +1,165 @@
+"""Per-device colour calibration precomputed into lookup tables.
+
+A light's gamma, channel gains and hue offset are folded into integer tables
+once, when the light is set up. Correcting a colour then costs three table
+lookups (or nine lookups and additions with a hue offset) instead of
+floating-point maths on every frame. Lights with the same calibration share
+their tables, so the audio engine corrects their frames in one NumPy batch,
+and uncalibrated lights keep the shared profile untouched.
+"""
+
+import math
+from dataclasses import asdict, dataclass, fields
+from functools import lru_cache
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+from .protocol import ProtocolProfile
+
+RGB = Tuple[int, int, int]
+# Matrix tables hold contributions scaled by 2**8 so the sum rounds once.
+_FRACTION_BITS = 8
+_HALF = 1 << (_FRACTION_BITS - 1)
+
+
+@dataclass(frozen=True)
+class Calibration:
+    """Gamma exponent, per-channel gains and a hue rotation in degrees."""
+
+    gamma: float = 1.0
+    red_gain: float = 1.0
+    green_gain: float = 1.0
+    blue_gain: float = 1.0
+    hue_offset: int = 0
+
+    def __post_init__(self) -> None:
+        if self.gamma <= 0:
+            raise ValueError("gamma must be positive")
+        if min(self.red_gain, self.green_gain, self.blue_gain) < 0:
+            raise ValueError("channel gains must not be negative")
+
+    @classmethod
+    def from_dict(cls, data: Optional[Mapping]) -> "Calibration":
+        names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in (data or {}).items() if key in names})
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    @property
+    def identity(self) -> bool:
+        return self == Calibration()
+
+    def tables(self) -> "ColorTables":
+        return _tables(self)
+
+
+def _hue_matrix(degrees: int) -> List[List[float]]:
+    """Rotation about the grey axis of the RGB cube."""
+    angle = math.radians(degrees)
+    cos, sin = math.cos(angle), math.sin(angle)
+    third = (1 - cos) / 3
+    root = math.sqrt(1 / 3) * sin
+    return [
+        [cos + third, third - root, third + root],
+        [third + root, cos + third, third - root],
+        [third - root, third + root, cos + third],
+    ]
+
+
+def _clamp(value: int) -> int:
+    return 0 if value < 0 else 255 if value > 255 else value
+
+
+class ColorTables:
+    """Lookup tables for one calibration."""
+
+    __slots__ = ("channels", "matrix", "_arrays")
+
+    def __init__(self, calibration: Calibration) -> None:
+        gamma = [255 * (value / 255) ** calibration.gamma for value in range(256)]
+        gains = (calibration.red_gain, calibration.green_gain, calibration.blue_gain)
+        self._arrays = None
+        if calibration.hue_offset % 360 == 0:
+            self.matrix = None
+            self.channels = tuple(bytes(_clamp(round(gain * value)) for value in gamma) for gain in gains)
+            return
+        rotation = _hue_matrix(calibration.hue_offset)
+        self.channels = None
+        self.matrix = tuple(
+            tuple(
+                tuple(round(gain * rotation[out][source] * value * (1 << _FRACTION_BITS)) for value in gamma)
+                for source in range(3)
+            )
+            for out, gain in enumerate(gains)
+        )
+
+    def correct(self, r: int, g: int, b: int) -> RGB:
+        """Return the calibrated colour for one RGB value."""
+        if self.matrix is None:
+            red, green, blue = self.channels
+            return red[r], green[g], blue[b]
+        return tuple(
+            _clamp((row[0][r] + row[1][g] + row[2][b] + _HALF) >> _FRACTION_BITS) for row in self.matrix
+        )
+
+    def correct_many(self, colors: Sequence[RGB]):
+        """Calibrate a batch of colours with NumPy fancy indexing.
+
+        Returns an ``(n, 3)`` uint8 array. Without NumPy the colours are
+        corrected one by one and a list of tuples is returned.
+        """
+        try:
+            import numpy as np  # Optional dependency, only needed for batches.
+        except ImportError:
+            return [self.correct(*color) for color in colors]
+        if self._arrays is None:
+            if self.matrix is None:
+                self._arrays = np.array([list(table) for table in self.channels], dtype=np.uint8)
+            else:
+                self._arrays = np.array(self.matrix, dtype=np.int64)
+        index = np.asarray(colors, dtype=np.intp).reshape(-1, 3)
+        if self.matrix is None:
+            return np.stack([self._arrays[channel][index[:, channel]] for channel in range(3)], axis=1)
+        tables = self._arrays
+        total = tables[:, 0, index[:, 0]] + tables[:, 1, index[:, 1]] + tables[:, 2, index[:, 2]]
+        return np.clip((total + _HALF) >> _FRACTION_BITS, 0, 255).astype(np.uint8).T
+
+
+@lru_cache(maxsize=64)
+def _tables(calibration: Calibration) -> ColorTables:
+    return ColorTables(calibration)
+
+
+class CalibratedProfile:
+    """One light's view of a shared profile: colours go through its tables.
+
+    Everything but the colour builders is delegated to the shared profile.
+    ``shared`` and ``tables`` let a batch path correct colours itself and
+    encode them uncorrected.
+    """
+
+    def __init__(self, profile: ProtocolProfile, calibration: Calibration) -> None:
+        self.shared = profile
+        self.calibration = calibration
+        self.tables = calibration.tables()
+
+    def __getattr__(self, name):
+        return getattr(self.shared, name)
+
+    def build_color(self, r: int, g: int, b: int) -> List[bytes]:
+        return self.shared.build_color(*self.tables.correct(r, g, b))
+
+    def build_white(self) -> List[bytes]:
+        return self.build_color(255, 255, 255)
+
+    def build_colors(self, colors: Sequence[RGB]) -> List[List[bytes]]:
+        """Encode a batch of colours, e.g. a precomputed frame sequence."""
+        build = self.shared.build_color
+        return [build(*(int(value) for value in color)) for color in self.tables.correct_many(colors)]
+
+
+def calibrate(profile: ProtocolProfile, calibration: Optional[Calibration]):
+    """Return ``profile`` itself when uncalibrated, else a calibrated view of it."""
+    if calibration is None or calibration.identity:
+        return profile
+    return CalibratedProfile(profile, calibration)
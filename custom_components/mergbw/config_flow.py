@@ -5,7 +5,9 @@ import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.components import bluetooth
-from homeassistant.const import CONF_MAC
+from homeassistant.const import CONF_MAC, CONF_NAME
+from homeassistant.core import callback
+from homeassistant.data_entry_flow import AbortFlow
 from homeassistant.helpers.selector import (
     SelectOptionDict,
     SelectSelector,
@@ -15,12 +17,19 @@ from homeassistant.helpers.selector import (
 )
 
 from .const import (
+    CONF_DEVICES,
+    CONF_OPTIMISTIC,
+    CONF_PERSISTENT,
     CONF_PROFILE,
-    DEFAULT_PROFILE,
+    DEFAULT_OPTIMISTIC,
+    DEFAULT_PERSISTENT,
     DOMAIN,
-    SERVICE_UUID,
+    HUB_UNIQUE_ID,
+    PROFILE_AUTO,
 )
-from .protocol import list_profiles, PROFILE_HEXAGON
+from .discovery import async_get_discovery_index, guess_profile
+from .hub import configured_addresses, entry_devices, is_hub
+from .protocol import list_profiles
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -30,25 +39,29 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_PUSH
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Return the options flow handler."""
+        if is_hub(config_entry.data):
+            return MeRGBWHubOptionsFlow()
+        return MeRGBWOptionsFlow()
+
     def _discover_devices(self):
-        service_uuid = SERVICE_UUID
-        devices = {}
-        for info in bluetooth.async_discovered_service_info(self.hass, connectable=True):
-            uuids = {s.lower() for s in (info.service_uuids or [])}
-            name = info.name or ""
-            if service_uuid.lower() not in uuids and not any(
-                hint in name.lower() for hint in ("hexagon", "sunset")
-            ):
-                continue
-            label = f"{info.name or 'Unknown'} ({info.address})"
-            devices[label] = info.address
-        return devices
+        """Return ``{label: address}`` for MeRGBW lights currently in range."""
+        return {light.label: light.address for light in _discovered_lights(self.hass)}
+
+    def _hub_entry(self):
+        """Return the hub entry, if one exists."""
+        return next((entry for entry in self._async_current_entries() if is_hub(entry.data)), None)
+
+    def _abort_if_owned_by_hub(self, address: str) -> None:
+        hub = self._hub_entry()
+        if hub is not None and address.upper() in configured_addresses([hub]):
+            raise AbortFlow("already_configured")
 
     def _guess_profile(self, name: str) -> str:
-        lower = (name or "").lower()
-        if "hexagon" in lower:
-            return PROFILE_HEXAGON
-        return DEFAULT_PROFILE
+        return guess_profile(name)
 
     async def async_step_bluetooth(self, discovery_info):
         """Handle bluetooth discovery to auto-create an entry."""
@@ -56,6 +69,7 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         name = discovery_info.name or "MeRGBW Light"
         await self.async_set_unique_id(address)
         self._abort_if_unique_id_configured()
+        self._abort_if_owned_by_hub(address)
 
         profile_key = self._guess_profile(discovery_info.name or "")
         return self.async_create_entry(
@@ -73,7 +87,9 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             source = user_input.get("device_source")
             mac = None
-            profile_key = user_input.get(CONF_PROFILE, DEFAULT_PROFILE)
+            profile_key = user_input.get(CONF_PROFILE, PROFILE_AUTO)
+            if source == "hub":
+                return await self.async_step_hub()
             if source == "manual":
                 mac = user_input.get(CONF_MAC)
                 if not mac:
@@ -81,6 +97,7 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 else:
                     await self.async_set_unique_id(mac)
                     self._abort_if_unique_id_configured()
+                    self._abort_if_owned_by_hub(mac)
                     user_input[CONF_MAC] = mac
                     return self.async_create_entry(title="MeRGBW Light", data=user_input)
             else:
@@ -88,16 +105,17 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 if not mac:
                     errors["base"] = "no_mac"
                 else:
-                    # If profile left at default, guess based on the label.
-                    if profile_key == DEFAULT_PROFILE:
+                    # If profile left at auto-detect, guess based on the label first.
+                    if profile_key == PROFILE_AUTO:
                         guessed = self._guess_profile(source or "")
                         user_input[CONF_PROFILE] = guessed
                     user_input[CONF_MAC] = mac
                     await self.async_set_unique_id(mac)
                     self._abort_if_unique_id_configured()
+                    self._abort_if_owned_by_hub(mac)
                     return self.async_create_entry(title="MeRGBW Light", data=user_input)
 
-        profile_options = {key: label for key, label in list_profiles()}
+        profile_options = _profile_options()
         discovered = self._discover_devices()
         if discovered:
             # Preselect first device and its guessed profile.
@@ -105,6 +123,7 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             guessed_profile = self._guess_profile(first_label)
             device_options = [SelectOptionDict(value=label, label=label) for label in discovered.keys()]
             device_options.append(SelectOptionDict(value="manual", label="Manual entry"))
+            device_options.append(SelectOptionDict(value="hub", label="Hub (several lights)"))
             data_schema = vol.Schema(
                 {
                     vol.Required(
@@ -138,15 +157,18 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                         default="manual",
                     ): SelectSelector(
                             SelectSelectorConfig(
-                                options=[SelectOptionDict(value="manual", label="Manual entry")],
+                                options=[
+                                    SelectOptionDict(value="manual", label="Manual entry"),
+                                    SelectOptionDict(value="hub", label="Hub (several lights)"),
+                                ],
                                 mode=SelectSelectorMode.DROPDOWN,
                                 translation_key="device",
                             )
                         ),
-                    vol.Required(CONF_MAC): TextSelector(),
+                    vol.Optional(CONF_MAC): TextSelector(),
                     vol.Required(
                         CONF_PROFILE,
-                        default=DEFAULT_PROFILE,
+                        default=PROFILE_AUTO,
                     ): SelectSelector(
                         SelectSelectorConfig(
                             options=[SelectOptionDict(value=k, label=v) for k, v in profile_options.items()],
@@ -161,3 +183,164 @@ class MeRGBWLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=data_schema,
             errors=errors,
         )
+
+    async def async_step_hub(self, user_input=None):
+        """Create one entry that owns many lights."""
+        if self._hub_entry() is not None:
+            return self.async_abort(reason="already_configured")
+        taken = configured_addresses(self._async_current_entries())
+        lights = {light.address: light for light in _discovered_lights(self.hass) if light.address.upper() not in taken}
+        errors = {}
+        if user_input is not None:
+            devices = [
+                {CONF_MAC: address, CONF_PROFILE: lights[address].profile, CONF_NAME: lights[address].name}
+                for address in user_input.get(CONF_DEVICES, [])
+                if address in lights
+            ]
+            devices.extend(
+                {CONF_MAC: mac, CONF_PROFILE: user_input.get(CONF_PROFILE, PROFILE_AUTO)}
+                for mac in _parse_macs(user_input.get(CONF_MAC, ""))
+                if mac not in taken
+            )
+            if devices:
+                await self.async_set_unique_id(HUB_UNIQUE_ID)
+                self._abort_if_unique_id_configured()
+                return self.async_create_entry(title="MeRGBW Hub", data={CONF_DEVICES: devices})
+            errors["base"] = "no_mac"
+
+        return self.async_show_form(
+            step_id="hub",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(CONF_DEVICES, default=list(lights)): _device_selector(lights.values()),
+                    vol.Optional(CONF_MAC): TextSelector(),
+                    vol.Required(CONF_PROFILE, default=PROFILE_AUTO): _profile_selector(),
+                }
+            ),
+            errors=errors,
+        )
+
+
+def _discovered_lights(hass):
+    """Return MeRGBW lights currently in range, strongest first."""
+    index = async_get_discovery_index(hass)
+
+    def present(address: str) -> bool:
+        return bluetooth.async_address_present(hass, address, connectable=True)
+
+    return index.candidates(present)
+
+
+def _parse_macs(value: str) -> list[str]:
+    """Split a comma or whitespace separated list of MAC addresses."""
+    return [mac.upper() for mac in value.replace(",", " ").split()]
+
+
+def _device_selector(lights) -> SelectSelector:
+    return SelectSelector(
+        SelectSelectorConfig(
+            options=[SelectOptionDict(value=light.address, label=light.label) for light in lights],
+            multiple=True,
+            mode=SelectSelectorMode.LIST,
+        )
+    )
+
+
+def _profile_options() -> dict:
+    """Return ``{profile_key: label}`` including auto-detection."""
+    return {PROFILE_AUTO: "Auto-detect", **dict(list_profiles())}
+
+
+def _profile_selector() -> SelectSelector:
+    return SelectSelector(
+        SelectSelectorConfig(
+            options=[SelectOptionDict(value=k, label=v) for k, v in _profile_options().items()],
+            mode=SelectSelectorMode.DROPDOWN,
+            translation_key="profile",
+        )
+    )
+
+
+class MeRGBWOptionsFlow(config_entries.OptionsFlow):
+    """Per-light options."""
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_OPTIMISTIC,
+                        default=options.get(CONF_OPTIMISTIC, DEFAULT_OPTIMISTIC),
+                    ): bool,
+                    vol.Optional(
+                        CONF_PERSISTENT,
+                        default=options.get(CONF_PERSISTENT, DEFAULT_PERSISTENT),
+                    ): bool,
+                }
+            ),
+        )
+
+
+class MeRGBWHubOptionsFlow(config_entries.OptionsFlow):
+    """Hub options: shared light options plus the set of lights it owns."""
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options and the hub's lights."""
+        entry = self.config_entry
+        current = {device[CONF_MAC]: device for device in entry_devices(entry.data)}
+        others = [other for other in self.hass.config_entries.async_entries(DOMAIN) if other.entry_id != entry.entry_id]
+        taken = configured_addresses(others)
+        discovered = {
+            light.address: light
+            for light in _discovered_lights(self.hass)
+            if light.address.upper() not in taken and light.address not in current
+        }
+        errors = {}
+        if user_input is not None:
+            options = {key: value for key, value in user_input.items() if key != CONF_DEVICES}
+            devices = []
+            for address in user_input.get(CONF_DEVICES, list(current)):
+                if address in current:
+                    devices.append(current[address])
+                elif address in discovered:
+                    light = discovered[address]
+                    devices.append({CONF_MAC: address, CONF_PROFILE: light.profile, CONF_NAME: light.name})
+            if devices:
+                # Data and options change in one update, so the entry reloads once;
+                # finishing the flow then finds the options unchanged.
+                self.hass.config_entries.async_update_entry(
+                    entry, data={**entry.data, CONF_DEVICES: devices}, options=options
+                )
+                return self.async_create_entry(title="", data=options)
+            errors[CONF_DEVICES] = "no_devices"
+
+        options = user_input or entry.options
+        device_options = [
+            SelectOptionDict(value=address, label=f"{device[CONF_NAME]} ({address})")
+            for address, device in current.items()
+        ]
+        device_options.extend(SelectOptionDict(value=light.address, label=light.label) for light in discovered.values())
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(CONF_DEVICES, default=list(current)): SelectSelector(
+                        SelectSelectorConfig(options=device_options, multiple=True, mode=SelectSelectorMode.LIST)
+                    ),
+                    vol.Optional(
+                        CONF_OPTIMISTIC,
+                        default=options.get(CONF_OPTIMISTIC, DEFAULT_OPTIMISTIC),
+                    ): bool,
+                    vol.Optional(
+                        CONF_PERSISTENT,
+                        default=options.get(CONF_PERSISTENT, DEFAULT_PERSISTENT),
+                    ): bool,
+                }
+            ),
+            errors=errors,
+        )
@@ -3,9 +3,55 @@
 DOMAIN = "mergbw"
 CONF_PROFILE = "profile"
 DEFAULT_PROFILE = "sunset_light"
+# Probe the light once at setup and store the detected profile in the entry.
+PROFILE_AUTO = "auto"
+# Set on an auto light that was reached but sent no decisive report: it keeps
+# the default profile and is not probed again.
+CONF_UNDETECTED = "undetected"
+# Hub entries list their lights under CONF_DEVICES instead of a single CONF_MAC.
+CONF_DEVICES = "devices"
+HUB_UNIQUE_ID = "hub"
+# Options
+CONF_OPTIMISTIC = "optimistic"
+DEFAULT_OPTIMISTIC = False
+CONF_PERSISTENT = "persistent"
+DEFAULT_PERSISTENT = False
+# Colour calibration, stored with the light in the entry data.
+CONF_CALIBRATION = "calibration"
 SERVICE_UUID = "0000fff0-0000-1000-8000-00805f9b34fb"
 # Hexagon-only services (will be no-ops for default profile)
 SERVICE_SET_SCENE_ID = "set_scene_id"
 SERVICE_SET_MUSIC_MODE = "set_music_mode"
 SERVICE_SET_MUSIC_SENSITIVITY = "set_music_sensitivity"
 SERVICE_SET_SCHEDULE = "set_schedule"
+SERVICE_SET_POWER_SCHEDULE = "set_power_schedule"
+SERVICE_SET_CALIBRATION = "set_calibration"
+# Entity services for every profile
+SERVICE_SET_CIRCADIAN = "set_circadian"
+# Integration-wide services (mergbw domain)
+SERVICE_PROFILE = "profile"
+SERVICE_SYNC_SCENE = "sync_scene"
+SERVICE_SAVE_PRESET = "save_preset"
+SERVICE_APPLY_PRESET = "apply_preset"
+SERVICE_START_AUDIO = "start_audio"
+SERVICE_STOP_AUDIO = "stop_audio"
+SERVICE_SET_TRACING = "set_tracing"
+SERVICE_SNAPSHOT = "snapshot"
+SERVICE_RESTORE = "restore"
+SERVICE_QUERY_METRICS = "query_metrics"
+
+# Keys in hass.data[DOMAIN]
+DATA_SCHEDULER = "scheduler"
+DATA_LIGHTS = "lights"
+DATA_CIRCADIAN = "circadian"
+DATA_CIRCADIAN_ENROLLED = "circadian_enrolled"
+DATA_CIRCADIAN_TICK = "circadian_tick"
+DATA_PROFILING = "profiling"
+DATA_DISCOVERY = "discovery"
+DATA_CONNECT_SLOTS = "connect_slots"
+DATA_PRESETS = "presets"
+DATA_AUDIO = "audio"
+DATA_SCHEDULES = "schedules"
+DATA_TRACER = "tracer"
+DATA_SNAPSHOTS = "snapshots"
+DATA_METRICS = "metrics"
@@ -1,53 +1,116 @@
 
-from typing import Iterable
+from typing import Iterable, List, Optional, Tuple
 
 from .protocol import ProtocolProfile
+from .transport import DeviceTransport
 
 
-async def _send_packets(client, packets: Iterable[bytes], write_uuid: str):
+async def _send_packets(
+    client,
+    packets: Iterable[bytes],
+    write_uuid: str,
+    transport: Optional[DeviceTransport] = None,
+):
+    if transport is not None:
+        await transport.send(client, list(packets), write_uuid)
+        return
     for packet in packets:
         await client.write_gatt_char(write_uuid, packet)
 
 
-async def turn_on(client, profile: ProtocolProfile):
-    await _send_packets(client, profile.build_power(True), profile.write_char_uuid)
+def build_turn_on(
+    profile: ProtocolProfile,
+    rgb: Optional[Tuple[int, int, int]] = None,
+    effect: Optional[str] = None,
+    brightness: Optional[int] = None,
+) -> List[bytes]:
+    """Build every packet for a turn_on call so it can go out as one transaction."""
+    packets = list(profile.build_power(True))
+    if rgb is not None:
+        packets.extend(profile.build_color(*rgb))
+    elif effect is not None:
+        packets.extend(profile.build_scene(effect))
+    if brightness is not None:
+        packets.extend(profile.build_brightness(brightness))
+    return packets
+
+
+async def send(
+    client,
+    profile: ProtocolProfile,
+    packets: List[bytes],
+    transport: Optional[DeviceTransport] = None,
+):
+    await _send_packets(client, packets, profile.write_char_uuid, transport)
+
+
+async def turn_on(client, profile: ProtocolProfile, transport: Optional[DeviceTransport] = None):
+    await _send_packets(client, profile.build_power(True), profile.write_char_uuid, transport)
 
 
-async def turn_off(client, profile: ProtocolProfile):
-    await _send_packets(client, profile.build_power(False), profile.write_char_uuid)
+async def turn_off(client, profile: ProtocolProfile, transport: Optional[DeviceTransport] = None):
+    await _send_packets(client, profile.build_power(False), profile.write_char_uuid, transport)
 
 
-async def set_white(client, profile: ProtocolProfile):
-    await _send_packets(client, profile.build_white(), profile.write_char_uuid)
+async def set_white(client, profile: ProtocolProfile, transport: Optional[DeviceTransport] = None):
+    await _send_packets(client, profile.build_white(), profile.write_char_uuid, transport)
 
 
-async def set_scene(client, profile: ProtocolProfile, scene_name: str):
+async def set_scene(
+    client,
+    profile: ProtocolProfile,
+    scene_name: str,
+    transport: Optional[DeviceTransport] = None,
+):
     packets = profile.build_scene(scene_name)
     if packets:
-        await _send_packets(client, packets, profile.write_char_uuid)
+        await _send_packets(client, packets, profile.write_char_uuid, transport)
 
 
-async def set_color(client, profile: ProtocolProfile, r: int, g: int, b: int):
-    await _send_packets(client, profile.build_color(r, g, b), profile.write_char_uuid)
+async def set_color(
+    client,
+    profile: ProtocolProfile,
+    r: int,
+    g: int,
+    b: int,
+    transport: Optional[DeviceTransport] = None,
+):
+    await _send_packets(client, profile.build_color(r, g, b), profile.write_char_uuid, transport)
 
 
-async def set_brightness(client, profile: ProtocolProfile, brightness: int):
-    await _send_packets(client, profile.build_brightness(brightness), profile.write_char_uuid)
+async def set_brightness(
+    client,
+    profile: ProtocolProfile,
+    brightness: int,
+    transport: Optional[DeviceTransport] = None,
+):
+    await _send_packets(client, profile.build_brightness(brightness), profile.write_char_uuid, transport)
 
 
-async def set_scene_id(client, profile: ProtocolProfile, scene_id: int, param: int | None):
+async def set_scene_id(
+    client,
+    profile: ProtocolProfile,
+    scene_id: int,
+    param: int | None,
+    transport: Optional[DeviceTransport] = None,
+):
     if hasattr(profile, "build_scene_by_id"):
-        await _send_packets(client, profile.build_scene_by_id(scene_id, param), profile.write_char_uuid)
+        await _send_packets(client, profile.build_scene_by_id(scene_id, param), profile.write_char_uuid, transport)
 
 
-async def set_music_mode(client, profile: ProtocolProfile, mode):
+async def set_music_mode(client, profile: ProtocolProfile, mode, transport: Optional[DeviceTransport] = None):
     if hasattr(profile, "build_music_mode"):
-        await _send_packets(client, profile.build_music_mode(mode), profile.write_char_uuid)
+        await _send_packets(client, profile.build_music_mode(mode), profile.write_char_uuid, transport)
 
 
-async def set_music_sensitivity(client, profile: ProtocolProfile, value: int):
+async def set_music_sensitivity(
+    client,
+    profile: ProtocolProfile,
+    value: int,
+    transport: Optional[DeviceTransport] = None,
+):
     if hasattr(profile, "build_music_sensitivity"):
-        await _send_packets(client, profile.build_music_sensitivity(value), profile.write_char_uuid)
+        await _send_packets(client, profile.build_music_sensitivity(value), profile.write_char_uuid, transport)
 
 
 async def set_schedule(
@@ -61,6 +124,7 @@ async def set_schedule(
     off_hour: int,
     off_minute: int,
     off_days_mask: int,
+    transport: Optional[DeviceTransport] = None,
 ):
     if hasattr(profile, "build_schedule"):
         await _send_packets(
@@ -76,4 +140,5 @@ async def set_schedule(
                 off_days_mask,
             ),
             profile.write_char_uuid,
+            transport,
         )
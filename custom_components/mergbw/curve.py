@@ -0,0 +1,129 @@
+"""Circadian curve engine driving many MeRGBW lights with minimal traffic."""
+
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+CURVE_INTERVAL_SECONDS = 60
+DEFAULT_MIN_KELVIN = 2200
+DEFAULT_MAX_KELVIN = 5500
+DEFAULT_MIN_BRIGHTNESS = 40
+DEFAULT_MAX_BRIGHTNESS = 255
+DEFAULT_PEAK_HOUR = 13.0
+
+
+def kelvin_to_rgb(kelvin: float) -> Tuple[int, int, int]:
+    """Approximate the RGB color of a black body at ``kelvin``."""
+    temp = kelvin / 100
+    if temp <= 66:
+        red = 255.0
+        green = 99.4708025861 * math.log(temp) - 161.1195681661
+    else:
+        red = 329.698727446 * ((temp - 60) ** -0.1332047592)
+        green = 288.1221695283 * ((temp - 60) ** -0.0755148492)
+    if temp >= 66:
+        blue = 255.0
+    elif temp <= 19:
+        blue = 0.0
+    else:
+        blue = 138.5177312231 * math.log(temp - 10) - 305.0447927307
+    return tuple(max(0, min(255, int(round(c)))) for c in (red, green, blue))
+
+
+class CircadianCurve:
+    """Daylight-shaped curve: warm and dim at night, cool and bright at the peak."""
+
+    def __init__(
+        self,
+        min_kelvin: int = DEFAULT_MIN_KELVIN,
+        max_kelvin: int = DEFAULT_MAX_KELVIN,
+        min_brightness: int = DEFAULT_MIN_BRIGHTNESS,
+        max_brightness: int = DEFAULT_MAX_BRIGHTNESS,
+        peak_hour: float = DEFAULT_PEAK_HOUR,
+    ) -> None:
+        self.min_kelvin = min_kelvin
+        self.max_kelvin = max_kelvin
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.peak_hour = peak_hour
+
+    def target(self, now: datetime) -> Tuple[Tuple[int, int, int], int]:
+        """Return ``(rgb, brightness)`` for the given local time."""
+        hours = now.hour + now.minute / 60 + now.second / 3600
+        level = (1 + math.cos(2 * math.pi * (hours - self.peak_hour) / 24)) / 2
+        kelvin = self.min_kelvin + (self.max_kelvin - self.min_kelvin) * level
+        brightness = round(self.min_brightness + (self.max_brightness - self.min_brightness) * level)
+        return kelvin_to_rgb(kelvin), brightness
+
+
+class CircadianEngine:
+    """Apply one curve to every enrolled light per tick.
+
+    The target is computed once per tick and encoded once per profile
+    instance, since packets only depend on the profile (and a light's
+    calibration, which gives it its own instance). Each light then compares those frames
+    with the last frames its transport wrote for the same commands; lights
+    whose device-unit values did not change after quantization are skipped.
+    """
+
+    def __init__(self, curve: CircadianCurve | None = None) -> None:
+        self.curve = curve or CircadianCurve()
+        self._lights: Dict[str, object] = {}
+        self.ticks = 0
+        self.sent = 0
+        self.skipped = 0
+
+    def add(self, light) -> None:
+        self._lights[light.unique_id] = light
+
+    def remove(self, light) -> None:
+        self._lights.pop(light.unique_id, None)
+
+    def __contains__(self, light) -> bool:
+        return self._lights.get(light.unique_id) is light
+
+    def __len__(self) -> int:
+        return len(self._lights)
+
+    async def async_tick(self, now: datetime) -> None:
+        """Push the curve value for ``now`` to lights whose device state differs."""
+        if not self._lights:
+            return
+        self.ticks += 1
+        rgb, brightness = self.curve.target(now)
+        # Keyed by profile instance: calibrated lights have their own.
+        encoded: Dict[int, List[bytes]] = {}
+        pending = []
+        for light in self._lights.values():
+            if not light.is_on:
+                continue
+            profile = light.profile
+            packets = encoded.get(id(profile))
+            if packets is None:
+                packets = encoded[id(profile)] = (
+                    profile.build_color(*rgb) + profile.build_brightness(brightness)
+                )
+            changed = light.transport.changed_frames(packets)
+            if not changed:
+                self.skipped += 1
+                continue
+            self.sent += 1
+            pending.append(light.async_apply_curve(changed, rgb, brightness))
+        if not pending:
+            return
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.warning("Circadian update failed: %s", result)
+
+    def diagnostics(self) -> dict:
+        return {
+            "lights": len(self._lights),
+            "ticks": self.ticks,
+            "updates_sent": self.sent,
+            "updates_skipped": self.skipped,
+        }
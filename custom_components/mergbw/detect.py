@@ -0,0 +1,96 @@
+"""Detect a light's protocol profile by probing it over GATT.
+
+Both profiles share the fff0 service and the fff3/fff4 characteristics, so
+the service table only tells whether a device is a MeRGBW light at all. The
+profile is told apart by the shape of the state reports on the notify
+characteristic: Hexagon firmware reports 16-bit brightness and HSV colour and
+knows the music commands, Sunset firmware reports 8-bit values.
+
+Detection only listens: nothing is written to the light, so a light that
+sends no report while subscribed cannot be told apart and is left undecided.
+"""
+
+import asyncio
+import logging
+from typing import Iterable, Optional, Tuple
+
+from .protocol import PROFILE_HEXAGON, PROFILE_SUNSET, decode_packet, get_profile, split_frames
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait for a state report after subscribing.
+LISTEN_SECONDS = 3.0
+
+# Commands only the Hexagon firmware uses (music mode/sensitivity, schedule,
+# scene parameter).
+_HEXAGON_ONLY = frozenset({0x07, 0x08, 0x0A, 0x0F})
+# Report payload lengths per command.
+_HEXAGON_SHAPES = {0x03: 4, 0x05: 2, 0x06: 2}
+_SUNSET_SHAPES = {0x03: 3, 0x05: 1, 0x06: 1}
+
+
+def classify_report(cmd: int, payload: bytes) -> Optional[str]:
+    """Return the profile a single decoded report implies, if it is decisive."""
+    if cmd in _HEXAGON_ONLY or _HEXAGON_SHAPES.get(cmd) == len(payload):
+        return PROFILE_HEXAGON
+    if _SUNSET_SHAPES.get(cmd) == len(payload):
+        return PROFILE_SUNSET
+    return None
+
+
+def classify_reports(reports: Iterable[Tuple[int, bytes]]) -> Optional[str]:
+    """Return the profile implied by the first decisive report."""
+    for cmd, payload in reports:
+        profile = classify_report(cmd, payload)
+        if profile is not None:
+            return profile
+    return None
+
+
+def has_mergbw_characteristics(client) -> bool:
+    """Return True if the client's service table has the MeRGBW characteristics.
+
+    Clients without a resolved service table are given the benefit of the doubt.
+    """
+    services = getattr(client, "services", None)
+    if services is None:
+        return True
+    profile = get_profile(None)
+    return all(
+        services.get_characteristic(uuid) is not None
+        for uuid in (profile.write_char_uuid, profile.notify_char_uuid)
+    )
+
+
+async def async_detect_profile(client, listen: float = LISTEN_SECONDS) -> Optional[str]:
+    """Return the profile key of a connected light from its state reports.
+
+    Returns None if it is not a MeRGBW light or sent no decisive report
+    within ``listen`` seconds.
+    """
+    if not has_mergbw_characteristics(client):
+        _LOGGER.debug("%s lacks the MeRGBW characteristics", getattr(client, "address", client))
+        return None
+    profile = get_profile(None)
+    detected: list = []
+    decided = asyncio.Event()
+
+    def _on_notify(_sender, data: bytearray) -> None:
+        decoded = (decode_packet(frame) for frame in split_frames(bytes(data)))
+        result = classify_reports(report for report in decoded if report is not None)
+        if result is not None and not detected:
+            detected.append(result)
+            decided.set()
+
+    await client.start_notify(profile.notify_char_uuid, _on_notify)
+    try:
+        await asyncio.wait_for(decided.wait(), listen)
+    except asyncio.TimeoutError:
+        _LOGGER.debug("%s sent no state report within %ss", getattr(client, "address", client), listen)
+        return None
+    finally:
+        try:
+            await client.stop_notify(profile.notify_char_uuid)
+        except Exception as err:  # noqa: BLE001 - the link is torn down next anyway
+            _LOGGER.debug("stop_notify failed: %s", err)
+    return detected[0]
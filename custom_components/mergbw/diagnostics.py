@@ -0,0 +1,83 @@
+"""Diagnostics support for MeRGBW Light."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_MAC
+from homeassistant.core import HomeAssistant
+
+from .const import DATA_CIRCADIAN, DATA_LIGHTS, DATA_METRICS, DATA_SCHEDULER, DATA_TRACER, DOMAIN
+from .hub import entry_devices, is_hub
+
+TO_REDACT = {CONF_MAC, "address"}
+
+
+def _relabel(mapping: dict, labels: dict) -> dict:
+    """Replace MAC keys with the entry's light labels; drop other lights' MACs."""
+    return {labels.get(key, key): value for key, value in mapping.items() if key in labels or ":" not in key}
+
+
+def _relabel_span(span: dict, adapters: dict) -> dict:
+    attributes = span["attributes"]
+    if "adapter" not in attributes:
+        return span
+    return {**span, "attributes": {**attributes, "adapter": adapters.get(attributes["adapter"])}}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return diagnostics for a config entry.
+
+    MAC addresses are redacted; the entry's lights are listed as
+    ``light_1``, ``light_2``, ... in the order of the entry data, and
+    adapters and proxies as ``adapter_1``, ``adapter_2``, ...
+    """
+    domain_data = hass.data.get(DOMAIN, {})
+    lights = domain_data.get(DATA_LIGHTS, {})
+    devices = {}
+    labels = {}
+    for index, device in enumerate(entry_devices(entry.data), 1):
+        light = lights.get(device[CONF_MAC])
+        labels[device[CONF_MAC]] = f"light_{index}"
+        devices[device[CONF_MAC]] = light.diagnostics() if light else None
+    scheduler = domain_data.get(DATA_SCHEDULER)
+    circadian = domain_data.get(DATA_CIRCADIAN)
+    scheduler_queues = scheduler.metrics() if scheduler else {}
+    # Adapters or proxies that reached one of this entry's lights.
+    reached = {light["transport"]["adapter"] for light in devices.values() if light} - {None}
+    # Adapter sources are MACs or proxy names: list them as adapter_1, adapter_2, ...
+    sources = sorted(reached | set(filter(None, scheduler_queues)))
+    adapters = {source: f"adapter_{index}" for index, source in enumerate(sources, 1)}
+    for light in devices.values():
+        if light:
+            transport = light["transport"]
+            light["transport"] = {**transport, "adapter": adapters.get(transport["adapter"])}
+    device_data = (
+        {"devices": _relabel(devices, labels)} if is_hub(entry.data) else {"device": next(iter(devices.values()))}
+    )
+    scheduler_metrics = {
+        adapters.get(adapter, adapter): {**queue, "device_writes": _relabel(queue["device_writes"], labels)}
+        for adapter, queue in scheduler_queues.items()
+    }
+    tracer = domain_data.get(DATA_TRACER)
+    store = domain_data.get(DATA_METRICS)
+    metrics = None
+    if store is not None:
+        metrics = _relabel({key: store.summary(key) for key in devices}, labels)
+        for source in sorted(reached):
+            if f"adapter:{source}" in store:
+                metrics[adapters[source]] = store.summary(f"adapter:{source}")
+    memory = tracer.memory if tracer is not None else None
+    traces = None
+    if memory:
+        # Whole traces that touched one of this entry's lights.
+        spans = memory.spans(lambda span: span["attributes"].get("mac") in devices)
+        traces = [_relabel_span(span, adapters) for span in spans]
+    return async_redact_data(
+        {
+            "entry": {"title": entry.title, "data": dict(entry.data)},
+            **device_data,
+            "scheduler": scheduler_metrics,
+            "circadian": circadian.diagnostics() if circadian is not None else None,
+            "metrics": metrics,
+            "traces": traces,
+        },
+        TO_REDACT,
+    )
@@ -0,0 +1,117 @@
+"""Callback-fed index of MeRGBW lights seen by Home Assistant Bluetooth."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from homeassistant.components import bluetooth
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DATA_DISCOVERY, DOMAIN, PROFILE_AUTO, SERVICE_UUID
+from .protocol import PROFILE_HEXAGON, PROFILE_SUNSET
+
+# Runtime name matchers. Home Assistant indexes them by their first three
+# characters, so they must be literal prefixes; names with the hint further
+# in are still found through the service UUID matcher.
+NAME_PATTERNS = tuple(
+    f"{prefix}*" for name in ("Hexagon", "Sunset") for prefix in (name, name.lower(), name.upper())
+)
+NAME_HINTS = ("hexagon", "sunset")
+_SERVICE_UUID = SERVICE_UUID.lower()
+
+
+def guess_profile(name: str | None) -> str:
+    """Guess the protocol profile from an advertised name.
+
+    Generic names return ``PROFILE_AUTO`` so the light is probed at setup.
+    """
+    lower = (name or "").lower()
+    if "hexagon" in lower:
+        return PROFILE_HEXAGON
+    if "sunset" in lower:
+        return PROFILE_SUNSET
+    return PROFILE_AUTO
+
+
+def is_candidate(service_uuids, name: str | None) -> bool:
+    """Return True if an advertisement looks like a MeRGBW light."""
+    if any(uuid.lower() == _SERVICE_UUID for uuid in service_uuids or ()):
+        return True
+    lower = (name or "").lower()
+    return any(hint in lower for hint in NAME_HINTS)
+
+
+@dataclass
+class DiscoveredLight:
+    """Latest advertisement of one candidate light."""
+
+    address: str
+    name: str | None
+    rssi: int | None
+    profile: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.name or 'Unknown'} ({self.address})"
+
+
+class DiscoveryIndex:
+    """MeRGBW candidates keyed by address, updated from advertisements.
+
+    Advertisements are filtered once when they arrive, so reading the index
+    costs O(candidates) instead of a scan over every advertiser in range.
+    """
+
+    def __init__(self) -> None:
+        self._lights: dict[str, DiscoveredLight] = {}
+
+    def update(self, address: str, name: str | None, service_uuids, rssi: int | None) -> None:
+        known = self._lights.get(address)
+        if known is None:
+            if not is_candidate(service_uuids, name):
+                return
+            self._lights[address] = DiscoveredLight(address, name, rssi, guess_profile(name))
+            return
+        known.rssi = rssi
+        if name and name != known.name:
+            known.name = name
+            known.profile = guess_profile(name)
+
+    def candidates(self, present=None) -> list[DiscoveredLight]:
+        """Return candidates, strongest signal first, optionally filtered by ``present``."""
+        lights = [light for light in self._lights.values() if present is None or present(light.address)]
+        return sorted(lights, key=lambda light: light.rssi if light.rssi is not None else -999, reverse=True)
+
+
+@callback
+def async_get_discovery_index(hass: HomeAssistant) -> DiscoveryIndex:
+    """Return the shared index, creating and subscribing it on first use."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    index = domain_data.get(DATA_DISCOVERY)
+    if index is not None:
+        return index
+    index = domain_data[DATA_DISCOVERY] = DiscoveryIndex()
+
+    @callback
+    def _async_update(service_info, _change) -> None:
+        index.update(service_info.address, service_info.name, service_info.service_uuids, service_info.rssi)
+
+    for info in bluetooth.async_discovered_service_info(hass, connectable=True):
+        _async_update(info, None)
+
+    matchers = [bluetooth.BluetoothCallbackMatcher(service_uuid=SERVICE_UUID, connectable=True)]
+    matchers.extend(
+        bluetooth.BluetoothCallbackMatcher(local_name=pattern, connectable=True) for pattern in NAME_PATTERNS
+    )
+    unsubscribers = [
+        bluetooth.async_register_callback(hass, _async_update, matcher, bluetooth.BluetoothScanningMode.PASSIVE)
+        for matcher in matchers
+    ]
+
+    @callback
+    def _async_stop(_event) -> None:
+        for unsub in unsubscribers:
+            unsub()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop)
+    return index
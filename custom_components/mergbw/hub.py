@@ -0,0 +1,55 @@
+"""Helpers for single-light and hub config entries."""
+from __future__ import annotations
+
+from collections.abc import Mapping
+
+from homeassistant.const import CONF_MAC, CONF_NAME
+
+from .const import CONF_CALIBRATION, CONF_DEVICES, CONF_PROFILE, CONF_UNDETECTED, DEFAULT_PROFILE
+
+DEFAULT_NAME = "MeRGBW Light"
+
+
+def is_hub(data: Mapping) -> bool:
+    """Return True for an entry that owns several lights."""
+    return CONF_DEVICES in data
+
+
+def entry_devices(data: Mapping) -> list[dict]:
+    """Return ``[{mac, profile, name, calibration, undetected}]`` for every light of an entry."""
+    if is_hub(data):
+        return [
+            {
+                CONF_MAC: device[CONF_MAC],
+                CONF_PROFILE: device.get(CONF_PROFILE, DEFAULT_PROFILE),
+                CONF_NAME: device.get(CONF_NAME) or DEFAULT_NAME,
+                CONF_CALIBRATION: device.get(CONF_CALIBRATION),
+                CONF_UNDETECTED: device.get(CONF_UNDETECTED, False),
+            }
+            for device in data[CONF_DEVICES]
+        ]
+    return [
+        {
+            CONF_MAC: data[CONF_MAC],
+            CONF_PROFILE: data.get(CONF_PROFILE, DEFAULT_PROFILE),
+            CONF_NAME: DEFAULT_NAME,
+            CONF_CALIBRATION: data.get(CONF_CALIBRATION),
+            CONF_UNDETECTED: data.get(CONF_UNDETECTED, False),
+        }
+    ]
+
+
+def with_calibration(data: Mapping, mac: str, calibration: dict | None) -> dict:
+    """Return entry data with the calibration of light ``mac`` replaced."""
+    if not is_hub(data):
+        return {**data, CONF_CALIBRATION: calibration}
+    devices = [
+        {**device, CONF_CALIBRATION: calibration} if device[CONF_MAC] == mac else device
+        for device in data[CONF_DEVICES]
+    ]
+    return {**data, CONF_DEVICES: devices}
+
+
+def configured_addresses(entries) -> set[str]:
+    """Return the upper-cased MACs already owned by ``entries``."""
+    return {device[CONF_MAC].upper() for entry in entries for device in entry_devices(entry.data)}
@@ -1,6 +1,10 @@
 """Platform for light integration."""
+import contextlib
+import json
 import logging
 import asyncio
+import time
+from datetime import timedelta
 
 from homeassistant.components.light import (
     ATTR_BRIGHTNESS,
@@ -12,28 +16,55 @@ from homeassistant.components.light import (
 )
 from homeassistant.components import bluetooth
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_MAC, EVENT_HOMEASSISTANT_STOP
+from homeassistant.const import CONF_MAC, CONF_NAME, EVENT_HOMEASSISTANT_STOP
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import entity_platform
 import homeassistant.helpers.config_validation as cv
 from homeassistant.const import WEEKDAYS
 from homeassistant.exceptions import HomeAssistantError
 import voluptuous as vol
-from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.event import async_call_later, async_track_time_change, async_track_time_interval
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
 
 from bleak_retry_connector import establish_connection, BleakClientWithServiceCache
 
 from .const import (
+    CONF_CALIBRATION,
+    CONF_OPTIMISTIC,
+    CONF_PERSISTENT,
     CONF_PROFILE,
-    DEFAULT_PROFILE,
+    DATA_CIRCADIAN,
+    DATA_CIRCADIAN_ENROLLED,
+    DATA_CIRCADIAN_TICK,
+    DATA_CONNECT_SLOTS,
+    DATA_LIGHTS,
+    DATA_METRICS,
+    DATA_SCHEDULER,
+    DATA_SCHEDULES,
+    DATA_TRACER,
+    DEFAULT_OPTIMISTIC,
+    DEFAULT_PERSISTENT,
     DOMAIN,
+    SERVICE_SET_CALIBRATION,
     SERVICE_SET_SCENE_ID,
     SERVICE_SET_MUSIC_MODE,
+    SERVICE_SET_CIRCADIAN,
     SERVICE_SET_MUSIC_SENSITIVITY,
+    SERVICE_SET_POWER_SCHEDULE,
     SERVICE_SET_SCHEDULE,
 )
-from . import control
+from . import control, tracing
+from .audio import LightStream
+from .calibration import CalibratedProfile, Calibration, calibrate
+from .curve import CURVE_INTERVAL_SECONDS, CircadianEngine
+from .hub import entry_devices, with_calibration
 from .protocol import get_profile
+from .schedule import WEEKDAY_NAMES, PowerSchedule, compile_rules, days_mask
+from .snapshot import LightSnapshot
+from .sync import STAGE_TIMEOUT_SECONDS
+from .packet_trace import PacketTrace
+from .transport import DeviceTransport
 
 # Service schemas
 SERVICE_SET_SCENE_SCHEMA = cv.make_entity_service_schema({
@@ -44,18 +75,108 @@ SERVICE_SET_WHITE_SCHEMA = cv.make_entity_service_schema({})
 
 _LOGGER = logging.getLogger(__name__)
 IDLE_DISCONNECT_SECONDS = 15
+KEEPALIVE_SECONDS = 30
+# How long an optimistic command waits for the device to report the new state.
+CONFIRM_REPORT_SECONDS = 1.0
+RECONNECT_BACKOFF_SECONDS = (1, 2, 5, 10, 30)
+SCHEDULES_STORAGE_KEY = f"{DOMAIN}.schedules"
+SCHEDULES_STORAGE_VERSION = 1
+CIRCADIAN_STORAGE_KEY = f"{DOMAIN}.circadian"
+CIRCADIAN_STORAGE_VERSION = 1
+
+
+def _configured_macs(hass: HomeAssistant) -> set:
+    """Return the MAC of every light in a MeRGBW config entry."""
+    return {
+        device[CONF_MAC] for entry in hass.config_entries.async_entries(DOMAIN) for device in entry_devices(entry.data)
+    }
+
+
+async def _async_get_circadian(hass: HomeAssistant) -> tuple[CircadianEngine, set, Store]:
+    """Return the shared circadian engine and the enrolled MACs, loading them on first use."""
+    domain_data = hass.data[DOMAIN]
+    if DATA_CIRCADIAN_ENROLLED not in domain_data:
+        store = Store(hass, CIRCADIAN_STORAGE_VERSION, CIRCADIAN_STORAGE_KEY)
+        # Lights removed since the last run are dropped.
+        enrolled = set(await store.async_load() or []) & _configured_macs(hass)
+        domain_data.setdefault(DATA_CIRCADIAN_ENROLLED, (enrolled, store))
+    engine = domain_data.get(DATA_CIRCADIAN)
+    if engine is None:
+        engine = domain_data[DATA_CIRCADIAN] = CircadianEngine()
+    return (engine, *domain_data[DATA_CIRCADIAN_ENROLLED])
+
+
+def _async_circadian_add(hass: HomeAssistant, engine: CircadianEngine, light) -> None:
+    """Add a light to the curve, starting the shared tick with the first one."""
+    engine.add(light)
+    domain_data = hass.data[DOMAIN]
+    if DATA_CIRCADIAN_TICK not in domain_data:
+
+        async def _async_tick(_now):
+            await engine.async_tick(dt_util.now())
+
+        domain_data[DATA_CIRCADIAN_TICK] = async_track_time_interval(
+            hass, _async_tick, timedelta(seconds=CURVE_INTERVAL_SECONDS)
+        )
+
+
+def _async_circadian_remove(hass: HomeAssistant, light) -> None:
+    """Remove a light from the curve, stopping the shared tick with the last one."""
+    domain_data = hass.data.get(DOMAIN, {})
+    engine = domain_data.get(DATA_CIRCADIAN)
+    if engine is None:
+        return
+    engine.remove(light)
+    if not engine and (unsub := domain_data.pop(DATA_CIRCADIAN_TICK, None)):
+        unsub()
+
+
+async def _async_get_schedules(hass: HomeAssistant) -> tuple[dict, Store]:
+    """Return the pushed on-device schedules by MAC, loading them on first use."""
+    domain_data = hass.data[DOMAIN]
+    if DATA_SCHEDULES not in domain_data:
+        store = Store(hass, SCHEDULES_STORAGE_VERSION, SCHEDULES_STORAGE_KEY)
+        schedules = await store.async_load() or {}
+        # Schedules of lights removed since the last run are dropped.
+        configured = _configured_macs(hass)
+        if stale := schedules.keys() - configured:
+            _LOGGER.debug("Dropping stored schedules of removed lights %s", sorted(stale))
+            schedules = {mac: schedule for mac, schedule in schedules.items() if mac in configured}
+            store.async_delay_save(lambda: schedules, 1)
+        domain_data.setdefault(DATA_SCHEDULES, (schedules, store))
+    return domain_data[DATA_SCHEDULES]
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
     async_add_entities,
 ):
-    """Set up the MeRGBW Light platform."""
+    """Set up the MeRGBW Light platform.
+
+    A hub entry adds all of its lights in one batch and registers the entity
+    services once, instead of once per light entry.
+    """
     _LOGGER.info("async_setup_entry data=%s", config_entry.data)
-    mac_address = config_entry.data[CONF_MAC]
-    profile_key = config_entry.data.get(CONF_PROFILE, DEFAULT_PROFILE)
-    light = MeRGBWLight(mac_address, "MeRGBW Light", hass, profile_key)
-    async_add_entities([light])
+    options = config_entry.options
+    domain_data = hass.data[DOMAIN]
+    lights = []
+    for device in entry_devices(config_entry.data):
+        light = MeRGBWLight(
+            device[CONF_MAC],
+            device[CONF_NAME],
+            hass,
+            device[CONF_PROFILE],
+            scheduler=domain_data.get(DATA_SCHEDULER),
+            optimistic=options.get(CONF_OPTIMISTIC, DEFAULT_OPTIMISTIC),
+            persistent=options.get(CONF_PERSISTENT, DEFAULT_PERSISTENT),
+            connect_slots=domain_data.get(DATA_CONNECT_SLOTS),
+            calibration=Calibration.from_dict(device[CONF_CALIBRATION]),
+            entry_id=config_entry.entry_id,
+        )
+        domain_data[DATA_LIGHTS][device[CONF_MAC]] = light
+        lights.append(light)
+    async_add_entities(lights)
 
     platform = entity_platform.async_get_current_platform()
 
@@ -111,6 +232,39 @@ async def async_setup_entry(
         ),
         "async_handle_set_schedule",
     )
+    platform.async_register_entity_service(
+        SERVICE_SET_POWER_SCHEDULE,
+        cv.make_entity_service_schema(
+            {
+                vol.Required("rules"): [
+                    {
+                        vol.Required("action"): vol.In(["on", "off"]),
+                        vol.Required("at"): cv.time,
+                        vol.Optional("days", default=list(WEEKDAYS)): [vol.In(WEEKDAYS)],
+                    }
+                ],
+            }
+        ),
+        "async_handle_set_power_schedule",
+    )
+    platform.async_register_entity_service(
+        SERVICE_SET_CALIBRATION,
+        cv.make_entity_service_schema(
+            {
+                vol.Optional("gamma", default=1.0): vol.All(vol.Coerce(float), vol.Range(min=0.2, max=5.0)),
+                vol.Optional("red_gain", default=1.0): vol.All(vol.Coerce(float), vol.Range(min=0.0, max=2.0)),
+                vol.Optional("green_gain", default=1.0): vol.All(vol.Coerce(float), vol.Range(min=0.0, max=2.0)),
+                vol.Optional("blue_gain", default=1.0): vol.All(vol.Coerce(float), vol.Range(min=0.0, max=2.0)),
+                vol.Optional("hue_offset", default=0): vol.All(vol.Coerce(int), vol.Range(min=-180, max=180)),
+            }
+        ),
+        "async_handle_set_calibration",
+    )
+    platform.async_register_entity_service(
+        SERVICE_SET_CIRCADIAN,
+        cv.make_entity_service_schema({vol.Required("enabled"): bool}),
+        "async_handle_set_circadian",
+    )
 
 
 class MeRGBWLight(LightEntity):
@@ -121,7 +275,19 @@ class MeRGBWLight(LightEntity):
     _attr_supported_features = LightEntityFeature.EFFECT
     _attr_icon = "mdi:hexagon-multiple-outline"
 
-    def __init__(self, mac, name, hass: HomeAssistant, profile_key: str):
+    def __init__(
+        self,
+        mac,
+        name,
+        hass: HomeAssistant,
+        profile_key: str,
+        scheduler=None,
+        optimistic: bool = False,
+        persistent: bool = False,
+        connect_slots: asyncio.Semaphore | None = None,
+        calibration: Calibration | None = None,
+        entry_id: str | None = None,
+    ):
         """Initialize a MeRGBW Light."""
         self._mac = mac
         self._name = name
@@ -134,17 +300,76 @@ class MeRGBWLight(LightEntity):
         self._disconnect_timer = None
         self._command_lock = asyncio.Lock()
         self._profile_key = profile_key
-        self._profile = get_profile(profile_key)
+        # Shared per profile unless this light is colour-calibrated.
+        self._profile = calibrate(get_profile(profile_key), calibration)
+        self._entry_id = entry_id
+        self._transport = DeviceTransport(self._profile, scheduler, mac, PacketTrace())
         self._attr_effect_list = self._profile.effect_list
-        self._weekday_index = {day: idx for idx, day in enumerate(WEEKDAYS)}
         self._attr_available = True
+        self._attr_assumed_state = False
+        self._optimistic = optimistic
+        self._persistent = persistent
+        self._connect_slots = connect_slots
+        self._reconnect_task = None
+        self._power_schedule: PowerSchedule | None = None
+        self._schedule_unsubs = []
+        self._stopping = False
+        self._command_generation = 0
+        self._confirm_tasks: set[asyncio.Task] = set()
+        self._written_fingerprint = None
+        self._effect_list_bytes = len(json.dumps(self._attr_effect_list, separators=(",", ":")))
+        self._write_stats = {"writes": 0, "skipped": 0, "state_bytes": 0, "approx_recorded_bytes": 0}
+        # (packet bundle, future, leader task) of the newest command that can be joined.
+        self._single_flight = None
+        self._single_flight_stats = {"transactions": 0, "collapsed": 0}
+        # Only tracked so snapshots can restore them; not part of the HA state.
+        self._music_mode = None
+        self._scene_param = None
+        # Monotonic time until which the link is held open after a prewarm.
+        self._hold_until = 0.0
+        # Set while an audio stream drives the light.
+        self._streaming = False
+        # Set when the link dropped on its own; the next connect is a reconnect.
+        self._link_lost = False
 
 
-    def _validate_scene(self, scene_name: str) -> None:
-        """Raise if the scene is unsupported by the current profile."""
+    def _validate_scene(self, scene_name: str) -> list[bytes]:
+        """Return the scene packets; raise if the scene is unsupported by the current profile."""
         packets = self._profile.build_scene(scene_name)
         if not packets:
             raise HomeAssistantError(f"Scene '{scene_name}' is not supported by this profile.")
+        return packets
+
+    @property
+    def profile(self):
+        """Return the protocol profile used to encode commands."""
+        return self._profile
+
+    @property
+    def profile_key(self) -> str:
+        """Return the configured profile key."""
+        return self._profile_key
+
+    @property
+    def transport(self) -> DeviceTransport:
+        """Return the per-device transport state."""
+        return self._transport
+
+    @property
+    def extra_state_attributes(self):
+        """Return integration-specific state."""
+        engine = self._hass.data.get(DOMAIN, {}).get(DATA_CIRCADIAN)
+        attributes = {"circadian": engine is not None and self in engine}
+        if self._power_schedule is not None and self._power_schedule.events():
+            attributes["power_schedule"] = tuple(
+                (
+                    "on" if power else "off",
+                    f"{hour:02d}:{minute:02d}",
+                    tuple(day for idx, day in enumerate(WEEKDAY_NAMES) if mask & (1 << idx)),
+                )
+                for hour, minute, power, mask in self._power_schedule.events()
+            )
+        return attributes
 
     @property
     def unique_id(self):
@@ -187,39 +412,200 @@ class MeRGBWLight(LightEntity):
         """Return the current effect."""
         return self._effect
 
+    def diagnostics(self) -> dict:
+        """Return runtime state for the diagnostics download."""
+        return {
+            "profile": self._profile_key,
+            "connected": bool(self._client and self._client.is_connected),
+            "persistent": self._persistent,
+            "calibration": self._profile.calibration.as_dict() if isinstance(self._profile, CalibratedProfile) else None,
+            "transport": self._transport.diagnostics(),
+            "state_writes": dict(self._write_stats),
+            "single_flight": dict(self._single_flight_stats),
+            "packet_trace": self._transport.trace.export(),
+        }
+
+    def _state_fingerprint(self):
+        return (
+            self._is_on,
+            self._brightness,
+            self._rgb_color,
+            self._effect,
+            self._attr_available,
+            self._attr_assumed_state,
+            tuple(sorted(self.extra_state_attributes.items())),
+        )
+
+    def _async_write_state_if_changed(self):
+        """Write state only when an attribute visible in the state changed.
+
+        Each write serializes every attribute, including the static effect
+        list, into the state machine; skipping no-op writes avoids that work
+        and the matching event bus traffic.
+        """
+        fingerprint = self._state_fingerprint()
+        if fingerprint == self._written_fingerprint:
+            self._write_stats["skipped"] += 1
+            return
+        self._written_fingerprint = fingerprint
+        with tracing.span("state_write"):
+            self.async_write_ha_state()
+        self._write_stats["writes"] += 1
+        state = self._hass.states.get(self.entity_id)
+        if state is not None:
+            # The serialized state is cached by HA for its subscribers.
+            size = len(state.as_dict_json)
+            self._write_stats["state_bytes"] += size
+            # LightEntity keeps the effect list out of the recorder.
+            self._write_stats["approx_recorded_bytes"] += size - self._effect_list_bytes
+
     async def _ensure_connected(self):
         """Ensure the BleakClient is connected."""
         if self._client and self._client.is_connected:
             return self._client
 
-        device = bluetooth.async_ble_device_from_address(self._hass, self._mac, connectable=True)
+        with tracing.span("device_lookup"):
+            device = bluetooth.async_ble_device_from_address(self._hass, self._mac, connectable=True)
         if not device:
             _LOGGER.error("Device %s not found via bluetooth registry", self._mac)
             raise HomeAssistantError(f"Device {self._mac} not found")
+        # Writes are scheduled per adapter/proxy that currently reaches the device.
+        details = getattr(device, "details", None)
+        if isinstance(details, dict):
+            self._transport.adapter = details.get("source")
 
+        started = time.perf_counter()
         try:
-            self._client = await establish_connection(
-                BleakClientWithServiceCache,
-                device,
-                self._mac,
-                disconnected_callback=self._on_disconnected,
-            )
+            with tracing.span("connect", adapter=self._transport.adapter):
+                if self._connect_slots is None:
+                    self._client = await self._establish_connection(device)
+                else:
+                    with tracing.span("connect_slot_wait"):
+                        await self._connect_slots.acquire()
+                    try:
+                        self._client = await self._establish_connection(device)
+                    finally:
+                        self._connect_slots.release()
         except Exception as err:
             _LOGGER.warning("Failed to connect to %s: %s", self._mac, err)
             raise HomeAssistantError(f"Failed to connect to {self._mac}") from err
+        self._record_metrics(connect_ms=(time.perf_counter() - started) * 1000, reconnect=self._link_lost)
+        self._link_lost = False
 
+        try:
+            await self._client.start_notify(self._profile.notify_char_uuid, self._on_notify)
+        except Exception as err:  # noqa: BLE001 - notify feedback is best effort
+            _LOGGER.debug("Notify unavailable on %s: %s", self._mac, err)
+
+        if self._persistent and not self._attr_available:
+            self._attr_available = True
+            self._async_write_state_if_changed()
         return self._client
 
+    async def _establish_connection(self, device):
+        return await establish_connection(
+            BleakClientWithServiceCache,
+            device,
+            self._mac,
+            disconnected_callback=self._on_disconnected,
+        )
+
+    def _on_notify(self, _sender, data: bytearray):
+        """Feed device state reports back into the transport."""
+        self._transport.handle_notify(bytes(data))
+
     def _on_disconnected(self, client):
         """Handle disconnection."""
         _LOGGER.info("Disconnected from %s", self._mac)
+        if self._client is not None and not self._stopping:
+            self._link_lost = True
         self._client = None
         if self._disconnect_timer:
             self._disconnect_timer()
             self._disconnect_timer = None
+        if self._persistent and not self._stopping:
+            self._attr_available = False
+            self._async_write_state_if_changed()
+            self._async_start_reconnect()
+
+    def _async_start_reconnect(self):
+        """Reconnect in the background unless a reconnect is already running."""
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self._hass.async_create_background_task(
+                self._async_reconnect(), f"{DOMAIN} reconnect {self._mac}"
+            )
+
+    async def _async_reconnect(self):
+        """Keep trying to reconnect a persistent light, backing off between attempts."""
+        attempt = 0
+        while not self._stopping:
+            try:
+                async with self._command_lock:
+                    await self._ensure_connected()
+                return
+            except HomeAssistantError as err:
+                # Also covers the first connect at startup, before any drop was seen.
+                if self._attr_available:
+                    self._attr_available = False
+                    self._async_write_state_if_changed()
+                delay = RECONNECT_BACKOFF_SECONDS[min(attempt, len(RECONNECT_BACKOFF_SECONDS) - 1)]
+                _LOGGER.debug("Reconnect to %s failed (%s); retrying in %ss", self._mac, err, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def _keepalive_char(self, client):
+        """Return a readable MeRGBW characteristic of ``client``, if it has one."""
+        services = getattr(client, "services", None)
+        if services is None:
+            return None
+        for uuid in (self._profile.notify_char_uuid, self._profile.write_char_uuid):
+            char = services.get_characteristic(uuid)
+            if char is not None and "read" in char.properties:
+                return char
+        return None
+
+    async def _async_keepalive(self, _now):
+        """Probe a persistent light's link and reconnect it when the probe fails.
+
+        A link can die without a disconnect callback, so ``is_connected`` is
+        not enough. The probe reads one of the light's characteristics, which
+        the device must answer and which changes nothing, so power changes
+        made from the app, a remote or an on-device timer are left alone.
+        Lights without a readable characteristic rely on the disconnect
+        callback and the notify subscription. The probe is skipped while a
+        command is running (that traffic is the probe).
+        """
+        client = self._client
+        if not (client and client.is_connected):
+            self._async_start_reconnect()
+            return
+        char = self._keepalive_char(client)
+        if char is None or self._command_lock.locked():
+            return
+        try:
+            async with self._command_lock:
+                await client.read_gatt_char(char)
+        except Exception as err:  # noqa: BLE001 - any failure means the link is gone
+            _LOGGER.debug("Keepalive to %s failed (%s); reconnecting", self._mac, err)
+            if self._client is client:
+                self._on_disconnected(client)
+                try:
+                    await client.disconnect()
+                except Exception as disconnect_err:  # noqa: BLE001 - the link is already broken
+                    _LOGGER.debug("Disconnect from %s failed: %s", self._mac, disconnect_err)
 
     async def async_will_remove_from_hass(self):
         """Disconnect when removed."""
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        for task in self._confirm_tasks:
+            task.cancel()
+        domain_data = self._hass.data.get(DOMAIN, {})
+        lights = domain_data.get(DATA_LIGHTS, {})
+        if lights.get(self._mac) is self:
+            del lights[self._mac]
+        _async_circadian_remove(self._hass, self)
         if self._client:
             await self._client.disconnect()
         if self._disconnect_timer:
@@ -232,112 +618,354 @@ class MeRGBWLight(LightEntity):
         self.async_on_remove(
             self._hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_handle_hass_stop)
         )
+        if self._persistent:
+            # Keep the link up: a periodic probe restarts the reconnect loop
+            # when the link stops answering.
+            self.async_on_remove(
+                async_track_time_interval(self._hass, self._async_keepalive, timedelta(seconds=KEEPALIVE_SECONDS))
+            )
+            self._async_start_reconnect()
+        if hasattr(self._profile, "build_schedule"):
+            self.async_on_remove(self._async_untrack_schedule)
+            schedules, _store = await _async_get_schedules(self._hass)
+            if self._mac in schedules:
+                self._async_track_schedule(PowerSchedule(**schedules[self._mac]))
+        engine, enrolled, _store = await _async_get_circadian(self._hass)
+        if self._mac in enrolled:
+            _async_circadian_add(self._hass, engine, self)
 
     async def _async_handle_hass_stop(self, _event):
         """Disconnect cleanly when HA stops."""
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
         if self._disconnect_timer:
             self._disconnect_timer()
             self._disconnect_timer = None
         if self._client:
             await self._client.disconnect()
             self._client = None
-            self.async_write_ha_state()
+            self._async_write_state_if_changed()
 
     def _schedule_disconnect(self):
         """Schedule a disconnect after idle timeout."""
+        if self._persistent or self._streaming:
+            return
         if self._disconnect_timer:
             self._disconnect_timer()
-        self._disconnect_timer = async_call_later(self._hass, IDLE_DISCONNECT_SECONDS, self._async_idle_disconnect)
+        delay = max(IDLE_DISCONNECT_SECONDS, self._hold_until - time.monotonic())
+        self._disconnect_timer = async_call_later(self._hass, delay, self._async_idle_disconnect)
 
     async def _async_idle_disconnect(self, _now):
         """Disconnect after idle period to free BLE resources."""
         self._disconnect_timer = None
-        if self._client:
-            await self._client.disconnect()
-            self._client = None
-            self.async_write_ha_state()
+        client, self._client = self._client, None
+        if client:
+            await client.disconnect()
+            self._async_write_state_if_changed()
 
-    async def _run_with_client(self, handler):
-        """Serialize BLE writes and ensure connection."""
-        async with self._command_lock:
-            client = await self._ensure_connected()
+    async def _run_with_client(self, handler, resumable: bool = True):
+        """Serialize BLE writes and ensure connection.
+
+        If the link fails part-way through a transaction, reconnect once and
+        send only the frames the light still needs instead of failing the call.
+        Any other command queued here ends the single-flight window, so a
+        later identical command is sent again rather than joined.
+        """
+        flight = self._single_flight
+        if flight is not None and flight[2] is not asyncio.current_task():
+            self._single_flight = None
+        started = time.perf_counter()
+        failed = True
+        with self._command_span(handler):
+            with tracing.span("queue_wait"):
+                await self._command_lock.acquire()
             try:
-                return await handler(client)
+                client = await self._ensure_connected()
+                try:
+                    try:
+                        result = await handler(client)
+                    except Exception as err:
+                        if self._transport.interrupted is None:
+                            raise
+                        if not resumable or self._stopping:
+                            self._transport.interrupted = None
+                            raise
+                        await self._async_resume_transaction(client, err)
+                        result = None
+                    failed = False
+                    return result
+                finally:
+                    self._schedule_disconnect()
             finally:
-                self._schedule_disconnect()
+                self._command_lock.release()
+                self._record_metrics(command_ms=(time.perf_counter() - started) * 1000, failed=failed)
+
+    def _record_metrics(self, **event) -> None:
+        """Add an event to the long-term metrics of this light and its adapter."""
+        store = self._hass.data.get(DOMAIN, {}).get(DATA_METRICS)
+        if store is None:
+            return
+        store.record(self._mac, **event)
+        if self._transport.adapter:
+            store.record(f"adapter:{self._transport.adapter}", **event)
+
+    def _command_span(self, handler):
+        """Open this light's span for a command, linked to the triggering HA context.
+
+        Nested calls for the same light reuse the open span; a span opened by
+        an integration-wide service becomes the parent.
+        """
+        tracer = self._hass.data.get(DOMAIN, {}).get(DATA_TRACER)
+        if tracer is None:
+            return contextlib.nullcontext()
+        parent = tracing.current()
+        if parent is not None and parent.attributes.get("mac") == self._mac:
+            return contextlib.nullcontext()
+        name = getattr(handler, "__qualname__", "command").split(".<locals>")[0].rsplit(".", 1)[-1]
+        context = getattr(self, "_context", None)
+        return tracer.start(
+            name,
+            context_id=getattr(context, "id", None),
+            entity_id=getattr(self, "entity_id", None),
+            mac=self._mac,
+        )
+
+    async def _async_resume_transaction(self, client, err):
+        """Reconnect once and finish the transaction interrupted by ``err``."""
+        _LOGGER.debug("Write to %s failed mid-transaction (%s); reconnecting to resume", self._mac, err)
+        self._link_lost = True
+        if self._client is client:
+            self._client = None
+            try:
+                await client.disconnect()
+            except Exception as disconnect_err:  # noqa: BLE001 - the link is already broken
+                _LOGGER.debug("Disconnect from %s failed: %s", self._mac, disconnect_err)
+        started = time.monotonic()
+        try:
+            client = await self._ensure_connected()
+        except HomeAssistantError:
+            self._transport.abandon()
+            raise
+        finally:
+            self._transport.resume_stats["reconnect_ms"] += (time.monotonic() - started) * 1000
+        try:
+            await self._transport.resume(client, self._profile.write_char_uuid)
+        except Exception as resume_err:
+            raise HomeAssistantError(f"Failed to resume writing to {self._mac}") from resume_err
+
+    def _apply_updates(self, updates: dict) -> None:
+        for key, value in updates.items():
+            setattr(self, key, value)
+        # A new colour or scene replaces music mode and scene parameters on the device.
+        if "_rgb_color" in updates or "_effect" in updates:
+            self._music_mode = updates.get("_music_mode")
+            self._scene_param = updates.get("_scene_param")
+
+    async def _run_single_flight(self, handler, key: tuple | None):
+        """Run ``handler``, or join the identical command already in flight.
+
+        ``key`` is the encoded packet bundle. A command joins the newest
+        command for this light while that one is queued or being written and
+        sends exactly the same packets; the callers then share its BLE
+        transaction and its result. Only the newest command can be joined, so
+        collapsing never reorders commands: after red, blue, red (or red,
+        set_music_mode, red) the final red is sent again.
+        """
+        if key is None:
+            return await self._run_with_client(handler)
+        while True:
+            flight = self._single_flight
+            if flight is None or flight[0] != key or flight[1].done():
+                break
+            self._single_flight_stats["collapsed"] += 1
+            with tracing.span("single_flight_join", packets=len(key)):
+                try:
+                    return await asyncio.shield(flight[1])
+                except asyncio.CancelledError:
+                    # Only the leader was cancelled: send the command ourselves.
+                    if not flight[1].cancelled() or asyncio.current_task().cancelling():
+                        raise
+                    self._single_flight_stats["collapsed"] -= 1
+        future = asyncio.get_running_loop().create_future()
+        # Consume the outcome so a failure nobody joined is not logged as unretrieved.
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._single_flight = (key, future, asyncio.current_task())
+        self._single_flight_stats["transactions"] += 1
+        try:
+            result = await self._run_with_client(handler)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            raise
+        finally:
+            if self._single_flight is not None and self._single_flight[1] is future:
+                self._single_flight = None
+        future.set_result(result)
+        return result
+
+    async def _async_command(self, handler, updates: dict, key: tuple | None = None):
+        """Run ``handler`` on the device and apply ``updates`` to the entity.
+
+        Updates map entity fields (``_is_on``, ``_rgb_color``, ...) to their new
+        values. In optimistic mode the new state is published right away with
+        ``assumed_state`` set and the write runs in the background; success
+        confirms it, failure restores the previous values unless a newer
+        command has replaced them in the meantime. ``key`` (the packet bundle)
+        lets identical concurrent commands share one transaction.
+        """
+        if not self._optimistic:
+            with self._command_span(handler):
+                await self._run_single_flight(handler, key)
+                self._apply_updates(updates)
+                self._async_write_state_if_changed()
+            return
+        previous = {key: getattr(self, key) for key in updates}
+        if "_rgb_color" in previous or "_effect" in previous:
+            # _apply_updates resets these along with a colour or scene; keep them for a rollback.
+            previous.update(_music_mode=self._music_mode, _scene_param=self._scene_param)
+        self._command_generation += 1
+        generation = self._command_generation
+        self._apply_updates(updates)
+        self._attr_assumed_state = True
+        self._async_write_state_if_changed()
+        # The span is created now, with the caller's context, and opened by the
+        # background task so it covers the write and the confirmation.
+        span = self._command_span(handler)
+        task = self._hass.async_create_task(self._async_confirm(span, handler, previous, generation, key))
+        self._confirm_tasks.add(task)
+        task.add_done_callback(self._confirm_tasks.discard)
+
+    async def _async_confirm(self, span, handler, previous: dict, generation: int, key: tuple | None = None):
+        """Send an optimistic command and confirm or roll back its state.
+
+        When the device reports state, its report of ``key`` (the packets) is
+        the confirmation: a report that differs from what was written rolls
+        back like a failed write. Devices that have never reported are
+        confirmed by the write. ``span`` is the command's root span.
+        """
+        with span:
+            reported = None
+            try:
+                with self._transport.expect_reports(key or ()) as reports:
+                    await self._run_single_flight(handler, key)
+                    if self._transport.confirmed or self._transport.mismatched:
+                        reported = await reports.wait(CONFIRM_REPORT_SECONDS)
+                if reported is False:
+                    _LOGGER.warning("%s reported a different state than written, restoring previous state", self._mac)
+            except Exception as err:  # noqa: BLE001 - any failure rolls back
+                _LOGGER.error("Command to %s failed, restoring previous state: %s", self._mac, err)
+                reported = False
+            if reported is False:
+                if generation == self._command_generation:
+                    self._apply_updates(previous)
+                    self._attr_assumed_state = False
+                    self._async_write_state_if_changed()
+                return
+            if generation == self._command_generation:
+                self._attr_assumed_state = False
+                self._async_write_state_if_changed()
 
     async def async_turn_on(self, **kwargs):
         """Instruct the light to turn on."""
-        await self._run_with_client(lambda client: control.turn_on(client, self._profile))
-        self._is_on = True
-
+        rgb = effect = brightness = None
         if ATTR_RGB_COLOR in kwargs:
-            r, g, b = kwargs[ATTR_RGB_COLOR]
-            await self._run_with_client(lambda client: control.set_color(client, self._profile, r, g, b))
-            self._rgb_color = (r, g, b)
-            self._effect = None
+            rgb = tuple(kwargs[ATTR_RGB_COLOR])
         elif ATTR_EFFECT in kwargs:
             effect = kwargs[ATTR_EFFECT]
             self._validate_scene(effect)
-            await self._run_with_client(lambda client: control.set_scene(client, self._profile, effect))
-            self._effect = effect
-        else:
-            # Default behavior if just toggled on without params
-            if self._rgb_color is None and self._effect is None:
-                self._rgb_color = (255, 255, 255)
-
         if ATTR_BRIGHTNESS in kwargs:
             brightness = kwargs[ATTR_BRIGHTNESS]
-            await self._run_with_client(lambda client: control.set_brightness(client, self._profile, brightness))
-            self._brightness = brightness
+
+        updates = {"_is_on": True}
+        if rgb is not None:
+            updates["_rgb_color"] = rgb
+            updates["_effect"] = None
+        elif effect is not None:
+            updates["_effect"] = effect
+        elif self._rgb_color is None and self._effect is None:
+            # Default behavior if just toggled on without params
+            updates["_rgb_color"] = (255, 255, 255)
+        if brightness is not None:
+            updates["_brightness"] = brightness
         elif self._brightness is None:
-             self._brightness = 255
+            updates["_brightness"] = 255
 
-        self.async_write_ha_state()
+        # Power, color/scene and brightness go out as a single transaction so
+        # the transport can coalesce them into as few writes as possible.
+        packets = control.build_turn_on(self._profile, rgb, effect, brightness)
+        await self._async_command(
+            lambda client: control.send(client, self._profile, packets, self._transport),
+            updates,
+            key=tuple(packets),
+        )
 
     async def async_turn_off(self, **kwargs):
         """Instruct the light to turn off."""
-        await self._run_with_client(lambda client: control.turn_off(client, self._profile))
-        self._is_on = False
-        self.async_write_ha_state()
+        await self._async_command(
+            lambda client: control.turn_off(client, self._profile, self._transport),
+            {"_is_on": False},
+            key=tuple(self._profile.build_power(False)),
+        )
 
     async def async_handle_set_scene(self, scene_name: str):
         """Handle the set_scene service call."""
-        self._validate_scene(scene_name)
-        await self._run_with_client(lambda client: control.set_scene(client, self._profile, scene_name))
-        self._effect = scene_name
-        self.async_write_ha_state()
+        packets = self._validate_scene(scene_name)
+        await self._async_command(
+            lambda client: control.send(client, self._profile, packets, self._transport),
+            {"_effect": scene_name},
+            key=tuple(packets),
+        )
+
+    async def async_apply_preset(self, bundle):
+        """Send a compiled preset bundle as one transaction."""
+        packets = list(bundle.packets)
+        updates = dict(bundle.updates)
+        rgb = updates.get("_rgb_color")
+        if rgb is not None and isinstance(self._profile, CalibratedProfile):
+            # Bundles are compiled once per profile, without any light's calibration.
+            color = self._profile.build_color(*rgb)[0]
+            packets = [color if packet[1:2] == color[1:2] else packet for packet in packets]
+        await self._async_command(
+            lambda client: control.send(client, self._profile, packets, self._transport),
+            updates,
+            key=tuple(packets),
+        )
 
     async def async_handle_set_white(self):
         """Handle the set_white service call."""
-        await self._run_with_client(lambda client: control.set_white(client, self._profile))
-        self._rgb_color = (255, 255, 255)
-        self._brightness = 255
-        self._is_on = True
-        self._effect = None
-        self.async_write_ha_state()
+        await self._async_command(
+            lambda client: control.set_white(client, self._profile, self._transport),
+            {"_rgb_color": (255, 255, 255), "_brightness": 255, "_is_on": True, "_effect": None},
+            key=tuple(self._profile.build_white()),
+        )
 
     async def async_handle_set_scene_id(self, scene_id: int, scene_param: int | None = None):
         """Set scene by numeric ID (Hexagon-only)."""
         if not hasattr(self._profile, "build_scene_by_id"):
             raise HomeAssistantError("Scene ID is not supported by this profile.")
-        await self._run_with_client(
-            lambda client: control.set_scene_id(client, self._profile, scene_id, scene_param)
+        await self._async_command(
+            lambda client: control.set_scene_id(client, self._profile, scene_id, scene_param, self._transport),
+            {"_effect": f"Scene {scene_id}", "_scene_param": scene_param},
+            key=tuple(self._profile.build_scene_by_id(scene_id, scene_param)),
         )
-        self._effect = f"Scene {scene_id}"
-        self.async_write_ha_state()
 
     async def async_handle_set_music_mode(self, mode):
         """Set music mode (Hexagon-only)."""
         if not hasattr(self._profile, "build_music_mode"):
             raise HomeAssistantError("Music mode is not supported by this profile.")
-        await self._run_with_client(lambda client: control.set_music_mode(client, self._profile, mode))
+        await self._run_with_client(lambda client: control.set_music_mode(client, self._profile, mode, self._transport))
+        self._music_mode = mode
 
     async def async_handle_set_music_sensitivity(self, value: int):
         """Set music sensitivity 0-100 (Hexagon-only)."""
         if not hasattr(self._profile, "build_music_sensitivity"):
             raise HomeAssistantError("Music sensitivity is not supported by this profile.")
-        await self._run_with_client(lambda client: control.set_music_sensitivity(client, self._profile, value))
+        await self._run_with_client(
+            lambda client: control.set_music_sensitivity(client, self._profile, value, self._transport)
+        )
 
     async def async_handle_set_schedule(
         self,
@@ -350,35 +978,236 @@ class MeRGBWLight(LightEntity):
         off_minute: int,
         off_days_mask,
     ):
-        """Set combined on/off schedule (Hexagon-only)."""
-        if not hasattr(self._profile, "build_schedule"):
-            raise HomeAssistantError("Schedules are not supported by this profile.")
-        def mask_from(value):
-            if isinstance(value, int):
-                return value
-            mask = 0
-            for day in value:
-                if not isinstance(day, str):
-                    continue
-                key = day.strip().lower()
-                if len(key) > 3:
-                    key = key[:3]
-                idx = self._weekday_index.get(key)
-                if idx is not None:
-                    mask |= 1 << idx
-            return mask
+        """Set combined on/off schedule (Hexagon-only).
 
-        await self._run_with_client(
-            lambda client: control.set_schedule(
-                client,
-                self._profile,
+        Always written, so it can re-sync a light whose timers were changed
+        from the app.
+        """
+        await self._async_push_schedule(
+            PowerSchedule(
                 on_enabled,
                 on_hour,
                 on_minute,
-                mask_from(on_days_mask),
+                days_mask(on_days_mask),
                 off_enabled,
                 off_hour,
                 off_minute,
-                mask_from(off_days_mask),
+                days_mask(off_days_mask),
+            ),
+            force=True,
+        )
+
+    async def async_handle_set_power_schedule(self, rules):
+        """Compile recurring on/off rules into the on-device timers (Hexagon-only)."""
+        try:
+            schedule = compile_rules(rules)
+        except ValueError as err:
+            raise HomeAssistantError(f"{self.entity_id}: {err}") from err
+        await self._async_push_schedule(schedule)
+
+    async def _async_push_schedule(self, schedule: PowerSchedule, force: bool = False):
+        """Write the schedule to the light unless it already runs it (or ``force``), and track it locally."""
+        if not hasattr(self._profile, "build_schedule"):
+            raise HomeAssistantError("Schedules are not supported by this profile.")
+        schedules, store = await _async_get_schedules(self._hass)
+        if not force and schedule == self._power_schedule:
+            _LOGGER.debug("%s already runs schedule %s; not writing it again", self._mac, schedule)
+            return
+        await self._run_with_client(
+            lambda client: control.set_schedule(client, self._profile, *schedule.args(), self._transport)
+        )
+        schedules[self._mac] = schedule.as_dict()
+        store.async_delay_save(lambda: schedules, 1)
+        self._async_track_schedule(schedule)
+        self._async_write_state_if_changed()
+
+    def _async_track_schedule(self, schedule: PowerSchedule):
+        """Follow the light's timers locally so HA's state flips without a connection."""
+        self._async_untrack_schedule()
+        self._power_schedule = schedule
+
+        async def _async_fired(now):
+            power = schedule.power_at(now)
+            if power is not None:
+                self._is_on = power
+                self._async_write_state_if_changed()
+
+        for hour, minute, _power, _mask in schedule.events():
+            self._schedule_unsubs.append(
+                async_track_time_change(self._hass, _async_fired, hour=hour, minute=minute, second=0)
             )
+
+    def _async_untrack_schedule(self):
+        while self._schedule_unsubs:
+            self._schedule_unsubs.pop()()
+
+    def sync_scene_participant(
+        self,
+        scene_name: str | None = None,
+        scene_id: int | None = None,
+        scene_param=None,
+        stage_timeout: float = STAGE_TIMEOUT_SECONDS,
+    ):
+        """Return a participant for ``sync.async_synchronized_apply`` starting a scene.
+
+        Encoding and validation happen here, before any light is staged.
+        Staging only powers the light on, which does not start an animation;
+        the release writes the scene frames (select and parameter), since the
+        scene select alone starts playback on some firmwares. The command
+        lock is free while the light waits for the others, and the link is
+        kept open for ``stage_timeout``.
+        """
+        if scene_id is not None:
+            if not hasattr(self._profile, "build_scene_by_id"):
+                raise HomeAssistantError(f"{self.entity_id}: scene ID is not supported by this profile.")
+            final = list(self._profile.build_scene_by_id(scene_id, scene_param))
+            effect = f"Scene {scene_id}"
+        else:
+            final = self._validate_scene(scene_name)
+            effect = scene_name
+            scene_param = None
+        staged_packets = list(self._profile.build_power(True))
+
+        async def _stage(client):
+            if staged_packets:
+                await self._transport.send(client, staged_packets, self._profile.write_char_uuid)
+
+        async def _release(client):
+            await self._transport.send(client, final, self._profile.write_char_uuid, paced=False)
+            return time.perf_counter()
+
+        async def _participant(staged, release):
+            self._hold_until = time.monotonic() + stage_timeout
+            try:
+                await self._run_with_client(_stage)
+                staged()
+                await release.wait()
+                # A resumed release would not be in phase with the others.
+                done = await self._run_with_client(_release, resumable=False)
+            finally:
+                self._hold_until = 0.0
+            # Supersede any optimistic command still waiting for confirmation.
+            self._command_generation += 1
+            self._attr_assumed_state = False
+            self._apply_updates({"_is_on": True, "_effect": effect, "_scene_param": scene_param, "_rgb_color": None})
+            self._async_write_state_if_changed()
+            return done
+
+        return _participant
+
+    def snapshot(self) -> LightSnapshot:
+        """Return what the light shows now."""
+        return LightSnapshot(
+            is_on=bool(self._is_on),
+            brightness=self._brightness,
+            rgb_color=tuple(self._rgb_color) if self._rgb_color is not None else None,
+            effect=self._effect,
+            scene_param=self._scene_param,
+            music_mode=self._music_mode,
         )
+
+    async def async_prewarm(self, hold: float) -> None:
+        """Connect now and keep the link open for ``hold`` seconds.
+
+        Used before an alert flash so the flash and the restore find the
+        light connected. The hold only starts once the light is connected.
+        """
+        with self._command_span(self.async_prewarm):
+            async with self._command_lock:
+                await self._ensure_connected()
+                self._hold_until = time.monotonic() + hold
+                self._schedule_disconnect()
+
+    async def async_restore_snapshot(self, snapshot: LightSnapshot) -> list[str]:
+        """Send only what changed since ``snapshot`` and return those attributes."""
+        self._hold_until = 0.0
+        packets, updates, changed = snapshot.restore(self._profile, self.snapshot())
+        if packets:
+            await self._async_command(
+                lambda client: control.send(client, self._profile, packets, self._transport),
+                updates,
+                key=tuple(packets),
+            )
+        elif self._disconnect_timer is not None:
+            self._schedule_disconnect()
+        return changed
+
+    def audio_stream(self) -> LightStream:
+        """Return a frame-dropping stream that drives this light from the audio engine.
+
+        Frames bypass entity state writes: dozens per second would flood the
+        state machine and the recorder. They are written to the held client
+        under the command lock, so they never interleave with a command's
+        frames, but without a span, metrics or resume: a lost frame is
+        superseded by the next one. The idle disconnect is paused until the
+        stream ends.
+        """
+        self._streaming = True
+        if self._disconnect_timer:
+            self._disconnect_timer()
+            self._disconnect_timer = None
+        # A calibrated light's colours arrive corrected by the engine's batch.
+        calibrated = isinstance(self._profile, CalibratedProfile)
+        colors = self._profile.shared if calibrated else self._profile
+        tables = self._profile.tables if calibrated else None
+
+        def _encode(rgb, brightness):
+            return colors.build_color(*rgb) + self._profile.build_brightness(brightness)
+
+        async def _send(packets):
+            async with self._command_lock:
+                # First frame or a dropped link: connect once, like a command.
+                client = await self._ensure_connected()
+                try:
+                    await self._transport.send(client, packets, self._profile.write_char_uuid)
+                except Exception:
+                    # Never resume a stale frame in the next command.
+                    self._transport.interrupted = None
+                    raise
+
+        def _close():
+            self._streaming = False
+            if self._client is not None:
+                self._schedule_disconnect()
+
+        return LightStream(self.entity_id, _encode, _send, self._transport.changed_frames, _close, tables)
+
+    async def async_handle_set_calibration(self, **calibration):
+        """Store this light's colour calibration in its config entry.
+
+        The entry is reloaded on the update, which rebuilds the light with
+        the new lookup tables.
+        """
+        try:
+            calibration = Calibration.from_dict(calibration)
+        except ValueError as err:
+            raise HomeAssistantError(f"{self.entity_id}: {err}") from err
+        entry = self._hass.config_entries.async_get_entry(self._entry_id)
+        if entry is None:
+            raise HomeAssistantError(f"{self.entity_id}: config entry not found")
+        self._hass.config_entries.async_update_entry(
+            entry, data=with_calibration(entry.data, self._mac, None if calibration.identity else calibration.as_dict())
+        )
+
+    async def async_handle_set_circadian(self, enabled: bool):
+        """Enroll the light in (or remove it from) the circadian curve.
+
+        Enrollment is stored by MAC and restored when the light is set up again.
+        """
+        engine, enrolled, store = await _async_get_circadian(self._hass)
+        if enabled:
+            _async_circadian_add(self._hass, engine, self)
+            enrolled.add(self._mac)
+        else:
+            _async_circadian_remove(self._hass, self)
+            enrolled.discard(self._mac)
+        store.async_delay_save(lambda: sorted(enrolled), 1)
+        self._async_write_state_if_changed()
+
+    async def async_apply_curve(self, packets, rgb, brightness):
+        """Send curve frames that changed in device units and record the new state."""
+        await self._run_with_client(lambda client: control.send(client, self._profile, packets, self._transport))
+        self._rgb_color = rgb
+        self._brightness = brightness
+        self._effect = None
+        self._async_write_state_if_changed()
@@ -0,0 +1,211 @@
+"""Long-term link-quality metrics in a fixed-size memory-mapped file.
+
+Every light (and every adapter or proxy, as ``adapter:<source>``) owns one
+slot. A slot holds three rings of buckets: minutes, hours and days. Each
+event (a command with its latency and outcome, a connect with its duration,
+a reconnect) is added to the current bucket of all three rings, so
+downsampling happens as the data is written. A bucket that the ring comes
+back to is reset before reuse, so the file never grows. Writes only touch
+the mapped pages; the OS writes them back and :meth:`MetricsStore.flush`
+forces it.
+
+When all slots are taken, the slot written to longest ago is reused. Keys
+longer than a slot name are stored as a prefix plus a short hash.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_KEYS = 128
+DEFAULT_MINUTES = 180
+DEFAULT_HOURS = 24 * 15
+DEFAULT_DAYS = 400
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+_MAGIC = b"MGBM"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHHHH2x")
+_KEY_BYTES = 32
+# Key, unix time of the last record.
+_KEY = struct.Struct(f"<{_KEY_BYTES}sI")
+# Bucket index (unix time // period), commands, failures, connects,
+# reconnects, latency sum and max (ms), connect time sum (ms).
+_BUCKET = struct.Struct("<IIIIIfff")
+
+
+def _stored_key(key: str) -> str:
+    """Return ``key`` if it fits a slot name, else a prefix of it and a hash of the whole."""
+    raw = key.encode()
+    if len(raw) <= _KEY_BYTES:
+        return key
+    digest = hashlib.sha1(raw).hexdigest()[:8]
+    return raw[: _KEY_BYTES - len(digest) - 1].decode("utf-8", "ignore") + "~" + digest
+
+
+def _empty(index: int) -> list:
+    return [index, 0, 0, 0, 0, 0.0, 0.0, 0.0]
+
+
+def _summarize(buckets) -> dict:
+    commands = sum(bucket[1] for bucket in buckets)
+    failures = sum(bucket[2] for bucket in buckets)
+    connects = sum(bucket[3] for bucket in buckets)
+    return {
+        "commands": commands,
+        "failures": failures,
+        "failure_rate": round(failures / commands, 4) if commands else None,
+        "connects": connects,
+        "reconnects": sum(bucket[4] for bucket in buckets),
+        "latency_ms_mean": round(sum(bucket[5] for bucket in buckets) / commands, 1) if commands else None,
+        "latency_ms_max": round(max((bucket[6] for bucket in buckets), default=0.0), 1),
+        "connect_ms_mean": round(sum(bucket[7] for bucket in buckets) / connects, 1) if connects else None,
+    }
+
+
+class MetricsStore:
+    """Per-key minute/hour/day buckets in one memory-mapped file.
+
+    A file with another layout (different sizes or version) is reset.
+    Opening and :meth:`flush` do file I/O and belong in an executor.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_keys: int = DEFAULT_MAX_KEYS,
+        minutes: int = DEFAULT_MINUTES,
+        hours: int = DEFAULT_HOURS,
+        days: int = DEFAULT_DAYS,
+    ) -> None:
+        self.path = path
+        self.max_keys = max_keys
+        self.rings = {"minute": minutes, "hour": hours, "day": days}
+        self._ring_offsets = {"minute": 0, "hour": minutes * _BUCKET.size, "day": (minutes + hours) * _BUCKET.size}
+        self._slot_size = (minutes + hours + days) * _BUCKET.size
+        self._data_offset = _HEADER.size + max_keys * _KEY.size
+        self.size = self._data_offset + max_keys * self._slot_size
+        header = _HEADER.pack(_MAGIC, _VERSION, max_keys, minutes, hours, days)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            valid = os.fstat(fd).st_size == self.size and os.pread(fd, _HEADER.size, 0) == header
+            if not valid:
+                _LOGGER.debug("Creating MeRGBW metrics file %s (%s bytes)", path, self.size)
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, header, 0)
+            self._map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self._slots: Dict[str, int] = {}
+        for slot in range(max_keys):
+            raw, _seen = _KEY.unpack_from(self._map, _HEADER.size + slot * _KEY.size)
+            key = raw.rstrip(b"\0").decode("utf-8", "replace")
+            if key:
+                self._slots[key] = slot
+
+    def keys(self) -> List[str]:
+        return sorted(self._slots)
+
+    def __contains__(self, key: str) -> bool:
+        return _stored_key(key) in self._slots
+
+    def _slot(self, key: str, now: int) -> int:
+        key = _stored_key(key)
+        slot = self._slots.get(key)
+        if slot is None:
+            used = set(self._slots.values())
+            free = next((index for index in range(self.max_keys) if index not in used), None)
+            if free is None:
+                # Reuse the slot that was written to longest ago.
+                free = min(used, key=lambda index: _KEY.unpack_from(self._map, _HEADER.size + index * _KEY.size)[1])
+                del self._slots[next(name for name, index in self._slots.items() if index == free)]
+            start = self._data_offset + free * self._slot_size
+            self._map[start : start + self._slot_size] = bytes(self._slot_size)
+            slot = self._slots[key] = free
+        _KEY.pack_into(self._map, _HEADER.size + slot * _KEY.size, key.encode(), now)
+        return slot
+
+    def _offset(self, slot: int, resolution: str, index: int) -> int:
+        position = index % self.rings[resolution]
+        return self._data_offset + slot * self._slot_size + self._ring_offsets[resolution] + position * _BUCKET.size
+
+    def record(
+        self,
+        key: str,
+        now: Optional[float] = None,
+        *,
+        command_ms: Optional[float] = None,
+        failed: bool = False,
+        connect_ms: Optional[float] = None,
+        reconnect: bool = False,
+    ) -> None:
+        """Add one event to the current minute, hour and day buckets of ``key``."""
+        now = int(time.time() if now is None else now)
+        slot = self._slot(key, now)
+        for resolution, period in RESOLUTIONS.items():
+            index = now // period
+            offset = self._offset(slot, resolution, index)
+            bucket = list(_BUCKET.unpack_from(self._map, offset))
+            if bucket[0] != index:
+                bucket = _empty(index)
+            if command_ms is not None:
+                bucket[1] += 1
+                bucket[2] += bool(failed)
+                bucket[5] += command_ms
+                bucket[6] = max(bucket[6], command_ms)
+            if connect_ms is not None:
+                bucket[3] += 1
+                bucket[7] += connect_ms
+            bucket[4] += bool(reconnect)
+            _BUCKET.pack_into(self._map, offset, *bucket)
+
+    def _window(self, key: str, resolution: str, first: int, last: int) -> list:
+        slot = self._slots.get(_stored_key(key))
+        if slot is None:
+            return []
+        buckets = []
+        for index in range(max(first, last - self.rings[resolution] + 1), last + 1):
+            bucket = _BUCKET.unpack_from(self._map, self._offset(slot, resolution, index))
+            if bucket[0] == index:
+                buckets.append(bucket)
+        return buckets
+
+    def buckets(
+        self, key: str, resolution: str = "hour", count: Optional[int] = None, now: Optional[float] = None
+    ) -> List[dict]:
+        """Return the last ``count`` non-empty buckets of ``key``, oldest first."""
+        period = RESOLUTIONS[resolution]
+        last = int(time.time() if now is None else now) // period
+        count = self.rings[resolution] if count is None else min(count, self.rings[resolution])
+        return [
+            {"start": bucket[0] * period, **_summarize([bucket])}
+            for bucket in self._window(key, resolution, last - count + 1, last)
+        ]
+
+    def summary(self, key: str, now: Optional[float] = None) -> dict:
+        """Return the last hour, the last day and this week against the week before."""
+        now = int(time.time() if now is None else now)
+        minute, hour, day = now // 60, now // 3600, now // 86400
+        return {
+            "last_hour": _summarize(self._window(key, "minute", minute - 59, minute)),
+            "last_day": _summarize(self._window(key, "hour", hour - 23, hour)),
+            "this_week": _summarize(self._window(key, "day", day - 6, day)),
+            "previous_week": _summarize(self._window(key, "day", day - 13, day - 7)),
+        }
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        if not self._map.closed:
+            self._map.flush()
+            self._map.close()
@@ -0,0 +1,83 @@
+"""Fixed-size packet trace per device, exported through diagnostics."""
+
+import asyncio
+import time
+from array import array
+from typing import Iterable, List
+
+DEFAULT_TRACE_SIZE = 256
+
+TX = 0
+RX = 1
+OUTCOME_OK = 0
+OUTCOME_ERROR = 1
+
+_KINDS = ("tx", "rx")
+_OUTCOMES = ("ok", "error")
+
+
+class PacketTrace:
+    """Ring buffer of written and notified frames.
+
+    Every slot is allocated up front: recording a frame is a handful of
+    index assignments with no allocation besides the frame reference, so the
+    trace can stay on in production.
+    """
+
+    def __init__(self, size: int = DEFAULT_TRACE_SIZE) -> None:
+        self.size = size
+        self._time = array("d", [0.0]) * size
+        self._latency = array("d", [0.0]) * size
+        self._kind = bytearray(size)
+        self._outcome = bytearray(size)
+        self._frames: List[bytes] = [b""] * size
+        self._next = 0
+        self.recorded = 0
+
+    def record(self, kind: int, frame: bytes, latency: float = 0.0, outcome: int = OUTCOME_OK) -> None:
+        idx = self._next
+        self._time[idx] = time.monotonic()
+        self._latency[idx] = latency
+        self._kind[idx] = kind
+        self._outcome[idx] = outcome
+        self._frames[idx] = frame
+        self._next = (idx + 1) % self.size
+        self.recorded += 1
+
+    def export(self) -> List[dict]:
+        """Return entries oldest first; ``t`` is seconds since the oldest entry."""
+        count = min(self.recorded, self.size)
+        start = (self._next - count) % self.size
+        order = [(start + offset) % self.size for offset in range(count)]
+        if not order:
+            return []
+        origin = self._time[order[0]]
+        return [
+            {
+                "t": round(self._time[idx] - origin, 6),
+                "kind": _KINDS[self._kind[idx]],
+                "frame": self._frames[idx].hex(),
+                "latency_ms": round(self._latency[idx] * 1000, 3),
+                "outcome": _OUTCOMES[self._outcome[idx]],
+            }
+            for idx in order
+        ]
+
+
+async def replay(entries: Iterable[dict], client, write_uuid: str, speed: float = 1.0) -> int:
+    """Write the ``tx`` frames of an exported trace to ``client`` with their original spacing.
+
+    ``speed`` scales the timing (2.0 replays twice as fast, 0 disables waits).
+    Returns the number of frames written.
+    """
+    written = 0
+    last_t = None
+    for entry in entries:
+        if entry.get("kind") != "tx" or entry.get("outcome") != "ok":
+            continue
+        if last_t is not None and speed > 0:
+            await asyncio.sleep(max(0.0, entry["t"] - last_t) / speed)
+        last_t = entry["t"]
+        await client.write_gatt_char(write_uuid, bytes.fromhex(entry["frame"]))
+        written += 1
+    return written
@@ -0,0 +1,140 @@
+"""Named presets compiled once per profile into immutable packet bundles."""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .protocol import ProtocolProfile, decode_packet, get_profile, list_profiles, resolve_profile_key
+
+_LOGGER = logging.getLogger(__name__)
+
+# Definition fields that select the light's mode; a preset may set one.
+MODE_FIELDS = ("rgb_color", "scene_name", "scene_id", "music_mode")
+FIELDS = ("power", "brightness", "scene_param") + MODE_FIELDS
+
+
+@dataclass(frozen=True)
+class PresetBundle:
+    """Packets for one profile plus the entity state they produce."""
+
+    packets: Tuple[bytes, ...]
+    updates: Tuple[Tuple[str, object], ...]
+
+
+def validate_definition(definition: dict) -> dict:
+    """Return the definition restricted to known, set fields, or raise ValueError."""
+    definition = {key: definition[key] for key in FIELDS if definition.get(key) is not None}
+    modes = [key for key in MODE_FIELDS if key in definition]
+    if len(modes) > 1:
+        raise ValueError(f"set only one of {', '.join(modes)}")
+    if definition.get("power") is False and len(definition) > 1:
+        raise ValueError("a preset that turns the light off cannot set anything else")
+    if "scene_param" in definition and not {"scene_name", "scene_id"} & definition.keys():
+        raise ValueError("scene_param needs scene_name or scene_id")
+    if not definition:
+        raise ValueError("preset is empty")
+    return definition
+
+
+def compile_preset(profile: ProtocolProfile, definition: dict) -> PresetBundle:
+    """Encode a validated definition for ``profile``; raise ValueError if unsupported."""
+    if definition.get("power") is False:
+        return PresetBundle(tuple(profile.build_power(False)), (("_is_on", False),))
+
+    packets: List[bytes] = list(profile.build_power(True))
+    updates: Dict[str, object] = {"_is_on": True}
+    scene_param = definition.get("scene_param")
+    if "rgb_color" in definition:
+        rgb = tuple(definition["rgb_color"])
+        packets.extend(profile.build_color(*rgb))
+        updates.update(_rgb_color=rgb, _effect=None)
+    elif "scene_name" in definition:
+        scene = profile.build_scene(definition["scene_name"])
+        if not scene:
+            raise ValueError(f"scene '{definition['scene_name']}' is not supported")
+        if scene_param is not None:
+            scene = _scene_by_id(profile, int.from_bytes(decode_packet(scene[0])[1], "big"), scene_param)
+        packets.extend(scene)
+        updates.update(_effect=definition["scene_name"], _scene_param=scene_param)
+    elif "scene_id" in definition:
+        packets.extend(_scene_by_id(profile, definition["scene_id"], scene_param))
+        updates.update(_effect=f"Scene {definition['scene_id']}", _scene_param=scene_param)
+    elif "music_mode" in definition:
+        music = profile.build_music_mode(definition["music_mode"]) if hasattr(profile, "build_music_mode") else []
+        if not music:
+            raise ValueError("music mode is not supported")
+        packets.extend(music)
+        updates["_music_mode"] = definition["music_mode"]
+    if "brightness" in definition:
+        packets.extend(profile.build_brightness(definition["brightness"]))
+        updates["_brightness"] = definition["brightness"]
+    return PresetBundle(tuple(packets), tuple(updates.items()))
+
+
+def _scene_by_id(profile: ProtocolProfile, scene_id: int, scene_param: Optional[int]) -> List[bytes]:
+    if not hasattr(profile, "build_scene_by_id"):
+        raise ValueError("scene IDs and scene parameters are not supported")
+    return profile.build_scene_by_id(scene_id, scene_param)
+
+
+class PresetLibrary:
+    """Preset definitions with their bundles for every profile that supports them.
+
+    Bundles are compiled when a preset is saved and when the library is
+    loaded, so applying a preset never validates or encodes anything. Only
+    the definitions are stored: bundles written by an older encoder would go
+    stale when the protocol code changes.
+    """
+
+    def __init__(self) -> None:
+        self._definitions: Dict[str, dict] = {}
+        self._bundles: Dict[str, Dict[str, PresetBundle]] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._definitions
+
+    def names(self) -> List[str]:
+        return sorted(self._definitions)
+
+    def save(self, name: str, definition: dict) -> Dict[str, PresetBundle]:
+        """Validate and compile ``definition`` for every profile; raise ValueError if none fits."""
+        definition = validate_definition(definition)
+        bundles: Dict[str, PresetBundle] = {}
+        errors = []
+        for key, label in list_profiles():
+            try:
+                bundles[key] = compile_preset(get_profile(key), definition)
+            except ValueError as err:
+                errors.append(f"{label}: {err}")
+        if not bundles:
+            raise ValueError("; ".join(errors))
+        self._definitions[name] = definition
+        self._bundles[name] = bundles
+        return bundles
+
+    def remove(self, name: str) -> None:
+        self._definitions.pop(name, None)
+        self._bundles.pop(name, None)
+
+    def bundle(self, name: str, profile_key: Optional[str]) -> PresetBundle:
+        """Return the bundle of ``name`` for a light's profile."""
+        if name not in self._bundles:
+            raise KeyError(name)
+        bundle = self._bundles[name].get(resolve_profile_key(profile_key))
+        if bundle is None:
+            raise ValueError(f"preset '{name}' is not supported by this profile")
+        return bundle
+
+    def to_dict(self) -> dict:
+        return {name: {"definition": definition} for name, definition in self._definitions.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PresetLibrary":
+        """Load stored definitions and compile them with the current encoder."""
+        library = cls()
+        for name, preset in (data or {}).items():
+            try:
+                library.save(name, preset["definition"])
+            except ValueError as err:
+                _LOGGER.warning("Dropping stored preset '%s': %s", name, err)
+        return library
@@ -0,0 +1,90 @@
+"""On-demand profiling of the integration's own code paths."""
+
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import re
+import time
+import tracemalloc
+from pathlib import Path
+
+_LOGGER = logging.getLogger(__name__)
+
+PROFILE_MODE_CPU = "cpu"
+PROFILE_MODE_MEMORY = "memory"
+PROFILE_MODES = (PROFILE_MODE_CPU, PROFILE_MODE_MEMORY)
+TOP_ENTRIES = 40
+# Enough to see the caller of an allocation without slowing every allocation down.
+TRACEMALLOC_FRAMES = 3
+# cProfile slows every call on the event loop; keep runs short.
+MAX_DURATION_SECONDS = 300
+
+_PACKAGE_DIR = str(Path(__file__).resolve().parent)
+
+
+def _cpu_report(profiler: cProfile.Profile, duration: float) -> str:
+    """Top functions by cumulative and own time, limited to this package."""
+    out = io.StringIO()
+    out.write(f"MeRGBW CPU profile over {duration:.0f}s\n\n")
+    stats = pstats.Stats(profiler, stream=out)
+    restriction = re.escape(_PACKAGE_DIR)
+    for sort_key in ("cumulative", "tottime"):
+        out.write(f"== Top functions by {sort_key} ==\n")
+        stats.sort_stats(sort_key).print_stats(restriction, TOP_ENTRIES)
+    # Who calls into the integration from Home Assistant (state writes, services).
+    out.write("== Callers of state writes ==\n")
+    stats.print_callers("async_write_ha_state")
+    return out.getvalue()
+
+
+def _memory_report(snapshot: tracemalloc.Snapshot, duration: float) -> str:
+    """Top allocation sites inside this package."""
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(True, f"{_PACKAGE_DIR}/*")])
+    lines = [f"MeRGBW allocation profile over {duration:.0f}s", ""]
+    for title, key in (("line", "lineno"), ("traceback", "traceback")):
+        lines.append(f"== Top allocations by {title} ==")
+        for stat in snapshot.statistics(key)[:TOP_ENTRIES]:
+            lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            frames = stat.traceback.format() if key == "traceback" else [f"  {stat.traceback[0]}"]
+            lines.extend(frames)
+        lines.append("")
+    return "\n".join(lines)
+
+
+async def async_profile(hass, duration: float, mode: str) -> str:
+    """Profile for ``duration`` seconds and write a report to the config dir.
+
+    CPU mode runs cProfile on the event loop thread and reports only frames
+    from this package (``_run_with_client``, ``control._send_packets``, the
+    protocol builders, state writes). Memory mode takes a ``tracemalloc``
+    snapshot filtered to this package. Returns the report path.
+
+    Raises ``ValueError`` when another profiler is already active on the
+    event loop thread (Python 3.12+ allows only one).
+    """
+    if mode == PROFILE_MODE_MEMORY:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        try:
+            await asyncio.sleep(duration)
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+        report = await hass.async_add_executor_job(_memory_report, snapshot, duration)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.disable()
+        report = await hass.async_add_executor_job(_cpu_report, profiler, duration)
+
+    path = hass.config.path(f"mergbw_profile_{mode}_{time.strftime('%Y%m%d_%H%M%S')}.txt")
+    await hass.async_add_executor_job(Path(path).write_text, report)
+    _LOGGER.info("MeRGBW %s profile written to %s", mode, path)
+    return path
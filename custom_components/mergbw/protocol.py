@@ -2,7 +2,8 @@
 
 import colorsys
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 
 
 def _checksum(packet: Iterable[int]) -> int:
@@ -21,6 +22,28 @@ def _build_packet(cmd: int, payload: bytes = b"") -> bytes:
     return bytes(data)
 
 
+def decode_packet(data: bytes) -> Optional[Tuple[int, bytes]]:
+    """Return ``(cmd, payload)`` for a well-formed frame, else None."""
+    if len(data) < 5 or data[0] != 0x55 or data[3] != len(data):
+        return None
+    if _checksum(data[:-1]) != data[-1]:
+        return None
+    return data[1], bytes(data[4:-1])
+
+
+def split_frames(data: bytes) -> List[bytes]:
+    """Split a buffer holding one or more concatenated frames."""
+    frames = []
+    idx = 0
+    while idx + 5 <= len(data) and data[idx] == 0x55:
+        length = data[idx + 3]
+        if length < 5 or idx + length > len(data):
+            break
+        frames.append(bytes(data[idx:idx + length]))
+        idx += length
+    return frames
+
+
 @dataclass
 class ProtocolProfile:
     name: str
@@ -29,6 +52,17 @@ class ProtocolProfile:
     notify_char_uuid: str
     effect_list: List[str]
 
+    # Whether the firmware parses several frames sent in one GATT write.
+    # None means unknown: the transport probes it once per device.
+    frame_coalescing = None
+    # Starting write budget (frames per second) and burst size. The transport
+    # tunes the rate from notify feedback, within ``write_rate_max``.
+    write_rate = 10.0
+    write_burst = 3
+    write_rate_max = 40.0
+    # Commands that select the light's mode; writing one replaces the others.
+    mode_commands = frozenset({0x03, 0x06, 0x07})
+
     def build_power(self, on: bool) -> List[bytes]:
         raise NotImplementedError
 
@@ -48,6 +82,8 @@ class ProtocolProfile:
 class SunsetLightProfile(ProtocolProfile):
     """Original Sunset Light behavior (default)."""
 
+    frame_coalescing = False
+
     def __init__(self) -> None:
         self.name = "Sunset Light"
         self.service_uuid = "0000fff0-0000-1000-8000-00805f9b34fb"
@@ -100,9 +136,20 @@ class SunsetLightProfile(ProtocolProfile):
         return [_build_packet(0x06, payload)]
 
 
+@lru_cache(maxsize=4096)
+def _hexagon_color_packet(r: int, g: int, b: int) -> bytes:
+    """Hue (0-360) and saturation (0-1000) frame; curves and streams repeat colours."""
+    h, s, _v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+    return _build_packet(0x03, int(h * 360).to_bytes(2, "big") + int(s * 1000).to_bytes(2, "big"))
+
+
 class HexagonProfile(ProtocolProfile):
     """Hexagon variant observed via captures."""
 
+    write_rate = 20.0
+    write_burst = 4
+    write_rate_max = 60.0
+
     def __init__(self) -> None:
         self.name = "Hexagon Light"
         self.service_uuid = "0000fff0-0000-1000-8000-00805f9b34fb"
@@ -185,10 +232,7 @@ class HexagonProfile(ProtocolProfile):
         return [_build_packet(0x05, self._int_to_bytes_be(scaled))]
 
     def build_color(self, r: int, g: int, b: int) -> List[bytes]:
-        h, s, _v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
-        hue_deg = int(h * 360)
-        sat = int(s * 1000)
-        return [_build_packet(0x03, self._int_to_bytes_be(hue_deg) + self._int_to_bytes_be(sat))]
+        return [_hexagon_color_packet(r, g, b)]
 
     def build_scene(self, scene_name: str) -> List[bytes]:
         scene_id = self._scene_map.get(scene_name.lower())
@@ -266,10 +310,26 @@ PROFILE_SUNSET = "sunset_light"
 PROFILE_HEXAGON = "hexagon_light"
 
 
+_PROFILE_CLASSES = {PROFILE_SUNSET: SunsetLightProfile, PROFILE_HEXAGON: HexagonProfile}
+_PROFILES: Dict[str, ProtocolProfile] = {}
+
+
+def resolve_profile_key(profile_key: Optional[str]) -> str:
+    """Return the profile key actually used for ``profile_key`` (Sunset when unknown)."""
+    return profile_key if profile_key in _PROFILE_CLASSES else PROFILE_SUNSET
+
+
 def get_profile(profile_key: Optional[str]) -> ProtocolProfile:
-    if profile_key == PROFILE_HEXAGON:
-        return HexagonProfile()
-    return SunsetLightProfile()
+    """Return the shared profile for ``profile_key`` (Sunset when unknown).
+
+    Profiles are read-only command encoders, so every light of a kind uses
+    one instance instead of rebuilding the effect tables per light.
+    """
+    key = resolve_profile_key(profile_key)
+    profile = _PROFILES.get(key)
+    if profile is None:
+        profile = _PROFILES[key] = _PROFILE_CLASSES[key]()
+    return profile
 
 
 def list_profiles() -> List[tuple[str, str]]:
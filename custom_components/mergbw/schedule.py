@@ -0,0 +1,109 @@
+"""Recurring power schedules compiled into the Hexagon on-device timer (cmd 0x0A).
+
+The firmware has one "on" and one "off" timer, each with a time of day and
+a weekday mask (bit 0 = Monday). Rules that fit those two timers run on the
+light itself, so daily on/off cycles need no BLE connection at run time.
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+ALL_DAYS = 0x7F
+
+
+def days_mask(days) -> int:
+    """Return the weekday bitmask for an int mask or a list of weekday names."""
+    if isinstance(days, int):
+        return days & ALL_DAYS
+    mask = 0
+    for day in days:
+        if isinstance(day, str) and day.strip()[:3].lower() in WEEKDAY_NAMES:
+            mask |= 1 << WEEKDAY_NAMES.index(day.strip()[:3].lower())
+    return mask
+
+
+def parse_time(value) -> Tuple[int, int]:
+    """Return ``(hour, minute)`` from ``"HH:MM[:SS]"`` or a ``datetime.time``."""
+    if isinstance(value, str):
+        parts = value.split(":")
+        hour, minute = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
+    else:
+        hour, minute = value.hour, value.minute
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"invalid time {value!r}")
+    return hour, minute
+
+
+@dataclass(frozen=True)
+class PowerSchedule:
+    """Arguments of ``HexagonProfile.build_schedule``."""
+
+    on_enabled: bool = False
+    on_hour: int = 0
+    on_minute: int = 0
+    on_days_mask: int = 0
+    off_enabled: bool = False
+    off_hour: int = 0
+    off_minute: int = 0
+    off_days_mask: int = 0
+
+    def args(self) -> tuple:
+        return tuple(asdict(self).values())
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def events(self) -> List[Tuple[int, int, bool, int]]:
+        """Return ``(hour, minute, power, days_mask)`` for each enabled timer."""
+        events = []
+        if self.on_enabled and self.on_days_mask:
+            events.append((self.on_hour, self.on_minute, True, self.on_days_mask))
+        if self.off_enabled and self.off_days_mask:
+            events.append((self.off_hour, self.off_minute, False, self.off_days_mask))
+        return events
+
+    def power_at(self, now: datetime) -> Optional[bool]:
+        """Return the power state a timer sets at ``now`` (to the minute), if any."""
+        for hour, minute, power, mask in self.events():
+            if (now.hour, now.minute) == (hour, minute) and mask & (1 << now.weekday()):
+                return power
+        return None
+
+
+def compile_rules(rules: Iterable[dict]) -> PowerSchedule:
+    """Compile ``[{"action": "on"|"off", "at": "HH:MM", "days": [...]}]`` into the device timers.
+
+    Rules for the same action must share a time of day (their weekdays are
+    merged), since the firmware has a single timer per action. Raises
+    ValueError for rules that do not fit.
+    """
+    timers = {}
+    for rule in rules:
+        action = rule["action"]
+        if action not in ("on", "off"):
+            raise ValueError(f"unknown action {action!r}")
+        at = parse_time(rule["at"])
+        mask = days_mask(rule.get("days", ALL_DAYS))
+        if not mask:
+            continue
+        known = timers.get(action)
+        if known is not None and known[0] != at:
+            raise ValueError(
+                f"the light has one '{action}' timer; "
+                f"{known[0][0]:02d}:{known[0][1]:02d} and {at[0]:02d}:{at[1]:02d} cannot both be used"
+            )
+        timers[action] = (at, (known[1] if known else 0) | mask)
+    on = timers.get("on")
+    off = timers.get("off")
+    return PowerSchedule(
+        on_enabled=on is not None,
+        on_hour=on[0][0] if on else 0,
+        on_minute=on[0][1] if on else 0,
+        on_days_mask=on[1] if on else 0,
+        off_enabled=off is not None,
+        off_hour=off[0][0] if off else 0,
+        off_minute=off[0][1] if off else 0,
+        off_days_mask=off[1] if off else 0,
+    )
@@ -0,0 +1,131 @@
+"""Domain-wide write scheduler shared by all MeRGBW lights."""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+# Packets per second granted to one adapter or proxy across all its lights.
+DEFAULT_ADAPTER_PPS = 40.0
+DEFAULT_ADAPTER = "default"
+
+
+class _AdapterQueue:
+    """Round-robin write queue for one Bluetooth adapter or proxy."""
+
+    def __init__(self, packets_per_second: float) -> None:
+        self.interval = 1.0 / packets_per_second if packets_per_second > 0 else 0.0
+        self.busy = False
+        self.next_free = 0.0
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self.ring: Deque[str] = deque()
+        self.depth = 0
+        self.max_depth = 0
+        self.writes = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.device_writes: Dict[str, int] = {}
+
+    def enqueue(self, device: str, fut: asyncio.Future) -> None:
+        queue = self.waiters.setdefault(device, deque())
+        if not queue:
+            self.ring.append(device)
+        queue.append(fut)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def discard(self, device: str, fut: asyncio.Future) -> None:
+        queue = self.waiters.get(device)
+        if queue and fut in queue:
+            queue.remove(fut)
+            self.depth -= 1
+            if not queue:
+                self.ring.remove(device)
+
+    def grant_next(self) -> bool:
+        """Hand the adapter to the next device in round-robin order."""
+        while self.ring:
+            device = self.ring.popleft()
+            queue = self.waiters[device]
+            fut = queue.popleft()
+            self.depth -= 1
+            if queue:
+                self.ring.append(device)
+            if not fut.done():
+                fut.set_result(None)
+                return True
+        return False
+
+
+class WriteScheduler:
+    """Give every device on an adapter fair, paced access to the radio.
+
+    Each GATT write takes one slot. Devices waiting on the same adapter are
+    served round-robin, so one light streaming frames adds at most one write
+    per turn to another light's latency, and the adapter as a whole never
+    exceeds its packets-per-second budget.
+    """
+
+    def __init__(self, packets_per_second: float = DEFAULT_ADAPTER_PPS) -> None:
+        self._pps = packets_per_second
+        self._adapters: Dict[str, _AdapterQueue] = {}
+
+    def _adapter(self, adapter: Optional[str]) -> _AdapterQueue:
+        key = adapter or DEFAULT_ADAPTER
+        queue = self._adapters.get(key)
+        if queue is None:
+            queue = self._adapters[key] = _AdapterQueue(self._pps)
+        return queue
+
+    @asynccontextmanager
+    async def slot(self, adapter: Optional[str], device: str):
+        """Hold the adapter for one write issued on behalf of ``device``."""
+        queue = self._adapter(adapter)
+        start = time.monotonic()
+        if queue.busy or queue.ring:
+            fut = asyncio.get_running_loop().create_future()
+            queue.enqueue(device, fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    # Granted just before cancellation: pass the slot on.
+                    self._release(queue)
+                else:
+                    queue.discard(device, fut)
+                raise
+        queue.busy = True
+        try:
+            delay = queue.next_free - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            waited = time.monotonic() - start
+            queue.writes += 1
+            queue.wait_total += waited
+            queue.wait_max = max(queue.wait_max, waited)
+            queue.device_writes[device] = queue.device_writes.get(device, 0) + 1
+            yield
+        finally:
+            queue.next_free = time.monotonic() + queue.interval
+            self._release(queue)
+
+    @staticmethod
+    def _release(queue: _AdapterQueue) -> None:
+        if not queue.grant_next():
+            queue.busy = False
+
+    def metrics(self) -> dict:
+        """Return queue metrics per adapter for diagnostics."""
+        return {
+            adapter: {
+                "packets_per_second": self._pps,
+                "queue_depth": queue.depth,
+                "max_queue_depth": queue.max_depth,
+                "writes": queue.writes,
+                "avg_wait_ms": round(queue.wait_total / queue.writes * 1000, 2) if queue.writes else 0.0,
+                "max_wait_ms": round(queue.wait_max * 1000, 2),
+                "device_writes": dict(queue.device_writes),
+            }
+            for adapter, queue in self._adapters.items()
+        }
@@ -0,0 +1,91 @@
+"""In-memory light snapshots for alert flashes.
+
+A snapshot records what a light shows (power, colour, brightness, scene or
+scene ID, music mode). Restoring it compares the snapshot with what the
+light shows now and encodes only the attributes the flash changed, as one
+transaction, so a light that was only recoloured gets one colour frame back
+instead of every attribute.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+RGB = Tuple[int, int, int]
+# Lights name numeric scenes "Scene <id>" (set_scene_id, sync_scene).
+_SCENE_ID = re.compile(r"Scene (\d+)")
+
+
+def scene_id_of(effect: Optional[str]) -> Optional[int]:
+    """Return the numeric scene ID behind an effect name, if it is one."""
+    match = _SCENE_ID.fullmatch(effect or "")
+    return int(match.group(1)) if match else None
+
+
+@dataclass(frozen=True)
+class LightSnapshot:
+    """What one light shows."""
+
+    is_on: bool
+    brightness: Optional[int] = None
+    rgb_color: Optional[RGB] = None
+    effect: Optional[str] = None
+    scene_param: Optional[int] = None
+    music_mode: object = None
+
+    def as_dict(self) -> dict:
+        return {
+            "is_on": self.is_on,
+            "brightness": self.brightness,
+            "rgb_color": list(self.rgb_color) if self.rgb_color is not None else None,
+            "effect": self.effect,
+            "scene_param": self.scene_param,
+            "music_mode": self.music_mode,
+        }
+
+    def restore(self, profile, current: "LightSnapshot") -> Tuple[List[bytes], dict, List[str]]:
+        """Return ``(packets, entity updates, changed attributes)`` to go from ``current`` back to this snapshot.
+
+        The light mode (music mode, scene ID, named scene or colour) is
+        re-sent when it differs; brightness and power only when they changed.
+        """
+        if not self.is_on:
+            if not current.is_on:
+                return [], {}, []
+            return list(profile.build_power(False)), {"_is_on": False}, ["power"]
+
+        packets: List[bytes] = []
+        changed: List[str] = []
+        if not current.is_on:
+            packets.extend(profile.build_power(True))
+            changed.append("power")
+        scene_id = scene_id_of(self.effect)
+        if self.music_mode is not None:
+            if current.music_mode != self.music_mode:
+                packets.extend(profile.build_music_mode(self.music_mode))
+                changed.append("music_mode")
+        elif scene_id is not None and hasattr(profile, "build_scene_by_id"):
+            if (current.effect, current.scene_param, current.music_mode) != (self.effect, self.scene_param, None):
+                packets.extend(profile.build_scene_by_id(scene_id, self.scene_param))
+                changed.append("scene")
+        elif self.effect is not None:
+            if (current.effect, current.music_mode) != (self.effect, None):
+                packets.extend(profile.build_scene(self.effect))
+                changed.append("scene")
+        elif self.rgb_color is not None:
+            if (current.rgb_color, current.effect, current.music_mode) != (self.rgb_color, None, None):
+                packets.extend(profile.build_color(*self.rgb_color))
+                changed.append("color")
+        if self.brightness is not None and current.brightness != self.brightness:
+            packets.extend(profile.build_brightness(self.brightness))
+            changed.append("brightness")
+
+        updates = {
+            "_is_on": True,
+            "_brightness": self.brightness,
+            "_rgb_color": self.rgb_color,
+            "_effect": self.effect,
+            "_scene_param": self.scene_param,
+            "_music_mode": self.music_mode,
+        }
+        return packets, updates, changed
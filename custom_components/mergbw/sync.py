@@ -0,0 +1,88 @@
+"""Release the same command on several lights at the same instant.
+
+Sending a scene light by light starts each animation when its own packets
+arrive, which on a wall of panels puts them visibly out of phase. Here every
+light first connects and gets ready (staging), and only once all of them are
+staged is a shared release event set; each light then does nothing but its
+final, unpaced write. The spread of the write-completion times is reported
+as the achieved skew.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+_LOGGER = logging.getLogger(__name__)
+
+STAGE_TIMEOUT_SECONDS = 15.0
+
+# ``participant(staged, release)`` connects and prepares, calls ``staged()``,
+# waits for ``release`` and returns ``time.perf_counter()`` taken when its
+# final write completed.
+Participant = Callable[[Callable[[], None], asyncio.Event], Awaitable[float]]
+
+
+async def async_synchronized_apply(
+    participants: Dict[str, Participant],
+    stage_timeout: float = STAGE_TIMEOUT_SECONDS,
+) -> dict:
+    """Stage every participant, release them together and report the skew.
+
+    Participants that fail while staging are reported and left out; those
+    not staged within ``stage_timeout`` are cancelled so that the others are
+    not held back.
+    """
+    release = asyncio.Event()
+    staged: Dict[str, asyncio.Event] = {name: asyncio.Event() for name in participants}
+    tasks = {
+        name: asyncio.ensure_future(participant(staged[name].set, release))
+        for name, participant in participants.items()
+    }
+    stage_start = time.perf_counter()
+    deadline = stage_start + stage_timeout
+    waiters = {name: asyncio.ensure_future(staged[name].wait()) for name in participants}
+    try:
+        while True:
+            waiting = [name for name in participants if not staged[name].is_set() and not tasks[name].done()]
+            remaining = deadline - time.perf_counter()
+            if not waiting or remaining <= 0:
+                break
+            await asyncio.wait(
+                [waiters[name] for name in waiting] + [tasks[name] for name in waiting],
+                timeout=remaining,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+    finally:
+        for waiter in waiters.values():
+            waiter.cancel()
+
+    failed: Dict[str, str] = {}
+    for name, task in tasks.items():
+        if not staged[name].is_set() and not task.done():
+            task.cancel()
+            failed[name] = "not staged in time"
+    stage_ms = (time.perf_counter() - stage_start) * 1000
+    released_at = time.perf_counter()
+    release.set()
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    completion_ms: Dict[str, float] = {}
+    for name, result in zip(tasks, results):
+        if name in failed:
+            continue
+        if isinstance(result, BaseException):
+            failed[name] = str(result) or type(result).__name__
+        else:
+            completion_ms[name] = round((result - released_at) * 1000, 3)
+    skew_ms = round(max(completion_ms.values()) - min(completion_ms.values()), 3) if completion_ms else None
+    report = {
+        "lights": len(participants),
+        "released": len(completion_ms),
+        "stage_ms": round(stage_ms, 3),
+        "skew_ms": skew_ms,
+        "completion_ms": completion_ms,
+        "failed": failed,
+    }
+    _LOGGER.info("Synchronized apply: %s", report)
+    return report
@@ -0,0 +1,207 @@
+"""Command-lifecycle tracing spans.
+
+A traced command opens a root span carrying the Home Assistant ``Context``
+id of the service call that caused it. Everything it does underneath (queue
+wait, device lookup, connect, each GATT write, the state write) opens a child
+span through :func:`span`, which finds its parent in a context variable, so
+the transport and the light do not pass tracers around. Without an active
+root span :func:`span` returns a shared no-op context manager, which keeps
+tracing free when it is off.
+
+Finished spans go to exporters: :class:`MemoryExporter` keeps the most recent
+ones in process (shown in diagnostics), :class:`JsonLinesExporter` appends them
+to a rotating JSON-lines file from an executor thread.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import secrets
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Iterable, List, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_SPANS = 2000
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+_current: ContextVar[Optional["Span"]] = ContextVar("mergbw_span", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+class Span:
+    """One timed phase of a command."""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "context_id",
+        "attributes",
+        "start",
+        "duration",
+        "error",
+        "_started",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], context_id: Optional[str], attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = secrets.token_hex(4)
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.context_id = context_id or (parent.context_id if parent else None)
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "context_id": self.context_id,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Create spans and hand finished ones to the exporters."""
+
+    def __init__(self, exporters: Iterable) -> None:
+        self.exporters = list(exporters)
+
+    @contextlib.contextmanager
+    def start(self, name: str, context_id: Optional[str] = None, **attributes):
+        """Open a span; it is a child of the current span, if any."""
+        span = Span(self, name, _current.get(), context_id, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as err:
+            span.error = f"{type(err).__name__}: {err}" if str(err) else type(err).__name__
+            raise
+        finally:
+            _current.reset(token)
+            span.duration = time.perf_counter() - span._started
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception as err:  # noqa: BLE001 - tracing must not break commands
+                    _LOGGER.debug("Span export failed: %s", err)
+
+    @property
+    def memory(self) -> Optional["MemoryExporter"]:
+        return next((exporter for exporter in self.exporters if isinstance(exporter, MemoryExporter)), None)
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            close = getattr(exporter, "close", None)
+            if close is not None:
+                close()
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def span(name: str, **attributes):
+    """Open a child of the current span, or do nothing when not tracing."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return parent.tracer.start(name, **attributes)
+
+
+class MemoryExporter:
+    """Keep the most recent spans in process."""
+
+    def __init__(self, size: int = DEFAULT_MEMORY_SPANS) -> None:
+        self._spans: deque = deque(maxlen=size)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span.to_dict())
+
+    def spans(self, predicate: Optional[Callable[[dict], bool]] = None) -> List[dict]:
+        """Return recorded spans oldest first, optionally only whole traces matching ``predicate``."""
+        spans = list(self._spans)
+        if predicate is None:
+            return spans
+        traces = {entry["trace_id"] for entry in spans if predicate(entry)}
+        return [entry for entry in spans if entry["trace_id"] in traces]
+
+
+class JsonLinesExporter:
+    """Append spans to a JSON-lines file, rotated at ``max_bytes``.
+
+    Lines are buffered on the event loop and written by one executor job at a
+    time, so exporting never blocks the loop on disk I/O.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._pending: List[str] = []
+        self._writing: Optional[asyncio.Future] = None
+
+    def export(self, span: Span) -> None:
+        self._pending.append(json.dumps(span.to_dict(), default=str))
+        if self._writing is None:
+            self._flush()
+
+    def _flush(self) -> None:
+        lines, self._pending = self._pending, []
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(lines)
+            return
+        self._writing = loop.run_in_executor(None, self._write, lines)
+        self._writing.add_done_callback(self._written)
+
+    def _written(self, future: asyncio.Future) -> None:
+        self._writing = None
+        if future.exception() is not None:
+            _LOGGER.warning("Cannot write MeRGBW trace to %s: %s", self.path, future.exception())
+        if self._pending:
+            self._flush()
+
+    def _write(self, lines: List[str]) -> None:
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+        except OSError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write("".join(line + "\n" for line in lines))
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self) -> None:
+        if self._pending and self._writing is None:
+            self._flush()
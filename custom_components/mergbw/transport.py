@@ -0,0 +1,415 @@
+"""Per-device transport state shared by MeRGBW writes."""
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from . import tracing
+from .packet_trace import OUTCOME_ERROR, RX, TX, PacketTrace
+from .protocol import ProtocolProfile, decode_packet, split_frames
+from .scheduler import WriteScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+# Default ATT MTU when the client does not report a negotiated one.
+DEFAULT_MTU = 23
+# ATT write header: opcode (1) + attribute handle (2).
+ATT_WRITE_OVERHEAD = 3
+# How long the coalescing probe waits for the device to echo every frame.
+PROBE_ECHO_TIMEOUT = 1.0
+
+
+def max_write_size(client) -> int:
+    """Return the largest value that fits in one write for this link."""
+    mtu = getattr(client, "mtu_size", None) or DEFAULT_MTU
+    return max(1, mtu - ATT_WRITE_OVERHEAD)
+
+
+def coalesce_frames(packets: Iterable[bytes], limit: int) -> List[bytes]:
+    """Greedily pack whole frames into writes of at most ``limit`` bytes."""
+    writes: List[bytes] = []
+    pending = bytearray()
+    for packet in packets:
+        if pending and len(pending) + len(packet) > limit:
+            writes.append(bytes(pending))
+            pending.clear()
+        pending.extend(packet)
+    if pending:
+        writes.append(bytes(pending))
+    return writes
+
+
+class TokenBucket:
+    """Frames-per-second limiter whose rate adapts to device feedback.
+
+    ``reward`` raises the rate additively after a confirmed write and
+    ``penalize`` cuts it multiplicatively when the device reports a state
+    other than the one written (AIMD), so the rate settles just under what the
+    firmware can keep up with.
+    """
+
+    MIN_RATE = 1.0
+    INCREASE = 0.5
+    DECREASE = 0.7
+
+    def __init__(self, rate: float, burst: int, max_rate: float) -> None:
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.max_rate = max(float(max_rate), self.rate)
+        self.tokens = float(self.burst)
+        self._last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self, count: int = 1) -> None:
+        """Wait until ``count`` frames may be written.
+
+        A bundle larger than the burst waits for a full bucket and is charged
+        every frame; the debt delays the next bundle.
+        """
+        count = max(1, count)
+        needed = min(count, self.burst)
+        self._refill()
+        while self.tokens < needed:
+            await asyncio.sleep((needed - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= count
+
+    def reward(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.INCREASE)
+
+    def penalize(self) -> None:
+        self.rate = max(self.MIN_RATE, self.rate * self.DECREASE)
+
+
+def supersede(packets: List[bytes], mode_commands=frozenset()) -> List[bytes]:
+    """Keep only the last frame per command, and the last of the mode commands.
+
+    Order is kept, so the result leaves the device in the same state as
+    writing every frame.
+    """
+    kept: List[bytes] = []
+    seen = set()
+    mode_seen = False
+    for packet in reversed(packets):
+        cmd = packet[1] if len(packet) > 1 else None
+        if cmd in seen:
+            continue
+        if cmd in mode_commands:
+            if mode_seen:
+                continue
+            mode_seen = True
+        seen.add(cmd)
+        kept.append(packet)
+    kept.reverse()
+    return kept
+
+
+class ReportWait:
+    """Commands of one transaction the device reported while a caller waits."""
+
+    def __init__(self, packets: Iterable[bytes]) -> None:
+        self.expected = {frame[0] for frame in map(decode_packet, packets) if frame is not None}
+        self.matched: set = set()
+        self.mismatched: set = set()
+        self._event = asyncio.Event()
+
+    def report(self, cmd: int, matched: bool) -> None:
+        if cmd not in self.expected:
+            return
+        (self.matched if matched else self.mismatched).add(cmd)
+        if self.mismatched or self.expected <= self.matched:
+            self._event.set()
+
+    async def wait(self, timeout: float) -> Optional[bool]:
+        """Return True once every command matched, False on a mismatch, None if reports are missing."""
+        if self.expected and not self._event.is_set():
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.mismatched:
+            return False
+        # Frames without a decodable command cannot be confirmed.
+        return True if self.expected and self.expected <= self.matched else None
+
+
+class DeviceTransport:
+    """Link state that outlives a single connection to one device.
+
+    ``coalescing`` caches whether the firmware accepts several frames in one
+    write. It starts from the profile's ``frame_coalescing`` capability; when
+    that is ``None`` the first multi-frame transaction probes it, and it is
+    only enabled once the device has echoed every frame of the probe.
+
+    When a ``scheduler`` is attached every write waits for a slot on the
+    adapter the device was last reached through (``adapter``).
+
+    Writes are also limited by a per-device ``bucket`` seeded from the
+    profile. Notify frames are assumed to mirror the write frame layout: a
+    reported payload that differs from the last one written for that command
+    means the firmware dropped a frame and the rate is lowered.
+
+    A transaction that fails part-way leaves the frames it did not write in
+    ``interrupted``; after a reconnect :meth:`resume` sends only those that
+    are still needed.
+    """
+
+    def __init__(
+        self,
+        profile: ProtocolProfile,
+        scheduler: Optional[WriteScheduler] = None,
+        device_id: str = "",
+        trace: Optional[PacketTrace] = None,
+    ) -> None:
+        self.coalescing: Optional[bool] = getattr(profile, "frame_coalescing", False)
+        self.scheduler = scheduler
+        self.device_id = device_id
+        self.adapter: Optional[str] = None
+        self.trace = trace
+        self.bucket = TokenBucket(
+            getattr(profile, "write_rate", 10.0),
+            getattr(profile, "write_burst", 3),
+            getattr(profile, "write_rate_max", 40.0),
+        )
+        self._unconfirmed: Dict[int, bytes] = {}
+        # Callers waiting for the device to report a transaction.
+        self._waits: List[ReportWait] = []
+        self._mode_commands = getattr(profile, "mode_commands", frozenset())
+        # Last frame written per command, i.e. the state the device holds.
+        self.last_frames: Dict[int, bytes] = {}
+        self.confirmed = 0
+        self.mismatched = 0
+        # Frames of the last transaction that were not written before it failed.
+        self.interrupted: Optional[List[bytes]] = None
+        self._progress = 0
+        self.resume_stats = {
+            "interrupted": 0,
+            "resumed": 0,
+            "failed": 0,
+            "resent_frames": 0,
+            "skipped_frames": 0,
+            "reconnect_ms": 0.0,
+        }
+
+    async def _write(self, client, write_uuid: str, data: bytes, paced: bool = True, **kwargs) -> None:
+        frames = len(split_frames(data)) or 1
+        if not paced:
+            await self._traced_write(client, write_uuid, data, **kwargs)
+        elif self.scheduler is None:
+            with tracing.span("pacing", frames=frames):
+                await self.bucket.acquire(frames)
+            await self._traced_write(client, write_uuid, data, **kwargs)
+        else:
+            with tracing.span("pacing", frames=frames):
+                await self.bucket.acquire(frames)
+            # Waiting for the adapter is this span minus its gatt_write child.
+            with tracing.span("adapter_slot", adapter=self.adapter):
+                async with self.scheduler.slot(self.adapter, self.device_id):
+                    await self._traced_write(client, write_uuid, data, **kwargs)
+        self._progress += frames
+
+    async def _traced_write(self, client, write_uuid: str, data: bytes, **kwargs) -> None:
+        with tracing.span("gatt_write", bytes=len(data)):
+            if self.trace is None:
+                await client.write_gatt_char(write_uuid, data, **kwargs)
+                return
+            start = time.monotonic()
+            try:
+                await client.write_gatt_char(write_uuid, data, **kwargs)
+            except Exception:
+                self.trace.record(TX, data, time.monotonic() - start, OUTCOME_ERROR)
+                raise
+            self.trace.record(TX, data, time.monotonic() - start)
+
+    async def send(self, client, packets: List[bytes], write_uuid: str, paced: bool = True) -> None:
+        """Write ``packets`` using as few GATT writes as the device allows.
+
+        ``paced=False`` skips the rate limit and the adapter queue; it is
+        meant for synchronized releases, which are rare and must not wait
+        behind other lights sharing the adapter.
+        """
+        decoded = [(packet, decode_packet(packet)) for packet in packets]
+        # Expect the echo before writing: notify may arrive before the write returns.
+        for _packet, frame in decoded:
+            if frame is not None:
+                self._unconfirmed[frame[0]] = frame[1]
+        self.interrupted = None
+        self._progress = 0
+        try:
+            await self._send(client, packets, write_uuid, paced)
+        except Exception:
+            written = min(self._progress, len(decoded))
+            for _packet, frame in decoded[written:]:
+                if frame is not None:
+                    self._unconfirmed.pop(frame[0], None)
+            self._record_written(decoded[:written])
+            self.interrupted = list(packets[written:])
+            self.resume_stats["interrupted"] += 1
+            raise
+        self._record_written(decoded)
+
+    def _record_written(self, decoded) -> None:
+        for packet, frame in decoded:
+            if frame is not None:
+                self._record_state(frame[0], packet)
+
+    def _record_state(self, cmd: int, packet: bytes) -> None:
+        if cmd in self._mode_commands:
+            for other in self._mode_commands:
+                self.last_frames.pop(other, None)
+        self.last_frames[cmd] = packet
+
+    async def resume(self, client, write_uuid: str) -> int:
+        """Send the still-needed frames of the interrupted transaction; return how many.
+
+        Frames superseded by a later one in the same transaction, and frames
+        the device already holds (written before the failure or confirmed by
+        a state report), are skipped.
+        """
+        packets, self.interrupted = self.interrupted or [], None
+        needed = self.changed_frames(supersede(packets, self._mode_commands))
+        self.resume_stats["skipped_frames"] += len(packets) - len(needed)
+        try:
+            if needed:
+                await self.send(client, needed, write_uuid)
+        except Exception:
+            self.resume_stats["failed"] += 1
+            self.interrupted = None
+            raise
+        self.resume_stats["resumed"] += 1
+        self.resume_stats["resent_frames"] += len(needed)
+        return len(needed)
+
+    def abandon(self) -> None:
+        """Record that the interrupted transaction could not be resumed."""
+        if self.interrupted is not None:
+            self.interrupted = None
+            self.resume_stats["failed"] += 1
+
+    def changed_frames(self, packets: List[bytes]) -> List[bytes]:
+        """Drop frames identical to what the device was last sent."""
+        return [packet for packet in packets if len(packet) < 2 or self.last_frames.get(packet[1]) != packet]
+
+    async def _send(self, client, packets: List[bytes], write_uuid: str, paced: bool = True) -> None:
+        applied = set()
+        if len(packets) > 1 and self.coalescing is not False:
+            writes = coalesce_frames(packets, max_write_size(client))
+            if len(writes) < len(packets):
+                if self.coalescing is None:
+                    applied = await self._probe(client, packets, writes, write_uuid, paced)
+                    if self.coalescing:
+                        return
+                else:
+                    for data in writes:
+                        await self._write(client, write_uuid, data, paced)
+                    return
+        # After a failed probe only the frames the device did not echo are sent
+        # again; skipped frames still count as written for resume.
+        self._progress = 0
+        for packet in packets:
+            if len(packet) > 1 and packet[1] in applied:
+                self._progress += 1
+                continue
+            await self._write(client, write_uuid, packet, paced)
+
+    def handle_notify(self, data: bytes) -> None:
+        """Compare state reported by the device with what was last written."""
+        data = bytes(data)
+        if self.trace is not None:
+            self.trace.record(RX, data)
+        for frame in split_frames(data):
+            decoded = decode_packet(frame)
+            if decoded is None:
+                continue
+            cmd, payload = decoded
+            expected = self._unconfirmed.pop(cmd, None)
+            if expected is None:
+                continue
+            if payload == expected:
+                self.confirmed += 1
+                self.bucket.reward()
+                self._record_state(cmd, frame)
+                for wait in self._waits:
+                    wait.report(cmd, True)
+            else:
+                self.mismatched += 1
+                self.bucket.penalize()
+                for wait in self._waits:
+                    wait.report(cmd, False)
+                _LOGGER.debug(
+                    "Device %s reported cmd 0x%02x=%s after writing %s; write rate now %.1f/s",
+                    self.device_id,
+                    cmd,
+                    payload.hex(),
+                    expected.hex(),
+                    self.bucket.rate,
+                )
+
+    async def _probe(self, client, packets: List[bytes], writes: List[bytes], write_uuid: str, paced: bool = True):
+        """Try a coalesced transaction and cache whether the firmware handles it.
+
+        A write response only means the longer value was accepted, not that
+        the firmware parsed every frame in it, so coalescing is enabled only
+        when the device echoes every frame within ``PROBE_ECHO_TIMEOUT``. An
+        ATT error, a missing echo or a device without state reports disables
+        it. Returns the commands the device echoed, which the caller does not
+        send again.
+        """
+        with self.expect_reports(packets) as reports:
+            try:
+                for data in writes:
+                    await self._write(client, write_uuid, data, paced, response=True)
+            except Exception as err:  # noqa: BLE001 - any ATT/backend error means "no"
+                _LOGGER.debug("Frame coalescing rejected by device %s: %s", self.device_id, err)
+                self.coalescing = False
+                return set(reports.matched)
+            self.coalescing = await reports.wait(PROBE_ECHO_TIMEOUT) is True
+            if not self.coalescing:
+                _LOGGER.debug(
+                    "Device %s echoed %s of %s coalesced frames; writing one frame at a time",
+                    self.device_id,
+                    len(reports.matched),
+                    len(reports.expected),
+                )
+            return set(reports.matched)
+
+    @contextlib.contextmanager
+    def expect_reports(self, packets: Iterable[bytes]):
+        """Collect the device's reports of ``packets`` while the block runs.
+
+        Enter it before writing: notify may arrive before the write returns.
+        """
+        reports = ReportWait(packets)
+        self._waits.append(reports)
+        try:
+            yield reports
+        finally:
+            self._waits.remove(reports)
+
+    def diagnostics(self) -> dict:
+        """Return transport state for diagnostics."""
+        return {
+            "adapter": self.adapter,
+            "frame_coalescing": self.coalescing,
+            "rate_limit": {
+                "frames_per_second": round(self.bucket.rate, 2),
+                "burst": self.bucket.burst,
+                "max_frames_per_second": self.bucket.max_rate,
+                "confirmed": self.confirmed,
+                "mismatched": self.mismatched,
+            },
+            "resume": self.resume_diagnostics(),
+        }
+
+    def resume_diagnostics(self) -> dict:
+        stats = dict(self.resume_stats)
+        attempts = stats["resumed"] + stats["failed"]
+        stats["reconnect_ms"] = round(stats["reconnect_ms"], 1)
+        stats["success_rate"] = round(stats["resumed"] / attempts, 3) if attempts else None
+        return stats
@@ -0,0 +1,13 @@
+"""Home Assistant-free core of the MeRGBW integration.
+
+The protocol and transport modules of ``custom_components/mergbw`` only use
+relative imports among themselves, so this package adds the integration
+directory to its own search path. ``mergbw.protocol``, ``mergbw.control``
+and friends are then importable without running the integration's
+``__init__`` (which needs Home Assistant). Modules that import Home
+Assistant, such as ``mergbw.light``, still require it.
+"""
+from pathlib import Path
+
+_INTEGRATION_DIR = Path(__file__).resolve().parents[1] / "custom_components" / "mergbw"
+__path__.append(str(_INTEGRATION_DIR))
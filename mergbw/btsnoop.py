@@ -0,0 +1,220 @@
+"""Streaming btsnoop/HCI capture analysis for reverse-engineering profiles.
+
+The capture is memory-mapped and walked record by record, so multi-GB logs
+are processed in bounded memory: only ACL reassembly buffers (per connection
+and direction), the ATT handle map of each connection and counters are kept. ATT writes to the profile's write
+characteristic are decoded with the protocol decoder and summarised into a
+candidate profile table (commands, payload shapes, scene IDs and params).
+
+Android's ``btsnoop_hci.log`` and ``btmon -w`` output use this format. Apple
+PacketLogger traces must be exported to btsnoop first.
+"""
+
+import mmap
+import struct
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, Optional, Tuple
+
+from .protocol import decode_packet, split_frames
+
+BTSNOOP_MAGIC = b"btsnoop\x00"
+_FILE_HEADER = struct.Struct(">8sII")
+_RECORD_HEADER = struct.Struct(">IIIIq")
+
+DATALINK_H1 = 1001
+DATALINK_H4 = 1002
+DATALINK_MONITOR = 2001
+
+H4_ACL = 0x02
+ATT_CID = 0x0004
+
+ATT_READ_BY_TYPE_RSP = 0x09
+ATT_WRITE_REQ = 0x12
+ATT_NOTIFY = 0x1B
+ATT_WRITE_CMD = 0x52
+
+BASE_UUID_SUFFIX = "-0000-1000-8000-00805f9b34fb"
+# Keep at most this many distinct payloads per command in the report.
+MAX_PAYLOADS_PER_COMMAND = 64
+
+
+def _uuid_from_le(raw: bytes) -> str:
+    if len(raw) == 2:
+        return f"0000{int.from_bytes(raw, 'little'):04x}{BASE_UUID_SUFFIX}"
+    value = raw[::-1].hex()
+    return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+
+
+def iter_records(buf) -> Iterator[Tuple[int, int, bytes]]:
+    """Yield ``(flags, timestamp_us, data)`` for every record in a btsnoop buffer.
+
+    Only the current record is copied out of ``buf``, so the mapping is
+    paged in and out by the OS instead of being loaded as a whole.
+    """
+    magic, version, datalink = _FILE_HEADER.unpack_from(buf, 0)
+    if magic != BTSNOOP_MAGIC:
+        raise ValueError("not a btsnoop capture")
+    if datalink not in (DATALINK_H1, DATALINK_H4):
+        raise ValueError(f"unsupported btsnoop datalink {datalink}")
+    offset = _FILE_HEADER.size
+    end = len(buf)
+    while offset + _RECORD_HEADER.size <= end:
+        _orig, incl, flags, _drops, timestamp = _RECORD_HEADER.unpack_from(buf, offset)
+        offset += _RECORD_HEADER.size
+        if offset + incl > end:
+            break
+        data = buf[offset:offset + incl]
+        offset += incl
+        if datalink == DATALINK_H4:
+            if not data or data[0] != H4_ACL:
+                continue
+            data = data[1:]
+        elif flags & 0x02:
+            # H1: bit 1 marks commands/events; only ACL data is of interest.
+            continue
+        yield flags, timestamp, data
+
+
+class CaptureAnalyzer:
+    """Accumulate ATT traffic into a candidate profile table."""
+
+    def __init__(self, write_char_uuid: str, notify_char_uuid: Optional[str] = None) -> None:
+        self.write_char_uuid = write_char_uuid.lower()
+        self.notify_char_uuid = (notify_char_uuid or "").lower()
+        # Connection handle -> ATT value handle -> characteristic UUID.
+        self.handles: Dict[int, Dict[int, str]] = defaultdict(dict)
+        # (connection handle, received) -> L2CAP frame being reassembled.
+        self._acl: Dict[Tuple[int, bool], bytearray] = {}
+        self.records = 0
+        self.writes = 0
+        self.writes_per_connection: Counter = Counter()
+        self.notifications = 0
+        self.invalid_frames = 0
+        self.commands: Counter = Counter()
+        self.payloads: Dict[int, Counter] = defaultdict(Counter)
+        self.notify_commands: Counter = Counter()
+        self.scene_ids: Counter = Counter()
+        self.scene_params: Dict[int, Counter] = defaultdict(Counter)
+        # Scene ID whose 0x0F param is expected next, per connection.
+        self._last_scene: Dict[int, int] = {}
+
+    def feed(self, flags: int, data: bytes) -> None:
+        self.records += 1
+        if len(data) < 4:
+            return
+        handle_flags, length = struct.unpack_from("<HH", data, 0)
+        conn = handle_flags & 0x0FFF
+        boundary = (handle_flags >> 12) & 0x3
+        chunk = data[4:4 + length]
+        # Bit 0 of the record flags: 0 sent by the host, 1 received.
+        key = (conn, bool(flags & 0x01))
+        if boundary == 0x1:
+            pending = self._acl.get(key)
+            if pending is None:
+                return
+            pending.extend(chunk)
+        else:
+            pending = self._acl[key] = bytearray(chunk)
+        if len(pending) < 4:
+            return
+        l2cap_len, cid = struct.unpack_from("<HH", pending, 0)
+        if len(pending) < 4 + l2cap_len:
+            return
+        del self._acl[key]
+        if cid == ATT_CID:
+            self._handle_att(conn, bytes(pending[4:4 + l2cap_len]))
+
+    def _handle_att(self, conn: int, pdu: bytes) -> None:
+        if not pdu:
+            return
+        opcode = pdu[0]
+        if opcode == ATT_READ_BY_TYPE_RSP and len(pdu) > 2:
+            item_len = pdu[1]
+            # Characteristic declarations: handle, properties, value handle, UUID.
+            for idx in range(2, len(pdu) - item_len + 1, item_len):
+                item = pdu[idx:idx + item_len]
+                if item_len in (7, 21):
+                    value_handle = int.from_bytes(item[3:5], "little")
+                    self.handles[conn][value_handle] = _uuid_from_le(item[5:])
+        elif opcode in (ATT_WRITE_REQ, ATT_WRITE_CMD) and len(pdu) >= 3:
+            handle = int.from_bytes(pdu[1:3], "little")
+            if self._matches(conn, handle, self.write_char_uuid, pdu[3:]):
+                self.writes += 1
+                self.writes_per_connection[conn] += 1
+                self._handle_frames(conn, pdu[3:])
+        elif opcode == ATT_NOTIFY and len(pdu) >= 3:
+            handle = int.from_bytes(pdu[1:3], "little")
+            if self._matches(conn, handle, self.notify_char_uuid, pdu[3:]):
+                self.notifications += 1
+                for frame in split_frames(pdu[3:]):
+                    decoded = decode_packet(frame)
+                    if decoded is not None:
+                        self.notify_commands[decoded[0]] += 1
+
+    def _matches(self, conn: int, handle: int, uuid: str, value: bytes) -> bool:
+        known = self.handles[conn].get(handle) if conn in self.handles else None
+        if known is not None:
+            return known == uuid
+        # Discovery was not captured: fall back to recognising the frame format.
+        return bool(split_frames(value))
+
+    def _handle_frames(self, conn: int, value: bytes) -> None:
+        frames = split_frames(value)
+        if not frames:
+            self.invalid_frames += 1
+            return
+        for frame in frames:
+            decoded = decode_packet(frame)
+            if decoded is None:
+                self.invalid_frames += 1
+                continue
+            cmd, payload = decoded
+            self.commands[cmd] += 1
+            payloads = self.payloads[cmd]
+            if payload in payloads or len(payloads) < MAX_PAYLOADS_PER_COMMAND:
+                payloads[payload] += 1
+            if cmd == 0x06 and payload:
+                scene_id = self._last_scene[conn] = int.from_bytes(payload, "big")
+                self.scene_ids[scene_id] += 1
+            elif cmd == 0x0F and conn in self._last_scene:
+                self.scene_params[self._last_scene.pop(conn)][int.from_bytes(payload, "big")] += 1
+
+    def report(self) -> dict:
+        """Return the candidate profile table."""
+        return {
+            "records": self.records,
+            "att_writes": self.writes,
+            "notifications": self.notifications,
+            "invalid_frames": self.invalid_frames,
+            "att_writes_per_connection": {f"0x{conn:04x}": n for conn, n in sorted(self.writes_per_connection.items())},
+            "handles": {
+                f"0x{conn:04x}": {f"0x{handle:04x}": uuid for handle, uuid in sorted(handles.items())}
+                for conn, handles in sorted(self.handles.items())
+                if handles
+            },
+            "commands": {
+                f"0x{cmd:02x}": {
+                    "count": count,
+                    "payload_lengths": sorted({len(p) for p in self.payloads[cmd]}),
+                    "top_payloads": {p.hex(): n for p, n in self.payloads[cmd].most_common(8)},
+                }
+                for cmd, count in sorted(self.commands.items())
+            },
+            "notify_commands": {f"0x{cmd:02x}": n for cmd, n in sorted(self.notify_commands.items())},
+            "scenes": {
+                str(scene_id): {
+                    "count": count,
+                    "params": {f"0x{p:04x}": n for p, n in self.scene_params[scene_id].most_common(4)},
+                }
+                for scene_id, count in sorted(self.scene_ids.items())
+            },
+        }
+
+
+def analyze_file(path: str, write_char_uuid: str, notify_char_uuid: Optional[str] = None) -> dict:
+    """Stream a btsnoop file through :class:`CaptureAnalyzer` and return its report."""
+    analyzer = CaptureAnalyzer(write_char_uuid, notify_char_uuid)
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        for flags, _timestamp, data in iter_records(buf):
+            analyzer.feed(flags, data)
+    return analyzer.report()
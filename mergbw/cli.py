@@ -0,0 +1,391 @@
+"""Command line interface: ``python -m mergbw``.
+
+Drive lights without Home Assistant, replay command scripts, benchmark the
+protocol and transport layers against the simulated client, measure how the
+light platform scales to hundreds of entities and analyse btsnoop captures
+for new scenes and profiles.
+
+Scripts hold one command per line (``#`` starts a comment)::
+
+    on
+    color 255 0 0
+    brightness 128
+    scene Rainbow
+    scene_id 42 3
+    music_mode spectrum2
+    music_sensitivity 60
+    white
+    sleep 0.5
+    off
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import shlex
+import statistics
+import sys
+import time
+from typing import List, Optional, Sequence
+
+_CORE_MODULES = ("protocol", "packet_trace", "transport", "scheduler", "control", "simulator")
+
+BENCH_SCRIPT = [
+    "on",
+    "color 255 0 0",
+    "brightness 128",
+    "color 0 255 0",
+    "scene Ghost",
+    "brightness 255",
+    "off",
+]
+
+
+def _load_core() -> float:
+    """Import the core modules and return how long that took in ms."""
+    start = time.perf_counter()
+    for name in _CORE_MODULES:
+        importlib.import_module(f"{__package__}.{name}")
+    return (time.perf_counter() - start) * 1000
+
+
+# Verb: (fewest, most) arguments; None means any number.
+_ARITY = {
+    "sleep": (1, 1),
+    "on": (0, 0),
+    "off": (0, 0),
+    "color": (3, 3),
+    "brightness": (1, 1),
+    "white": (0, 0),
+    "scene": (1, None),
+    "scene_id": (1, 2),
+    "music_mode": (1, 1),
+    "music_sensitivity": (1, 1),
+}
+
+
+def _int_arg(name: str, value: str, low: int, high: int) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} expects integers, got {value!r}") from None
+    if not low <= number <= high:
+        raise ValueError(f"{name} values must be {low}-{high}, got {number}")
+    return number
+
+
+def parse_command(profile, line: str):
+    """Return ``("sleep", seconds)`` or ``("send", packets)`` for one script line.
+
+    Raises ValueError for unknown commands, wrong argument counts and
+    out-of-range values.
+    """
+    tokens = shlex.split(line, comments=True)
+    if not tokens:
+        return None
+    name, args = tokens[0].lower(), tokens[1:]
+    if name in _ARITY:
+        fewest, most = _ARITY[name]
+        if len(args) < fewest or (most is not None and len(args) > most):
+            expected = str(fewest) if fewest == most else f"{fewest}-{most}" if most else f"{fewest} or more"
+            raise ValueError(f"{name} takes {expected} argument(s), got {len(args)}: {line.strip()}")
+    if name == "sleep":
+        try:
+            seconds = float(args[0])
+        except ValueError:
+            raise ValueError(f"sleep expects seconds, got {args[0]!r}") from None
+        if seconds < 0:
+            raise ValueError(f"sleep must not be negative, got {seconds}")
+        return ("sleep", seconds)
+    if name in ("on", "off"):
+        packets = profile.build_power(name == "on")
+    elif name == "color":
+        packets = profile.build_color(*(_int_arg(name, value, 0, 255) for value in args))
+    elif name == "brightness":
+        packets = profile.build_brightness(_int_arg(name, args[0], 0, 255))
+    elif name == "white":
+        packets = profile.build_white()
+    elif name == "scene":
+        packets = profile.build_scene(" ".join(args))
+    elif name == "scene_id" and hasattr(profile, "build_scene_by_id"):
+        values = [_int_arg(name, value, 0, 0xFFFF) for value in args]
+        packets = profile.build_scene_by_id(values[0], values[1] if len(values) > 1 else None)
+    elif name == "music_mode" and hasattr(profile, "build_music_mode"):
+        mode = args[0]
+        packets = profile.build_music_mode(_int_arg(name, mode, 1, 6) if mode.isdigit() else mode)
+    elif name == "music_sensitivity" and hasattr(profile, "build_music_sensitivity"):
+        packets = profile.build_music_sensitivity(_int_arg(name, args[0], 0, 100))
+    else:
+        raise ValueError(f"Unsupported command for {profile.name}: {line.strip()}")
+    if not packets:
+        raise ValueError(f"Command produced no packets: {line.strip()}")
+    return ("send", packets)
+
+
+def parse_script(profile, lines: Sequence[str]) -> list:
+    """Parse every line up front; ValueError names the first bad line."""
+    commands = []
+    for number, line in enumerate(lines, 1):
+        try:
+            command = parse_command(profile, line)
+        except ValueError as err:
+            raise ValueError(f"line {number}: {err}") from None
+        if command:
+            commands.append(command)
+    return commands
+
+
+async def _open_client(args, core):
+    if args.simulate:
+        return core["simulator"].SimulatedClient(write_latency=args.latency)
+    from bleak import BleakClient  # Only needed for real devices.
+
+    client = BleakClient(args.address)
+    await client.connect()
+    return client
+
+
+async def _run_commands(commands: list, args, core) -> int:
+    profile = core["protocol"].get_profile(args.profile)
+    start = time.perf_counter()
+    client = await _open_client(args, core)
+    startup_ms = (time.perf_counter() - start) * 1000
+    transport = core["transport"].DeviceTransport(profile, device_id=getattr(client, "address", ""))
+    try:
+        try:
+            await client.start_notify(profile.notify_char_uuid, lambda _s, data: transport.handle_notify(bytes(data)))
+        except Exception:  # noqa: BLE001 - notify feedback is optional
+            pass
+        for kind, value in commands:
+            if kind == "sleep":
+                await asyncio.sleep(value)
+            else:
+                await core["control"].send(client, profile, value, transport)
+    finally:
+        await client.disconnect()
+    if args.timing:
+        print(f"core import: {args.import_ms:.1f} ms")
+        print(f"client startup: {startup_ms:.1f} ms")
+        print(f"commands: {len(commands)} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return 0
+
+
+def load_trace(document: dict) -> List[dict]:
+    """Find the packet trace in a diagnostics download (or a bare trace list)."""
+    if isinstance(document, list):
+        return document
+    for key in ("data", "device"):
+        if isinstance(document.get(key), dict):
+            return load_trace(document[key])
+    return document.get("packet_trace", [])
+
+
+async def _replay_trace(args, core) -> int:
+    with open(args.script, encoding="utf-8") as handle:
+        entries = load_trace(json.load(handle))
+    profile = core["protocol"].get_profile(args.profile)
+    client = await _open_client(args, core)
+    try:
+        written = await core["packet_trace"].replay(entries, client, profile.write_char_uuid, args.speed)
+    finally:
+        await client.disconnect()
+    print(f"replayed {written} frames")
+    if args.simulate:
+        print("final state: " + json.dumps({f"0x{cmd:02x}": p.hex() for cmd, p in sorted(client.state.items())}))
+    return 0
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _bench(args, core) -> dict:
+    protocol, transport_mod, control = core["protocol"], core["transport"], core["control"]
+    profile = protocol.get_profile(args.profile)
+    scheduler = core["scheduler"].WriteScheduler(args.adapter_pps) if args.adapter_pps else None
+
+    encode_start = time.perf_counter()
+    for _ in range(args.iterations):
+        for line in BENCH_SCRIPT:
+            parse_command(profile, line)
+    encode_s = time.perf_counter() - encode_start
+    commands = [parse_command(profile, line)[1] for line in BENCH_SCRIPT]
+
+    clients = [
+        core["simulator"].SimulatedClient(address=f"SIM{idx:04d}", write_latency=args.latency)
+        for idx in range(args.lights)
+    ]
+    latencies: List[float] = []
+
+    async def drive(client):
+        transport = transport_mod.DeviceTransport(profile, scheduler, client.address)
+        if not args.rate_limit:
+            transport.bucket.rate = transport.bucket.max_rate = float("inf")
+        await client.start_notify(profile.notify_char_uuid, lambda _s, data: transport.handle_notify(bytes(data)))
+        for _ in range(args.iterations):
+            for packets in commands:
+                started = time.perf_counter()
+                await control.send(client, profile, packets, transport)
+                latencies.append(time.perf_counter() - started)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(client) for client in clients))
+    elapsed = time.perf_counter() - start
+    writes = sum(len(client.writes) for client in clients)
+    frames = sum(client.frames for client in clients)
+    total_commands = len(latencies)
+    return {
+        "profile": args.profile,
+        "lights": args.lights,
+        "commands": total_commands,
+        "core_import_ms": round(args.import_ms, 2),
+        "encode_us_per_command": round(encode_s / (args.iterations * len(BENCH_SCRIPT)) * 1e6, 2),
+        "elapsed_s": round(elapsed, 4),
+        "commands_per_s": round(total_commands / elapsed, 1) if elapsed else None,
+        "writes": writes,
+        "frames": frames,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3),
+            "p50": round(_percentile(latencies, 0.5) * 1000, 3),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+        },
+        "scheduler": scheduler.metrics() if scheduler else None,
+    }
+
+
+async def _audio(args, core) -> dict:
+    from .audio import AudioReactiveEngine, LightStream, async_open_source
+
+    profile = core["protocol"].get_profile(args.profile)
+    scheduler = core["scheduler"].WriteScheduler(args.adapter_pps) if args.adapter_pps else None
+    streams = []
+    for idx in range(args.lights):
+        client = core["simulator"].SimulatedClient(address=f"SIM{idx:04d}", write_latency=args.latency)
+        transport = core["transport"].DeviceTransport(profile, scheduler, client.address)
+
+        def encode(rgb, brightness):
+            return profile.build_color(*rgb) + profile.build_brightness(brightness)
+
+        async def send(packets, client=client, transport=transport):
+            await transport.send(client, packets, profile.write_char_uuid)
+
+        streams.append(LightStream(client.address, encode, send, transport.changed_frames))
+    source = await async_open_source(args.source, args.sample_rate, args.channels)
+    engine = AudioReactiveEngine(source, streams, args.block_size, realtime=args.realtime)
+    return await engine.run()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m mergbw", description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="sunset_light", help="sunset_light or hexagon_light")
+    parser.add_argument("--timing", action="store_true", help="report import and startup time")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_target(p):
+        target = p.add_mutually_exclusive_group(required=True)
+        target.add_argument("--address", help="Bluetooth address of a real light (needs bleak)")
+        target.add_argument("--simulate", action="store_true", help="use the simulated client")
+        p.add_argument("--latency", type=float, default=0.0, help="simulated write latency in seconds")
+
+    send = sub.add_parser("send", help="send commands given on the command line")
+    add_target(send)
+    send.add_argument("commands", nargs="+", help='commands, e.g. "color 255 0 0"')
+
+    replay = sub.add_parser("replay", help="replay a command script or a diagnostics packet trace")
+    add_target(replay)
+    replay.add_argument("script", help="script file, diagnostics .json download, or - for stdin")
+    replay.add_argument("--speed", type=float, default=1.0, help="trace replay speed factor (0 = no waits)")
+
+    bench = sub.add_parser("bench", help="benchmark against simulated lights")
+    bench.add_argument("--iterations", type=int, default=200)
+    bench.add_argument("--lights", type=int, default=1)
+    bench.add_argument("--latency", type=float, default=0.0, help="simulated write latency in seconds")
+    bench.add_argument("--adapter-pps", type=float, default=0.0, help="share one write scheduler at this budget")
+    bench.add_argument("--rate-limit", action="store_true", help="apply the profile's per-device token bucket")
+    bench.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    audio = sub.add_parser("audio", help="drive simulated lights from a WAV file, FIFO or PCM socket (needs numpy)")
+    audio.add_argument("source", help="WAV/raw PCM file, named pipe, tcp://host:port or unix:///path")
+    audio.add_argument("--lights", type=int, default=1)
+    audio.add_argument("--latency", type=float, default=0.0, help="simulated write latency in seconds")
+    audio.add_argument("--adapter-pps", type=float, default=0.0, help="share one write scheduler at this budget")
+    audio.add_argument("--sample-rate", type=int, default=44100, help="raw PCM sample rate")
+    audio.add_argument("--channels", type=int, default=1, help="raw PCM channel count")
+    audio.add_argument("--block-size", type=int, default=1024, help="samples per FFT block")
+    audio.add_argument("--realtime", action="store_true", help="play files at their own pace")
+
+    scale = sub.add_parser("scale", help="set up many light entities against a stub hass (needs Home Assistant)")
+    scale.add_argument("--lights", type=int, default=300)
+    scale.add_argument("--rounds", type=int, default=20, help="broadcast commands to time")
+    scale.add_argument("--baseline", help="compare against this baseline report; exit 1 on regressions")
+    scale.add_argument("--write-baseline", action="store_true", help="store this run as the --baseline file")
+
+    capture = sub.add_parser("capture", help="analyse a btsnoop capture into a candidate profile table")
+    capture.add_argument("path", help="btsnoop capture file")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "scale" and args.write_baseline and not args.baseline:
+        parser.error("--write-baseline needs --baseline")
+    args.import_ms = _load_core()
+    core = {name: sys.modules[f"{__package__}.{name}"] for name in _CORE_MODULES}
+
+    if args.command == "replay" and args.script.endswith(".json"):
+        return asyncio.run(_replay_trace(args, core))
+    if args.command in ("send", "replay"):
+        if args.command == "send":
+            lines = args.commands
+        elif args.script == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(args.script, encoding="utf-8") as handle:
+                lines = handle.read().splitlines()
+        try:
+            commands = parse_script(core["protocol"].get_profile(args.profile), lines)
+        except ValueError as err:
+            parser.error(str(err))
+        return asyncio.run(_run_commands(commands, args, core))
+
+    if args.command == "capture":
+        from .btsnoop import analyze_file
+
+        profile = core["protocol"].get_profile(args.profile)
+        start = time.perf_counter()
+        report = analyze_file(args.path, profile.write_char_uuid, profile.notify_char_uuid)
+        if args.timing:
+            report["elapsed_s"] = round(time.perf_counter() - start, 3)
+        print(json.dumps(report, indent=2))
+        return 0
+
+    if args.command == "scale":
+        from . import scale
+
+        sys.path.insert(0, str(scale.REPO_ROOT))
+        report = asyncio.run(scale.async_run(lights=args.lights, rounds=args.rounds, profile=args.profile))
+        print(json.dumps(report, indent=2))
+        if args.write_baseline:
+            scale.write_baseline(args.baseline, report)
+        elif args.baseline:
+            regressions = scale.compare(report, scale.load_baseline(args.baseline))
+            for line in regressions:
+                print(f"regression: {line}", file=sys.stderr)
+            return 1 if regressions else 0
+        return 0
+
+    if args.command == "audio":
+        print(json.dumps(asyncio.run(_audio(args, core)), indent=2))
+        return 0
+
+    report = asyncio.run(_bench(args, core))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key}: {value}")
+    return 0
@@ -0,0 +1,266 @@
+"""Scale harness: many ``MeRGBWLight`` entities against a stub hass.
+
+Sets up hundreds of light entities through the platform's own
+``async_setup_entry`` (one hub entry), connects each to a
+:class:`~mergbw.simulator.SimulatedClient` and measures
+
+* import time of the ``custom_components.mergbw`` package (in a fresh
+  interpreter, after Home Assistant itself is imported),
+* setup time per entity,
+* memory per entity (tracemalloc, plus resident set size where available),
+* event-loop time per broadcast command (one ``turn_on`` to every light).
+
+Reports can be written as a baseline and later runs compared against it,
+so memory and startup regressions show up before more panels are added.
+Needs Home Assistant unless a light module loaded against stubs is passed
+in, as the tests do.
+"""
+
+import asyncio
+import contextlib
+import gc
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+from .simulator import SimulatedClient
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_LIGHTS = 300
+DEFAULT_ROUNDS = 20
+# Allowed growth over the baseline: memory is stable between runs, timings are not.
+MEMORY_TOLERANCE = 0.25
+TIME_TOLERANCE = 1.0
+
+# Imported first in the import probe so only the package's own cost is timed.
+_HA_MODULES = (
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.components.light",
+    "homeassistant.components.bluetooth",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.storage",
+    "bleak_retry_connector",
+)
+_IMPORT_PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+for name in {ha!r}:
+    __import__(name)
+start = time.perf_counter()
+import custom_components.mergbw, custom_components.mergbw.light
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+class StubHass:
+    """The part of ``HomeAssistant`` the light platform touches."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.data: dict = {"mergbw": {"lights": {}}}
+        self.bus = SimpleNamespace(async_listen_once=lambda *_args: lambda: None)
+        self.states = SimpleNamespace(get=lambda _entity_id: None)
+        self.config_entries = SimpleNamespace(async_entries=lambda _domain: [])
+        self.tasks: List[asyncio.Future] = []
+
+    def async_create_task(self, coro, *_args, **_kwargs):
+        task = asyncio.ensure_future(coro)
+        self.tasks.append(task)
+        return task
+
+    async_create_background_task = async_create_task
+
+
+def measure_import(root: Path = REPO_ROOT) -> dict:
+    """Time a cold import of the integration in a fresh interpreter."""
+    probe = _IMPORT_PROBE.format(root=str(root), ha=_HA_MODULES)
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=False)
+    if result.returncode:
+        return {"package_ms": None, "error": result.stderr.strip().splitlines()[-1:]}
+    return {"package_ms": round(float(result.stdout.strip()), 2)}
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@contextlib.contextmanager
+def _stub_platform(light_module):
+    """Let ``async_setup_entry`` run outside an entity platform."""
+    platform = SimpleNamespace(async_register_entity_service=lambda *_args, **_kwargs: None)
+    original = light_module.entity_platform.async_get_current_platform
+    light_module.entity_platform.async_get_current_platform = lambda: platform
+    try:
+        yield
+    finally:
+        light_module.entity_platform.async_get_current_platform = original
+
+
+async def _async_setup(light_module, hass: StubHass, count: int, profile: str) -> list:
+    devices = [
+        {"mac": "5C:A1:E0:" + ":".join(f"{idx >> shift & 0xFF:02X}" for shift in (16, 8, 0)), "profile": profile}
+        for idx in range(count)
+    ]
+    entry = SimpleNamespace(entry_id="scale", data={"devices": devices}, options={})
+    added: list = []
+    with _stub_platform(light_module):
+        await light_module.async_setup_entry(hass, entry, added.extend)
+    return added
+
+
+def _summary_ms(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def async_run(
+    light_module=None,
+    lights: int = DEFAULT_LIGHTS,
+    rounds: int = DEFAULT_ROUNDS,
+    profile: str = "hexagon_light",
+    import_time: bool = True,
+) -> dict:
+    """Run the harness and return the report."""
+    if light_module is None:
+        light_module = importlib.import_module("custom_components.mergbw.light")
+
+    # Memory first, on its own batch: tracemalloc slows everything it traces.
+    gc.collect()
+    tracemalloc.start()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    traced = await _async_setup(light_module, StubHass(), lights, profile)
+    traced_bytes = tracemalloc.get_traced_memory()[0] - traced_before
+    tracemalloc.stop()
+    del traced
+    gc.collect()
+
+    hass = StubHass()
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    entities = await _async_setup(light_module, hass, lights, profile)
+    setup_s = time.perf_counter() - start
+    rss_after = _rss_bytes()
+
+    writes = [0]
+
+    def _write_state():
+        writes[0] += 1
+
+    for entity in entities:
+        entity._client = SimulatedClient(address=entity.unique_id)
+        await entity._client.start_notify(entity._profile.notify_char_uuid, entity._on_notify)
+        entity.async_write_ha_state = _write_state
+        # Measure the event loop, not the per-device pacing.
+        entity._transport.bucket.rate = entity._transport.bucket.max_rate = float("inf")
+
+    wall: List[float] = []
+    cpu: List[float] = []
+    for index in range(rounds):
+        rgb = (255, 0, 0) if index % 2 else (0, 0, 255)
+        cpu_start = time.process_time()
+        started = time.perf_counter()
+        await asyncio.gather(*(entity.async_turn_on(rgb_color=rgb) for entity in entities))
+        wall.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - cpu_start)
+
+    timers = sum(1 for entity in entities if entity._disconnect_timer is not None)
+    for entity in entities:
+        if entity._disconnect_timer is not None:
+            entity._disconnect_timer()
+            entity._disconnect_timer = None
+    for task in hass.tasks:
+        task.cancel()
+
+    return {
+        "lights": lights,
+        "profile": profile,
+        "python": ".".join(str(part) for part in sys.version_info[:3]),
+        "home_assistant": _ha_version(),
+        "import": measure_import() if import_time else None,
+        "setup": {
+            "total_ms": round(setup_s * 1000, 2),
+            "us_per_entity": round(setup_s / lights * 1e6, 2),
+        },
+        "memory": {
+            "bytes_per_entity": round(traced_bytes / lights),
+            "rss_bytes_per_entity": round((rss_after - rss_before) / lights) if rss_before and rss_after else None,
+            "profiles": len({id(entity.profile) for entity in entities}),
+            "locks": len({id(entity._command_lock) for entity in entities}),
+            "disconnect_timers": timers,
+        },
+        "broadcast": {
+            "rounds": rounds,
+            "wall_ms": _summary_ms(wall),
+            "cpu_ms": _summary_ms(cpu),
+            "us_per_light": round(sum(wall) / (rounds * lights) * 1e6, 2),
+            "frames": sum(entity._client.frames for entity in entities),
+            "state_writes": writes[0],
+        },
+    }
+
+
+def _ha_version() -> str:
+    try:
+        from homeassistant.const import __version__
+    except ImportError:
+        return "stub"
+    return __version__
+
+
+# (section, key, tolerance) checked against the baseline.
+_CHECKS = (
+    ("memory", "bytes_per_entity", MEMORY_TOLERANCE),
+    ("setup", "us_per_entity", TIME_TOLERANCE),
+    ("import", "package_ms", TIME_TOLERANCE),
+    ("broadcast", "us_per_light", TIME_TOLERANCE),
+)
+
+
+def compare(report: dict, baseline: dict, sections: Optional[Sequence[str]] = None) -> List[str]:
+    """Return the measurements that grew beyond their tolerance over ``baseline``.
+
+    ``sections`` limits the check, e.g. to ``("memory",)`` on noisy CI machines.
+    """
+    regressions = []
+    for section, key, tolerance in _CHECKS:
+        if sections is not None and section not in sections:
+            continue
+        current = (report.get(section) or {}).get(key)
+        reference = (baseline.get(section) or {}).get(key)
+        if current is None or not reference:
+            continue
+        if current > reference * (1 + tolerance):
+            regressions.append(f"{section}.{key}: {current} > {reference} (+{tolerance:.0%} allowed)")
+    if regressions and report.get("home_assistant") != baseline.get("home_assistant"):
+        regressions.append(
+            f"note: the baseline used Home Assistant {baseline.get('home_assistant')}, "
+            f"this run {report.get('home_assistant')}"
+        )
+    return regressions
+
+
+def load_baseline(path) -> Dict:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def write_baseline(path, report: dict) -> None:
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+        handle.write("\n")
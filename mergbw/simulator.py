@@ -0,0 +1,66 @@
+"""Simulated MeRGBW device speaking the BleakClient subset the core uses."""
+
+import asyncio
+from typing import Callable, List, Optional, Tuple
+
+from .protocol import decode_packet, split_frames
+
+
+class SimulatedClient:
+    """In-memory stand-in for a connected light.
+
+    Decodes every write, tracks the resulting device state and echoes each
+    frame back on the notify callback, like firmware that reports state
+    changes. ``write_latency`` adds a per-write delay and ``drop_every``
+    silently ignores every n-th frame to mimic overrun firmware.
+    """
+
+    def __init__(
+        self,
+        address: str = "SI:MU:LA:TE:D0:00",
+        mtu_size: int = 23,
+        write_latency: float = 0.0,
+        drop_every: int = 0,
+    ) -> None:
+        self.address = address
+        self.mtu_size = mtu_size
+        self.write_latency = write_latency
+        self.drop_every = drop_every
+        self.is_connected = True
+        self.writes: List[Tuple[str, bytes]] = []
+        self.frames = 0
+        self.dropped = 0
+        self.state: dict = {}
+        self._notify: Optional[Callable] = None
+
+    async def connect(self) -> bool:
+        self.is_connected = True
+        return True
+
+    async def disconnect(self) -> bool:
+        self.is_connected = False
+        return True
+
+    async def start_notify(self, _uuid: str, callback: Callable) -> None:
+        self._notify = callback
+
+    async def stop_notify(self, _uuid: str) -> None:
+        self._notify = None
+
+    async def write_gatt_char(self, uuid: str, data: bytes, response: bool = False) -> None:
+        if not self.is_connected:
+            raise ConnectionError("simulated device is disconnected")
+        if self.write_latency:
+            await asyncio.sleep(self.write_latency)
+        self.writes.append((uuid, bytes(data)))
+        for frame in split_frames(bytes(data)):
+            self.frames += 1
+            if self.drop_every and self.frames % self.drop_every == 0:
+                self.dropped += 1
+                continue
+            decoded = decode_packet(frame)
+            if decoded is None:
+                continue
+            self.state[decoded[0]] = decoded[1]
+            if self._notify is not None:
+                self._notify(uuid, bytearray(frame))
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import os
+import struct
+import sys
+import wave
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw import cli  # noqa: E402
+from mergbw.audio import AudioReactiveEngine, BandAnalyzer, LightStream, async_open_source, map_levels  # noqa: E402
+from mergbw.calibration import Calibration  # noqa: E402
+from mergbw.protocol import get_profile  # noqa: E402
+from mergbw.simulator import SimulatedClient  # noqa: E402
+from mergbw.transport import DeviceTransport  # noqa: E402
+
+RATE = 16000
+
+
+def _write_wav(path, segments):
+    """Write mono 16-bit PCM with one sine tone per (frequency, seconds) segment."""
+    samples = []
+    for freq, seconds in segments:
+        samples.extend(
+            int(20000 * math.sin(2 * math.pi * freq * idx / RATE)) for idx in range(int(RATE * seconds))
+        )
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+
+
+def test_band_analyzer_follows_the_tone():
+    analyzer = BandAnalyzer(RATE, 1024)
+    tone = (20000 * np.sin(2 * np.pi * 100 * np.arange(1024) / RATE)).astype("<i2").tobytes()
+    levels = analyzer.analyze(tone)
+    assert int(levels.argmax()) == 1  # 60-250 Hz
+    tone = (20000 * np.sin(2 * np.pi * 3000 * np.arange(1024) / RATE)).astype("<i2").tobytes()
+    assert int(analyzer.analyze(tone).argmax()) == 4  # 2-6 kHz
+
+
+def _streams(count, latency):
+    profile = get_profile("hexagon_light")
+    streams, clients = [], []
+    for idx in range(count):
+        client = SimulatedClient(f"SIM{idx}", write_latency=latency)
+        transport = DeviceTransport(profile, None, client.address)
+        transport.bucket.rate = transport.bucket.max_rate = float("inf")
+        asyncio.run(client.start_notify(profile.notify_char_uuid, lambda _s, data, t=transport: t.handle_notify(data)))
+
+        def encode(rgb, brightness):
+            return profile.build_color(*rgb) + profile.build_brightness(brightness)
+
+        async def send(packets, client=client, transport=transport):
+            await transport.send(client, packets, profile.write_char_uuid)
+
+        streams.append(LightStream(client.address, encode, send, transport.changed_frames))
+        clients.append(client)
+    return streams, clients
+
+
+def test_engine_streams_wav_to_simulated_lights(tmp_path):
+    path = tmp_path / "tones.wav"
+    _write_wav(path, [(100, 0.5), (3000, 0.5)])
+    streams, clients = _streams(3, latency=0.0)
+
+    async def run():
+        source = await async_open_source(str(path))
+        return await AudioReactiveEngine(source, streams, 1024, realtime=False).run()
+
+    report = asyncio.run(run())
+    assert report["blocks"] == math.ceil(RATE / 1024)
+    assert report["analysis_ms"]["mean"] is not None
+    assert report["latency_ms"]["p95"] is not None
+    assert all(client.frames for client in clients)
+    assert sum(light["sent"] for light in report["lights"].values()) > 0
+
+
+def test_streams_sharing_tables_are_calibrated_in_one_batch():
+    tables = Calibration(gamma=1.8, blue_gain=0.8, hue_offset=15).tables()
+    batches = []
+
+    class Counting:
+        def correct_many(self, colors):
+            batches.append(len(colors))
+            return tables.correct_many(colors)
+
+    shared = Counting()
+    streams = [
+        LightStream(f"light{idx}", None, None, tables=table) for idx, table in enumerate((shared, None, shared))
+    ]
+    source = SimpleNamespace(sample_rate=RATE, channels=1)
+    engine = AudioReactiveEngine(source, streams, 1024)
+    levels = np.array([0.1, 0.9, 0.3, 0.2, 0.5, 0.4])
+
+    frames = engine._frames(levels)
+    raw = [map_levels(levels, idx, 3) for idx in range(3)]
+    assert batches == [2]
+    assert frames[1] == raw[1]
+    assert [frames[0], frames[2]] == [(tables.correct(*rgb), brightness) for rgb, brightness in (raw[0], raw[2])]
+
+
+def test_slow_light_drops_frames_instead_of_lagging(tmp_path):
+    path = tmp_path / "tones.wav"
+    # Alternate tones every block so every frame differs from the last one.
+    _write_wav(path, [(100, 512 / RATE), (3000, 512 / RATE)] * 16)
+    streams, _clients = _streams(1, latency=0.05)
+
+    async def run():
+        source = await async_open_source(str(path))
+        return await AudioReactiveEngine(source, streams, 512, realtime=True).run()
+
+    report = asyncio.run(run())
+    light = report["lights"]["SIM0"]
+    assert light["dropped"] > 0
+    # Without dropping, lag would grow to roughly the whole clip.
+    assert report["latency_ms"]["max"] < 250
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_only_regular_files_are_paced(tmp_path):
+    pcm = tmp_path / "song.pcm"
+    pcm.write_bytes(b"\0" * 64)
+    fifo = tmp_path / "song.fifo"
+    os.mkfifo(fifo)
+
+    async def run():
+        regular = await async_open_source(str(pcm), RATE, 1)
+        # Opening the read end of a pipe blocks until a writer appears.
+        writer = os.open(fifo, os.O_RDWR)
+        try:
+            pipe = await async_open_source(str(fifo), RATE, 1)
+        finally:
+            os.close(writer)
+        flags = regular.realtime, pipe.realtime
+        await regular.close()
+        await pipe.close()
+        return flags
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_cli_audio_reports_json(tmp_path, capsys):
+    path = tmp_path / "tone.wav"
+    _write_wav(path, [(440, 0.2)])
+    assert cli.main(["--profile", "hexagon_light", "audio", str(path), "--lights", "2"]) == 0
+    out = capsys.readouterr().out
+    assert '"latency_ms"' in out and '"analysis_ms"' in out
@@ -0,0 +1,118 @@
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw import btsnoop  # noqa: E402
+from mergbw.protocol import HexagonProfile  # noqa: E402
+
+WRITE_HANDLE = 0x0010
+
+
+def _header() -> bytearray:
+    return bytearray(struct.pack(">8sII", btsnoop.BTSNOOP_MAGIC, 1, btsnoop.DATALINK_H4))
+
+
+def _decls(*pairs) -> bytes:
+    """READ_BY_TYPE response declaring ``(value handle, 16-bit UUID)`` pairs."""
+    items = [struct.pack("<HBHH", handle - 1, 0x0C, handle, uuid) for handle, uuid in pairs]
+    return bytes([btsnoop.ATT_READ_BY_TYPE_RSP, len(items[0])]) + b"".join(items)
+
+
+def _write(handle: int, frame: bytes) -> bytes:
+    return bytes([btsnoop.ATT_WRITE_CMD]) + struct.pack("<H", handle) + frame
+
+
+def _record(payload: bytes, received: bool = False) -> bytes:
+    data = bytes([btsnoop.H4_ACL]) + payload
+    flags = 1 if received else 0
+    return struct.pack(">IIIIq", len(data), len(data), flags, 0, 0) + data
+
+
+def _acl(att: bytes, conn: int = 0x40, fragment_at: int | None = None) -> list[bytes]:
+    l2cap = struct.pack("<HH", len(att), btsnoop.ATT_CID) + att
+    if fragment_at is None:
+        return [struct.pack("<HH", conn | (0x2 << 12), len(l2cap)) + l2cap]
+    first, rest = l2cap[:fragment_at], l2cap[fragment_at:]
+    return [
+        struct.pack("<HH", conn | (0x2 << 12), len(first)) + first,
+        struct.pack("<HH", conn | (0x1 << 12), len(rest)) + rest,
+    ]
+
+
+def _write_capture(path: Path) -> HexagonProfile:
+    profile = HexagonProfile()
+    # Characteristic declarations: 0xfff3 at handle 0x0010, 0xfff5 at 0x0020.
+    decls = [
+        struct.pack("<HBHH", WRITE_HANDLE - 1, 0x0C, WRITE_HANDLE, 0xFFF3),
+        struct.pack("<HBHH", 0x001F, 0x0C, 0x0020, 0xFFF5),
+    ]
+    packets = [bytes([btsnoop.ATT_READ_BY_TYPE_RSP, len(decls[0])]) + b"".join(decls)]
+    for frame in profile.build_scene_by_id(0x2A, 0x1234) + profile.build_power(True):
+        packets.append(bytes([btsnoop.ATT_WRITE_CMD]) + struct.pack("<H", WRITE_HANDLE) + frame)
+    # A write to another handle must be ignored.
+    packets.append(bytes([btsnoop.ATT_WRITE_REQ]) + struct.pack("<H", 0x0020) + profile.build_power(False)[0])
+
+    body = _header()
+    for idx, att in enumerate(packets):
+        for acl in _acl(att, fragment_at=6 if idx == 1 else None):
+            body += _record(acl)
+    path.write_bytes(bytes(body))
+    return profile
+
+
+def test_capture_analysis_builds_profile_table(tmp_path):
+    capture = tmp_path / "capture.btsnoop"
+    profile = _write_capture(capture)
+
+    report = btsnoop.analyze_file(str(capture), profile.write_char_uuid)
+
+    assert report["handles"]["0x0040"]["0x0010"] == profile.write_char_uuid
+    assert report["att_writes"] == 3
+    assert report["commands"]["0x06"]["count"] == 1
+    assert report["commands"]["0x01"]["top_payloads"] == {"01": 1}
+    assert report["scenes"] == {"42": {"count": 1, "params": {"0x1234": 1}}}
+
+
+def test_connections_and_directions_are_kept_apart(tmp_path):
+    profile = HexagonProfile()
+    light_a, light_b = 0x40, 0x41
+    scene_a = [_acl(_write(WRITE_HANDLE, frame), light_a, fragment_at=6) for frame in profile.build_scene_by_id(7, 1)]
+    scene_b = [_acl(_write(0x0020, frame), light_b, fragment_at=6) for frame in profile.build_scene_by_id(9, 2)]
+    notify_a = _acl(bytes([btsnoop.ATT_NOTIFY]) + struct.pack("<H", 0x0030) + profile.build_power(True)[0], light_a, 5)
+
+    body = _header()
+    # Each light has its own handle map: 0x0010 is the write characteristic only on light A.
+    body += _record(_acl(_decls((WRITE_HANDLE, 0xFFF3)), light_a)[0], received=True)
+    body += _record(_acl(_decls((WRITE_HANDLE, 0xFFF5), (0x0020, 0xFFF3)), light_b)[0], received=True)
+    body += _record(_acl(_write(WRITE_HANDLE, profile.build_power(False)[0]), light_b)[0])
+    for frame_a, frame_b in zip(scene_a, scene_b):
+        # Fragments of both lights and of both directions interleave.
+        body += _record(frame_a[0]) + _record(notify_a[0], received=True) + _record(frame_b[0])
+        body += _record(frame_a[1]) + _record(notify_a[1], received=True) + _record(frame_b[1])
+    capture = tmp_path / "two_lights.btsnoop"
+    capture.write_bytes(bytes(body))
+
+    report = btsnoop.analyze_file(str(capture), profile.write_char_uuid, profile.notify_char_uuid)
+
+    assert report["handles"]["0x0040"] == {"0x0010": profile.write_char_uuid}
+    assert report["handles"]["0x0041"]["0x0020"] == profile.write_char_uuid
+    assert report["att_writes_per_connection"] == {"0x0040": 2, "0x0041": 2}
+    assert report["invalid_frames"] == 0
+    assert "0x01" not in report["commands"]
+    assert report["scenes"] == {
+        "7": {"count": 1, "params": {"0x0001": 1}},
+        "9": {"count": 1, "params": {"0x0002": 1}},
+    }
+    assert report["notify_commands"] == {"0x01": 2}
+
+
+def test_rejects_non_btsnoop(tmp_path):
+    bogus = tmp_path / "bogus.bin"
+    bogus.write_bytes(b"x" * 32)
+    with pytest.raises(ValueError):
+        btsnoop.analyze_file(str(bogus), "uuid")
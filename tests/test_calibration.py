@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw.calibration import CalibratedProfile, Calibration, calibrate  # noqa: E402
+from mergbw.protocol import get_profile  # noqa: E402
+
+
+def test_uncalibrated_lights_keep_the_shared_profile():
+    profile = get_profile("hexagon_light")
+    assert calibrate(profile, Calibration()) is profile
+    assert calibrate(profile, None) is profile
+
+
+def test_gamma_and_gains_are_table_lookups():
+    tables = Calibration(gamma=2.2, red_gain=0.5).tables()
+    assert tables.channels is not None and tables.matrix is None
+    assert tables.correct(255, 128, 0) == (128, round(255 * (128 / 255) ** 2.2), 0)
+    # Identical calibrations share their tables.
+    assert Calibration(gamma=2.2, red_gain=0.5).tables() is tables
+
+
+def test_hue_offset_rotates_primaries():
+    tables = Calibration(hue_offset=120).tables()
+    assert tables.correct(255, 0, 0) == (0, 255, 0)
+    assert tables.correct(128, 128, 128) == (128, 128, 128)
+
+
+def test_batch_path_matches_single_colours():
+    tables = Calibration(gamma=1.8, blue_gain=0.8, hue_offset=15).tables()
+    colors = [(255, 0, 0), (12, 200, 90), (255, 255, 255), (0, 0, 0)]
+    assert [tuple(int(v) for v in row) for row in tables.correct_many(colors)] == [tables.correct(*c) for c in colors]
+
+
+def test_calibrated_profile_feeds_the_packet_builders():
+    shared = get_profile("sunset_light")
+    profile = calibrate(shared, Calibration(green_gain=0.5))
+    assert isinstance(profile, CalibratedProfile)
+    assert profile.build_color(255, 200, 10) == shared.build_color(255, 100, 10)
+    assert profile.build_white() == shared.build_color(255, 128, 255)
+    assert profile.build_scene("Ghost") == shared.build_scene("Ghost")
+    assert profile.write_char_uuid == shared.write_char_uuid
+    assert profile.build_colors([(255, 200, 10)]) == [shared.build_color(255, 100, 10)]
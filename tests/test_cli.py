@@ -0,0 +1,67 @@
+import json
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw import cli  # noqa: E402
+from mergbw.protocol import get_profile  # noqa: E402
+
+
+def test_parse_command_builds_profile_packets():
+    profile = get_profile("hexagon_light")
+    kind, packets = cli.parse_command(profile, "scene_id 42 3")
+    assert kind == "send"
+    assert packets == profile.build_scene_by_id(42, 3)
+    assert cli.parse_command(profile, "# comment only") is None
+    assert cli.parse_command(profile, "sleep 0.25") == ("sleep", 0.25)
+
+
+def test_parse_command_rejects_bad_arity_and_ranges():
+    profile = get_profile("hexagon_light")
+    for line, message in [
+        ("color 1 2", "color takes 3 argument(s), got 2"),
+        ("color 1 2 300", "color values must be 0-255, got 300"),
+        ("brightness high", "brightness expects integers"),
+        ("on now", "on takes 0 argument(s)"),
+        ("music_sensitivity 101", "values must be 0-100"),
+        ("sleep -1", "sleep must not be negative"),
+    ]:
+        with pytest.raises(ValueError, match=re.escape(message)):
+            cli.parse_command(profile, line)
+
+
+def test_malformed_line_is_a_usage_error(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        cli.main(["send", "--simulate", "on", "color 1 2"])
+    assert excinfo.value.code == 2
+    err = capsys.readouterr().err
+    assert "line 2: color takes 3 argument(s), got 2" in err
+    assert "Traceback" not in err
+
+
+def test_replay_script_against_simulator(tmp_path, capsys):
+    script = tmp_path / "script.txt"
+    script.write_text("on\ncolor 255 0 0  # red\nbrightness 128\noff\n")
+    assert cli.main(["--timing", "replay", "--simulate", str(script)]) == 0
+    out = capsys.readouterr().out
+    assert "core import:" in out
+    assert "commands: 4" in out
+
+
+def test_bench_reports_json(capsys):
+    assert cli.main(["--profile", "hexagon_light", "bench", "--iterations", "3", "--lights", "2", "--json"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["commands"] == 3 * 2 * len(cli.BENCH_SCRIPT)
+    assert report["latency_ms"]["p95"] >= report["latency_ms"]["p50"]
+
+
+def test_scale_write_baseline_needs_baseline(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        cli.main(["scale", "--write-baseline"])
+    assert excinfo.value.code == 2
+    assert "--write-baseline needs --baseline" in capsys.readouterr().err
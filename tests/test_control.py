@@ -5,6 +5,8 @@ from pathlib import Path
 
 import asyncio
 
+import pytest
+
 ROOT = Path(__file__).resolve().parents[1]
 CONTROL_PATH = ROOT / "custom_components" / "mergbw" / "control.py"
 
@@ -23,6 +25,8 @@ control_spec = util.spec_from_file_location(
 control = util.module_from_spec(control_spec)
 assert control_spec and control_spec.loader
 control_spec.loader.exec_module(control)
+transport_module = sys.modules["custom_components.mergbw.transport"]
+protocol = sys.modules["custom_components.mergbw.protocol"]
 
 
 class DummyClient:
@@ -131,3 +135,156 @@ def test_optional_commands_skip_when_missing():
 
     # No optional builders present; should not write anything
     assert client.writes == []
+
+
+class MtuClient(DummyClient):
+    mtu_size = 23
+
+    def __init__(self, reject_long: bool = False, echo=None, parsed: int = 99):
+        super().__init__()
+        self.reject_long = reject_long
+        # Notify callback and how many frames per write the firmware parses.
+        self.echo = echo
+        self.parsed = parsed
+
+    async def write_gatt_char(self, uuid: str, data: bytes, response: bool = False):
+        if self.reject_long and len(data) > 9:
+            raise RuntimeError("invalid attribute value length")
+        self.writes.append((uuid, data))
+        if self.echo is not None:
+            for frame in protocol.split_frames(data)[: self.parsed]:
+                self.echo(frame)
+
+
+class HexagonLikeProfile(OptionalProfile):
+    frame_coalescing = None
+
+
+def _hexagon_packets():
+    profile = protocol.get_profile("hexagon_light")
+    return profile.build_power(True) + profile.build_scene("Rainbow")
+
+
+def test_transport_coalesces_frames_once_the_device_echoes_them():
+    profile = HexagonLikeProfile()
+    transport = control.DeviceTransport(profile)
+    client = MtuClient(echo=transport.handle_notify)
+    packets = _hexagon_packets()
+
+    asyncio.run(control.send(client, profile, packets, transport))
+    asyncio.run(control.send(client, profile, packets, transport))
+
+    # All frames fit in one 20 byte write on a default MTU link.
+    assert transport.coalescing is True
+    assert client.writes == [("uuid-write", b"".join(packets))] * 2
+
+
+def test_transport_resends_only_frames_the_firmware_dropped(monkeypatch):
+    monkeypatch.setattr(transport_module, "PROBE_ECHO_TIMEOUT", 0.05)
+    profile = HexagonLikeProfile()
+    transport = control.DeviceTransport(profile)
+    # The write is acknowledged but only the first frame is parsed.
+    client = MtuClient(echo=transport.handle_notify, parsed=1)
+    packets = _hexagon_packets()
+
+    asyncio.run(control.send(client, profile, packets, transport))
+
+    assert transport.coalescing is False
+    assert [data for _uuid, data in client.writes] == [b"".join(packets), *packets[1:]]
+
+
+def test_transport_falls_back_when_coalescing_rejected():
+    client = MtuClient(reject_long=True)
+    profile = HexagonLikeProfile()
+    transport = control.DeviceTransport(profile)
+    packets = [b"\x55\x06\xff\x07\x00\x02\x00", b"\x55\x0f\xff\x07\x32\x00\x00"]
+
+    asyncio.run(control.send(client, profile, packets, transport))
+
+    assert transport.coalescing is False
+    assert [data for _uuid, data in client.writes] == packets
+
+
+def test_transport_rate_follows_notify_feedback():
+    profile = DummyProfile()
+    transport = control.DeviceTransport(profile)
+    written = b"\x55\x05\xff\x06\x32\x6d"  # brightness 50
+    start = transport.bucket.rate
+
+    asyncio.run(control.send(DummyClient(), profile, [written], transport))
+    transport.handle_notify(b"\x55\x05\xff\x06\x31\x6e")  # device reports 49
+    assert transport.mismatched == 1
+    assert transport.bucket.rate < start
+
+    lowered = transport.bucket.rate
+    asyncio.run(control.send(DummyClient(), profile, [written], transport))
+    transport.handle_notify(written)
+    assert transport.confirmed == 1
+    assert transport.bucket.rate > lowered
+
+
+def test_bundle_larger_than_burst_is_charged_every_frame(monkeypatch):
+    clock = [0.0]
+    sleeps = []
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        clock[0] += delay
+
+    monkeypatch.setattr(transport_module, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+    monkeypatch.setattr(transport_module, "asyncio", types.SimpleNamespace(sleep=sleep))
+    bucket = transport_module.TokenBucket(rate=10.0, burst=2, max_rate=10.0)
+
+    asyncio.run(bucket.acquire(5))
+    assert sleeps == [] and bucket.tokens == -3
+    # The next frame waits for the three frames of debt plus itself.
+    asyncio.run(bucket.acquire(1))
+    assert sum(sleeps) == pytest.approx(0.4)
+
+
+class FlakyClient(DummyClient):
+    def __init__(self, fail_at: int):
+        super().__init__()
+        self.fail_at = fail_at
+
+    async def write_gatt_char(self, uuid: str, data: bytes, response: bool = False):
+        if len(self.writes) + 1 == self.fail_at:
+            raise ConnectionError("link lost")
+        self.writes.append((uuid, data))
+
+
+def test_transport_resumes_from_first_unwritten_frame():
+    profile = HexagonLikeProfile()
+    transport = control.DeviceTransport(profile)
+    transport.coalescing = False
+    packets = [b"\x55\x01\xff\x06\x01\x00", b"\x55\x06\xff\x07\x00\x02\x00", b"\x55\x0f\xff\x07\x32\x00\x00"]
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(control.send(FlakyClient(fail_at=3), profile, packets, transport))
+    assert transport.interrupted == packets[2:]
+
+    client = DummyClient()
+    assert asyncio.run(transport.resume(client, profile.write_char_uuid)) == 1
+    assert client.writes == [("uuid-write", packets[2])]
+    assert transport.interrupted is None
+    stats = transport.resume_diagnostics()
+    assert (stats["interrupted"], stats["resumed"], stats["resent_frames"], stats["success_rate"]) == (1, 1, 1, 1.0)
+
+
+def test_resume_skips_superseded_and_applied_frames():
+    profile = DummyProfile()
+    profile.mode_commands = frozenset({0x03, 0x06})
+    transport = control.DeviceTransport(profile)
+    transport.coalescing = False
+    red, scene, blue = b"\x55\x03\xff\x07\xff\x00\x00", b"\x55\x06\xff\x05\x02", b"\x55\x03\xff\x07\x00\x00\xff"
+    power = b"\x55\x01\xff\x05\x01"
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(control.send(FlakyClient(fail_at=1), profile, [power, red, scene, blue], transport))
+    # The device confirmed power before the write call failed.
+    transport.last_frames[0x01] = power
+
+    client = DummyClient()
+    asyncio.run(transport.resume(client, profile.write_char_uuid))
+    assert client.writes == [("uuid-write", blue)]
+    assert transport.resume_stats["skipped_frames"] == 3
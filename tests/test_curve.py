@@ -0,0 +1,80 @@
+import asyncio
+import sys
+import types
+from datetime import datetime
+from importlib import util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+PKG_DIR = ROOT / "custom_components" / "mergbw"
+
+# Stub package modules so relative imports work without importing HA.
+custom_components = types.ModuleType("custom_components")
+custom_components.__path__ = [str(ROOT / "custom_components")]
+sys.modules.setdefault("custom_components", custom_components)
+mergbw_pkg = types.ModuleType("custom_components.mergbw")
+mergbw_pkg.__path__ = [str(PKG_DIR)]
+sys.modules.setdefault("custom_components.mergbw", mergbw_pkg)
+
+
+def _load(name):
+    spec = util.spec_from_file_location(f"custom_components.mergbw.{name}", PKG_DIR / f"{name}.py")
+    module = util.module_from_spec(spec)
+    assert spec and spec.loader
+    spec.loader.exec_module(module)
+    return module
+
+
+curve = _load("curve")
+protocol = _load("protocol")
+transport = _load("transport")
+
+
+class FakeClient:
+    def __init__(self):
+        self.writes = []
+
+    async def write_gatt_char(self, uuid, data, **kwargs):
+        self.writes.append(data)
+
+
+class FakeLight:
+    def __init__(self, unique_id, profile_key):
+        self.unique_id = unique_id
+        self.profile_key = profile_key
+        self.profile = protocol.get_profile(profile_key)
+        self.transport = transport.DeviceTransport(self.profile)
+        self.is_on = True
+        self.client = FakeClient()
+
+    async def async_apply_curve(self, packets, rgb, brightness):
+        await self.transport.send(self.client, packets, self.profile.write_char_uuid)
+
+
+def test_kelvin_to_rgb_warm_and_cool():
+    warm = curve.kelvin_to_rgb(2200)
+    cool = curve.kelvin_to_rgb(6500)
+    assert warm[0] == 255 and warm[2] < 100
+    assert cool[2] > 240
+
+
+def test_engine_only_sends_quantized_changes():
+    engine = curve.CircadianEngine()
+    lights = [FakeLight(f"hex{i}", "hexagon_light") for i in range(3)] + [FakeLight("sun", "sunset_light")]
+    for light in lights:
+        engine.add(light)
+
+    asyncio.run(engine.async_tick(datetime(2024, 1, 1, 13, 0, 0)))
+    first = [len(light.client.writes) for light in lights]
+    assert all(first)
+
+    # Ten seconds later nothing changes in device units, so nothing is sent.
+    asyncio.run(engine.async_tick(datetime(2024, 1, 1, 13, 0, 10)))
+    assert [len(light.client.writes) for light in lights] == first
+    assert engine.skipped == len(lights)
+
+    # Lights that are off are left alone.
+    lights[0].is_on = False
+    asyncio.run(engine.async_tick(datetime(2024, 1, 1, 20, 0, 0)))
+    assert len(lights[0].client.writes) == first[0]
+    assert len(lights[1].client.writes) > first[1]
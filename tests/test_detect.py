@@ -0,0 +1,95 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw.detect import async_detect_profile, classify_report  # noqa: E402
+from mergbw.protocol import PROFILE_HEXAGON, PROFILE_SUNSET, get_profile  # noqa: E402
+from test_light_validation import load_integration  # noqa: E402 - integration loaded against HA stubs
+
+
+class FakeClient:
+    """Sends the report a given firmware would send on subscribe."""
+
+    def __init__(self, unsolicited=None, services=None):
+        self.unsolicited = unsolicited
+        self.services = services
+        self.writes = []
+        self._notify = None
+
+    async def start_notify(self, _uuid, callback):
+        self._notify = callback
+        if self.unsolicited:
+            asyncio.get_running_loop().call_soon(callback, None, bytearray(self.unsolicited))
+
+    async def stop_notify(self, _uuid):
+        self._notify = None
+
+    async def write_gatt_char(self, _uuid, data, response=False):
+        self.writes.append(bytes(data))
+
+
+class Services:
+    def __init__(self, uuids):
+        self.uuids = set(uuids)
+
+    def get_characteristic(self, uuid):
+        return uuid if uuid in self.uuids else None
+
+
+def test_classify_report_by_shape():
+    hexagon = get_profile(PROFILE_HEXAGON)
+    sunset = get_profile(PROFILE_SUNSET)
+    assert classify_report(0x05, hexagon.build_brightness(128)[0][4:-1]) == PROFILE_HEXAGON
+    assert classify_report(0x05, sunset.build_brightness(128)[0][4:-1]) == PROFILE_SUNSET
+    assert classify_report(0x03, sunset.build_color(1, 2, 3)[0][4:-1]) == PROFILE_SUNSET
+    assert classify_report(0x01, b"\x01") is None
+
+
+def test_unsolicited_report_decides_without_writing():
+    for key in (PROFILE_SUNSET, PROFILE_HEXAGON):
+        client = FakeClient(unsolicited=get_profile(key).build_brightness(255)[0])
+        assert asyncio.run(async_detect_profile(client, listen=0.5)) == key
+        assert client.writes == []
+
+
+def test_silent_light_is_undecided_and_foreign_device_is_rejected():
+    client = FakeClient()
+    assert asyncio.run(async_detect_profile(client, listen=0.01)) is None
+    assert client.writes == []
+    foreign = FakeClient(services=Services({"0000fff3-0000-1000-8000-00805f9b34fb"}))
+    assert asyncio.run(async_detect_profile(foreign, listen=0.01)) is None
+
+
+def test_silent_lights_are_marked_undetected_and_not_probed_again(monkeypatch):
+    from types import SimpleNamespace
+
+    integration = load_integration()
+    hexagon, silent, away = "AA:BB:CC:DD:EE:01", "AA:BB:CC:DD:EE:02", "AA:BB:CC:DD:EE:03"
+    results = {hexagon: (True, PROFILE_HEXAGON), silent: (True, None), away: (False, None)}
+    probed = []
+
+    async def probe(_hass, mac, _slots):
+        probed.append(mac)
+        return results[mac]
+
+    monkeypatch.setattr(integration, "_async_probe_profile", probe)
+    updates = []
+    hass = SimpleNamespace(
+        data={"mergbw": {"connect_slots": None}},
+        config_entries=SimpleNamespace(async_update_entry=lambda entry, data: updates.append(data)),
+    )
+    devices = [{"mac": mac, "profile": "auto", "name": f"Light {mac[-1]}"} for mac in (hexagon, silent, away)]
+    entry = SimpleNamespace(data={"devices": devices})
+
+    asyncio.run(integration._async_detect_profiles(hass, entry))
+
+    stored = {device["mac"]: device for device in updates[-1]["devices"]}
+    assert stored[hexagon]["profile"] == PROFILE_HEXAGON
+    assert stored[silent] == {**devices[1], "undetected": True}
+    assert stored[away] == devices[2]
+    # The next setup only probes the light that was out of range.
+    entry.data = updates[-1]
+    assert list(integration._pending_detection(entry)) == [away]
@@ -26,10 +26,20 @@ class HomeAssistant:
     pass
 
 core_mod.HomeAssistant = HomeAssistant
+core_mod.callback = lambda func: func
+core_mod.ServiceCall = object
+core_mod.ServiceResponse = dict
+core_mod.SupportsResponse = types.SimpleNamespace(NONE="none", OPTIONAL="optional", ONLY="only")
 helpers_mod = types.ModuleType("homeassistant.helpers")
 entity_platform = types.ModuleType("homeassistant.helpers.entity_platform")
 cv_mod = types.ModuleType("homeassistant.helpers.config_validation")
 event_mod = types.ModuleType("homeassistant.helpers.event")
+storage_mod = types.ModuleType("homeassistant.helpers.storage")
+issue_registry = types.ModuleType("homeassistant.helpers.issue_registry")
+issue_registry.IssueSeverity = types.SimpleNamespace(WARNING="warning")
+issue_registry.async_create_issue = lambda hass, domain, issue_id, **kwargs: None
+issue_registry.async_delete_issue = lambda hass, domain, issue_id: None
+helpers_mod.issue_registry = issue_registry
 exceptions_mod = types.ModuleType("homeassistant.exceptions")
 util_mod = types.ModuleType("homeassistant.util")
 dt_mod = types.ModuleType("homeassistant.util.dt")
@@ -43,7 +53,7 @@ dt_mod.utcnow = utcnow
 util_mod.dt = dt_mod
 
 class LightEntity:
-    pass
+    entity_id = None
 
 class ColorMode:
     RGB = "rgb"
@@ -54,28 +64,42 @@ class LightEntityFeature:
 light_mod.ATTR_BRIGHTNESS = "brightness"
 light_mod.ATTR_RGB_COLOR = "rgb_color"
 light_mod.ATTR_EFFECT = "effect"
+light_mod.ATTR_EFFECT_LIST = "effect_list"
 light_mod.LightEntity = LightEntity
 light_mod.ColorMode = ColorMode
 light_mod.LightEntityFeature = LightEntityFeature
 
 bluetooth_mod.async_ble_device_from_address = lambda *args, **kwargs: None
 
-class BluetoothCallbackMatcher:
-    def __init__(self, *args, **kwargs):
-        pass
+class BluetoothCallbackMatcher(dict):
+    pass
 
-def async_register_callback(*args, **kwargs):
+def async_register_callback(hass, callback, matcher, mode):
+    # Home Assistant rejects name matchers it cannot index by a literal prefix.
+    local_name = matcher.get("local_name")
+    if local_name is not None and (len(local_name) < 3 or set(local_name[:3]) & set("*[")):
+        raise ValueError(f"Local name matcher {local_name!r} is too broad")
+    getattr(hass, "bluetooth_callbacks", []).append((matcher, callback))
     return lambda: None
 
 bluetooth_mod.BluetoothCallbackMatcher = BluetoothCallbackMatcher
+bluetooth_mod.BluetoothScanningMode = types.SimpleNamespace(PASSIVE="passive")
 bluetooth_mod.async_register_callback = async_register_callback
+bluetooth_mod.async_discovered_service_info = lambda hass, connectable=True: []
 
 const_mod.CONF_MAC = "mac"
+const_mod.CONF_NAME = "name"
 const_mod.EVENT_HOMEASSISTANT_STOP = "homeassistant_stop"
 const_mod.WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
 
 cv_mod.make_entity_service_schema = lambda value: value
 cv_mod.string = str
+cv_mod.time = str
+cv_mod.boolean = bool
+cv_mod.byte = int
+cv_mod.entity_ids = list
+cv_mod.config_entry_only_config_schema = lambda domain: None
+cv_mod.has_at_least_one_key = lambda *keys: None
 
 class HomeAssistantError(Exception):
     pass
@@ -93,6 +117,20 @@ def _async_track_time_interval(*args, **kwargs):
 
 event_mod.async_call_later = _async_call_later
 event_mod.async_track_time_interval = _async_track_time_interval
+event_mod.async_track_time_change = _async_track_time_interval
+
+
+class Store:
+    def __init__(self, *args, **kwargs):
+        self.saved = None
+
+    async def async_load(self):
+        return None
+
+    def async_delay_save(self, data_func, delay=0):
+        self.saved = data_func()
+
+storage_mod.Store = Store
 
 # Voluptuous stub
 vol_mod = types.ModuleType("voluptuous")
@@ -101,6 +139,11 @@ vol_mod.Optional = lambda *args, **kwargs: None
 vol_mod.Any = lambda *args, **kwargs: None
 vol_mod.Range = lambda *args, **kwargs: None
 vol_mod.In = lambda *args, **kwargs: None
+vol_mod.All = lambda *args, **kwargs: None
+vol_mod.Coerce = lambda *args, **kwargs: None
+vol_mod.Schema = lambda *args, **kwargs: None
+vol_mod.Exclusive = lambda *args, **kwargs: None
+vol_mod.ExactSequence = lambda *args, **kwargs: None
 
 # Bleak retry connector stub
 bleak_retry = types.ModuleType("bleak_retry_connector")
@@ -120,6 +163,8 @@ sys.modules.setdefault("homeassistant.helpers", helpers_mod)
 sys.modules.setdefault("homeassistant.helpers.entity_platform", entity_platform)
 sys.modules.setdefault("homeassistant.helpers.config_validation", cv_mod)
 sys.modules.setdefault("homeassistant.helpers.event", event_mod)
+sys.modules.setdefault("homeassistant.helpers.storage", storage_mod)
+sys.modules.setdefault("homeassistant.helpers.issue_registry", issue_registry)
 sys.modules.setdefault("homeassistant.exceptions", exceptions_mod)
 sys.modules.setdefault("homeassistant.util", util_mod)
 sys.modules.setdefault("homeassistant.util.dt", dt_mod)
@@ -143,8 +188,21 @@ assert light_spec and light_spec.loader
 light_spec.loader.exec_module(light)
 
 
+def load_integration():
+    """Load the integration's ``__init__`` against the same stubs."""
+    name = "custom_components.mergbw.integration"
+    if name not in sys.modules:
+        spec = util.spec_from_file_location(name, LIGHT_PATH.with_name("__init__.py"))
+        module = util.module_from_spec(spec)
+        module.__package__ = "custom_components.mergbw"
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
 class DummyHass:
-    pass
+    states = types.SimpleNamespace(get=lambda entity_id: None)
+    config_entries = types.SimpleNamespace(async_entries=lambda domain: [])
 
 
 def test_validate_scene_accepts_known_scene():
@@ -156,3 +214,1003 @@ def test_validate_scene_rejects_unknown_scene():
     entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", DummyHass(), "sunset_light")
     with pytest.raises(HomeAssistantError):
         entity._validate_scene("not-a-scene")
+
+
+def test_state_write_skipped_when_nothing_changed():
+    import json
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.entity_id = "light.test"
+    written = {}
+    sizes = []
+
+    def write():
+        # What HA would serialize: the state plus every attribute.
+        attributes = {
+            "effect_list": entity._attr_effect_list,
+            "brightness": entity._brightness,
+            "effect": entity._effect,
+            **entity.extra_state_attributes,
+        }
+        written["light.test"] = types.SimpleNamespace(
+            as_dict_json=json.dumps(
+                {"entity_id": "light.test", "state": "on" if entity._is_on else "off", "attributes": attributes},
+                separators=(",", ":"),
+            ).encode()
+        )
+        sizes.append(len(written["light.test"].as_dict_json))
+
+    entity.async_write_ha_state = write
+    hass.states = types.SimpleNamespace(get=written.get)
+
+    entity._is_on = True
+    entity._async_write_state_if_changed()
+    first = written["light.test"]
+    entity._async_write_state_if_changed()
+    assert written["light.test"] is first
+    entity._brightness = 10
+    entity._async_write_state_if_changed()
+    entity._attr_available = False
+    entity._async_write_state_if_changed()
+
+    stats = entity.diagnostics()["state_writes"]
+    assert (stats["writes"], stats["skipped"]) == (3, 1)
+    # Sizes come from the written state; the effect list is most of it and is not recorded.
+    assert len(sizes) == 3
+    assert stats["state_bytes"] == sum(sizes)
+    assert stats["state_bytes"] > 3 * len(json.dumps(entity._attr_effect_list))
+    assert 0 < stats["approx_recorded_bytes"] < 1000
+
+
+def _optimistic_entity(fail: bool = False, report: str | None = None):
+    """Run an optimistic turn_on; ``report`` is what the device echoes: "same", "other" or None."""
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    tasks = []
+    hass.async_create_task = lambda coro: tasks.append(asyncio.ensure_future(coro)) or tasks[-1]
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", optimistic=True)
+    states = []
+    entity.async_write_ha_state = lambda: states.append((entity._is_on, entity._attr_assumed_state))
+    if report is not None:
+        # The device has reported state before.
+        entity._transport.confirmed = 1
+
+    class Client:
+        async def write_gatt_char(self, _uuid, data, **_kwargs):
+            if report == "same":
+                entity._on_notify(None, data)
+            elif report == "other":
+                entity._on_notify(None, entity._profile.build_power(False)[0])
+
+    async def run_with_client(handler):
+        await asyncio.sleep(0)
+        if fail:
+            raise HomeAssistantError("unreachable")
+        await handler(Client())
+
+    entity._run_with_client = run_with_client
+
+    async def run():
+        await entity.async_turn_on()
+        # Published before any BLE write happened.
+        assert states[-1] == (True, True)
+        await asyncio.gather(*tasks)
+        assert not entity._confirm_tasks
+
+    asyncio.run(run())
+    return states
+
+
+def test_optimistic_turn_on_confirms():
+    assert _optimistic_entity()[-1] == (True, False)
+    assert _optimistic_entity(report="same")[-1] == (True, False)
+
+
+def test_optimistic_turn_on_rolls_back_on_failure():
+    assert _optimistic_entity(fail=True)[-1] == (None, False)
+
+
+def test_optimistic_turn_on_rolls_back_when_the_device_reports_other_state():
+    assert _optimistic_entity(report="other")[-1] == (None, False)
+
+
+def test_optimistic_rollback_restores_scene_param_and_music_mode():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    tasks = []
+    hass.async_create_task = lambda coro: tasks.append(asyncio.ensure_future(coro)) or tasks[-1]
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light", optimistic=True)
+    entity.async_write_ha_state = lambda: None
+    entity._is_on, entity._effect, entity._scene_param, entity._music_mode = True, "Scene 9", 2, None
+
+    async def run_with_client(handler):
+        raise HomeAssistantError("unreachable")
+
+    entity._run_with_client = run_with_client
+
+    async def run():
+        await entity.async_turn_on(rgb_color=(255, 0, 0))
+        assert (entity._effect, entity._scene_param) == (None, None)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert (entity._rgb_color, entity._effect, entity._scene_param) == (None, "Scene 9", 2)
+
+    entity._effect, entity._scene_param, entity._music_mode = None, None, 3
+    tasks.clear()
+
+    async def run_music():
+        await entity.async_handle_set_scene_id(9, 2)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run_music())
+    assert (entity._effect, entity._scene_param, entity._music_mode) == (None, None, 3)
+
+
+def test_pending_confirmation_is_cancelled_on_removal():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    hass.async_create_task = asyncio.ensure_future
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", optimistic=True)
+    entity.async_write_ha_state = lambda: None
+
+    async def run_with_client(handler):
+        await asyncio.sleep(3600)
+
+    entity._run_with_client = run_with_client
+
+    async def run():
+        await entity.async_turn_on()
+        (task,) = entity._confirm_tasks
+        await asyncio.sleep(0)
+        await entity.async_will_remove_from_hass()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+
+def test_persistent_light_reconnects_after_drop(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(light, "RECONNECT_BACKOFF_SECONDS", (0,))
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", persistent=True)
+    states = []
+    entity.async_write_ha_state = lambda: states.append(entity._attr_available)
+    attempts = []
+
+    async def ensure_connected():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise HomeAssistantError("out of range")
+        entity._attr_available = True
+
+    entity._ensure_connected = ensure_connected
+
+    async def run():
+        hass.async_create_background_task = lambda coro, name: asyncio.ensure_future(coro)
+        entity._schedule_disconnect()
+        assert entity._disconnect_timer is None
+        entity._on_disconnected(None)
+        assert states == [False]
+        await entity._reconnect_task
+
+    asyncio.run(run())
+    assert len(attempts) == 3
+    assert entity._attr_available
+
+
+def test_persistent_light_unavailable_when_first_connect_fails(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(light, "RECONNECT_BACKOFF_SECONDS", (0,))
+    hass = DummyHass()
+    hass.data = {}
+    hass.async_create_background_task = lambda coro, name: asyncio.ensure_future(coro)
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", persistent=True)
+    states = []
+    entity.async_write_ha_state = lambda: states.append(entity._attr_available)
+    attempts = []
+
+    async def ensure_connected():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise HomeAssistantError("out of range")
+        entity._attr_available = True
+        entity._async_write_state_if_changed()
+
+    entity._ensure_connected = ensure_connected
+
+    async def run():
+        entity._async_start_reconnect()
+        await entity._reconnect_task
+
+    asyncio.run(run())
+    assert states == [False, True]
+
+
+def test_keepalive_probes_the_link_and_reconnects_when_it_is_dead():
+    import asyncio
+    from types import SimpleNamespace
+
+    hass = DummyHass()
+    hass.data = {}
+    reconnects = []
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", persistent=True)
+    entity.async_write_ha_state = lambda: None
+    entity._async_start_reconnect = lambda: reconnects.append(1)
+    entity._is_on = True
+    notify = SimpleNamespace(uuid=entity._profile.notify_char_uuid, properties=["read", "notify"])
+    reads = []
+
+    class Client:
+        is_connected = True
+        dead = False
+        services = SimpleNamespace(get_characteristic=lambda uuid: notify if uuid == notify.uuid else None)
+
+        async def read_gatt_char(self, char):
+            if self.dead:
+                raise OSError("link lost")
+            reads.append(char)
+            return b"\x00"
+
+        async def write_gatt_char(self, uuid, data, response=False):
+            raise AssertionError("the keepalive must not write")
+
+        async def disconnect(self):
+            self.is_connected = False
+
+    client = entity._client = Client()
+
+    async def run():
+        await entity._async_keepalive(None)
+        assert reads == [notify]
+        assert reconnects == []
+        client.dead = True
+        await entity._async_keepalive(None)
+
+    asyncio.run(run())
+    assert reconnects == [1]
+    assert entity._client is None
+    assert not entity._attr_available
+    assert not client.is_connected
+
+
+def test_keepalive_without_a_readable_characteristic_sends_nothing():
+    import asyncio
+    from types import SimpleNamespace
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", persistent=True)
+    entity.async_write_ha_state = lambda: None
+    entity._is_on = True
+    write_only = SimpleNamespace(properties=["write-without-response"])
+
+    class Client:
+        is_connected = True
+        services = SimpleNamespace(get_characteristic=lambda uuid: write_only)
+
+        async def read_gatt_char(self, char):
+            raise AssertionError("not readable")
+
+        async def write_gatt_char(self, uuid, data, response=False):
+            raise AssertionError("the keepalive must not write")
+
+    entity._client = Client()
+    asyncio.run(entity._async_keepalive(None))
+    assert entity._client is not None
+
+
+def test_sync_scene_stages_power_and_releases_the_scene_without_holding_the_lock():
+    import asyncio
+
+    sync = sys.modules["custom_components.mergbw.sync"]
+    hass = DummyHass()
+    hass.data = {}
+    writes = []
+    slow_connected = asyncio.Event()
+    lights = [
+        light.MeRGBWLight(f"00:11:22:33:44:{idx}0", "Test", hass, "hexagon_light") for idx in range(2)
+    ]
+
+    class Client:
+        is_connected = True
+
+        def __init__(self, name):
+            self.name = name
+
+        async def write_gatt_char(self, _uuid, data, **_kwargs):
+            writes.append((self.name, bytes(data)))
+
+    for idx, entity in enumerate(lights):
+        entity.async_write_ha_state = lambda: None
+        entity._transport.coalescing = False
+        client = Client(idx)
+
+        async def ensure_connected(client=client, idx=idx):
+            if idx == 1:
+                await slow_connected.wait()
+            return client
+
+        entity._ensure_connected = ensure_connected
+
+    async def run():
+        participants = {idx: entity.sync_scene_participant(scene_id=42) for idx, entity in enumerate(lights)}
+        apply = asyncio.ensure_future(sync.async_synchronized_apply(participants, stage_timeout=2))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # The first light is powered on and waits for the second without its lock.
+        assert writes == [(0, lights[0]._profile.build_power(True)[0])]
+        assert not lights[0]._command_lock.locked()
+        slow_connected.set()
+        return await apply
+
+    report = asyncio.run(run())
+    assert report["released"] == 2
+    scene = lights[0]._profile.build_scene_by_id(42, None)
+    # No light gets the scene select before the release.
+    assert [data for _name, data in writes[:2]] == lights[0]._profile.build_power(True) * 2
+    assert sorted(writes[2:]) == sorted((idx, data) for idx in range(2) for data in scene)
+    assert all(entity._effect == "Scene 42" and entity._hold_until == 0.0 for entity in lights)
+
+
+def test_audio_frames_use_the_held_client_under_the_command_lock(monkeypatch):
+    import asyncio
+
+    timers = []
+    monkeypatch.setattr(light, "async_call_later", lambda hass, delay, action: timers.append(delay) or (lambda: None))
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    writes = []
+    connects = []
+
+    class Client:
+        is_connected = True
+
+        async def write_gatt_char(self, _uuid, data, **_kwargs):
+            writes.append((bytes(data), entity._command_lock.locked()))
+
+    async def ensure_connected():
+        if entity._client is None:
+            connects.append(1)
+            entity._client = Client()
+        return entity._client
+
+    entity._ensure_connected = ensure_connected
+    entity._run_with_client = None
+    entity._transport.coalescing = False
+
+    async def run():
+        stream = entity.audio_stream()
+        sender = asyncio.ensure_future(stream.run())
+        stream.offer((255, 0, 0), 128, 0.0)
+        await stream.drain()
+        stream.offer((0, 255, 0), 128, 0.0)
+        await stream.drain()
+        assert timers == []
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        return stream
+
+    stream = asyncio.run(run())
+    assert stream.sent == 2
+    assert len(connects) == 1
+    # The unchanged brightness is not sent again.
+    assert len(writes) == 3 and all(locked for _data, locked in writes)
+    # The idle disconnect is armed again once the stream ends.
+    assert timers == [light.IDLE_DISCONNECT_SECONDS]
+
+
+def test_audio_frames_wait_for_a_command_in_flight(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(light, "async_call_later", lambda hass, delay, action: lambda: None)
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    writes = []
+
+    class Client:
+        is_connected = True
+
+        async def write_gatt_char(self, _uuid, data, **_kwargs):
+            writes.append(bytes(data))
+
+    async def ensure_connected():
+        entity._client = entity._client or Client()
+        return entity._client
+
+    entity._ensure_connected = ensure_connected
+    entity._transport.coalescing = False
+
+    async def run():
+        gate = asyncio.Event()
+        first, second = entity._profile.build_power(True)[0], entity._profile.build_power(False)[0]
+
+        async def command(client):
+            await client.write_gatt_char(None, first)
+            await gate.wait()
+            await client.write_gatt_char(None, second)
+
+        pending = asyncio.ensure_future(entity._run_with_client(command))
+        await asyncio.sleep(0)
+        stream = entity.audio_stream()
+        sender = asyncio.ensure_future(stream.run())
+        stream.offer((255, 0, 0), 128, 0.0)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # The frame waits for the command instead of landing between its writes.
+        assert writes == [first]
+        gate.set()
+        await pending
+        await stream.drain()
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert writes[:2] == [first, second]
+    assert writes[2:] == entity._profile.build_color(255, 0, 0) + entity._profile.build_brightness(128)
+
+
+def test_stop_audio_reports_after_the_engine_task_was_cancelled():
+    import asyncio
+
+    integration = load_integration()
+    engine = types.SimpleNamespace(stop=lambda: None, report=lambda: {"blocks": 3})
+
+    async def run():
+        task = asyncio.ensure_future(asyncio.sleep(10))
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        hass = types.SimpleNamespace(data={"mergbw": {integration.DATA_AUDIO: (engine, task)}})
+        return await integration._async_stop_audio(hass)
+
+    assert asyncio.run(run()) == {"blocks": 3}
+
+
+def test_hub_entry_sets_up_lights_in_one_batch(monkeypatch):
+    import asyncio
+
+    registered = []
+    platform = types.SimpleNamespace(async_register_entity_service=lambda name, *args: registered.append(name))
+    monkeypatch.setattr(light.entity_platform, "async_get_current_platform", lambda: platform)
+    hass = DummyHass()
+    hass.data = {"mergbw": {"lights": {}}}
+    devices = [
+        {"mac": f"00:11:22:33:44:{idx:02X}", "profile": "hexagon_light" if idx % 2 else "sunset_light"}
+        for idx in range(50)
+    ]
+    entry = types.SimpleNamespace(entry_id="hub", data={"devices": devices}, options={})
+    batches = []
+
+    asyncio.run(light.async_setup_entry(hass, entry, batches.append))
+
+    assert len(batches) == 1 and len(batches[0]) == 50
+    assert len(registered) == len(set(registered))
+    assert len(hass.data["mergbw"]["lights"]) == 50
+    # Lights of one kind share the profile instance.
+    assert batches[0][1].profile is batches[0][3].profile
+
+
+def test_power_schedule_pushed_once_and_followed_locally(monkeypatch):
+    import asyncio
+
+    trackers = []
+    monkeypatch.setattr(
+        light,
+        "async_track_time_change",
+        lambda hass, action, **at: trackers.append((action, at)) or (lambda: None),
+    )
+    hass = DummyHass()
+    hass.data = {"mergbw": {}}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+    writes = []
+
+    async def run_with_client(handler):
+        writes.append(handler)
+
+    entity._run_with_client = run_with_client
+    rules = [
+        {"action": "on", "at": "07:30", "days": ["mon", "tue"]},
+        {"action": "off", "at": "23:00"},
+    ]
+
+    async def run():
+        await entity.async_handle_set_power_schedule(rules)
+        await entity.async_handle_set_power_schedule(rules)
+        # Monday 2024-01-01 at the on time, then at the off time.
+        await trackers[0][0](datetime(2024, 1, 1, 7, 30))
+        assert entity._is_on is True
+        await trackers[1][0](datetime(2024, 1, 1, 23, 0))
+        assert entity._is_on is False
+        # Wednesday is not an on day.
+        await trackers[0][0](datetime(2024, 1, 3, 7, 30))
+        assert entity._is_on is False
+
+    asyncio.run(run())
+    assert len(writes) == 1
+    assert [at for _action, at in trackers] == [
+        {"hour": 7, "minute": 30, "second": 0},
+        {"hour": 23, "minute": 0, "second": 0},
+    ]
+    _schedules, store = hass.data["mergbw"]["schedules"]
+    assert store.saved["00:11:22:33:44:55"]["on_days_mask"] == 0b11
+    assert entity.extra_state_attributes["power_schedule"][0] == ("on", "07:30", ("mon", "tue"))
+
+
+def test_set_schedule_always_writes_and_removed_lights_are_pruned(monkeypatch):
+    import asyncio
+
+    stored = {"00:11:22:33:44:55": {}, "00:11:22:33:44:99": {}}
+
+    class LoadedStore(Store):
+        async def async_load(self):
+            return dict(stored)
+
+    monkeypatch.setattr(light, "Store", LoadedStore)
+    hass = DummyHass()
+    hass.data = {"mergbw": {}}
+    entry = types.SimpleNamespace(data={"mac": "00:11:22:33:44:55", "profile": "hexagon_light"})
+    hass.config_entries = types.SimpleNamespace(async_entries=lambda domain: [entry])
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+    writes = []
+
+    async def run_with_client(handler):
+        writes.append(handler)
+
+    entity._run_with_client = run_with_client
+    schedule = dict(
+        on_enabled=True,
+        on_hour=7,
+        on_minute=0,
+        on_days_mask=0x7F,
+        off_enabled=False,
+        off_hour=0,
+        off_minute=0,
+        off_days_mask=0,
+    )
+
+    async def run():
+        await entity.async_handle_set_schedule(**schedule)
+        await entity.async_handle_set_schedule(**schedule)
+
+    asyncio.run(run())
+    assert len(writes) == 2
+    _schedules, store = hass.data["mergbw"]["schedules"]
+    assert list(store.saved) == ["00:11:22:33:44:55"]
+
+
+def test_circadian_tick_stops_with_the_last_light_and_enrollment_is_stored(monkeypatch):
+    import asyncio
+
+    ticks = []
+    cancelled = []
+    monkeypatch.setattr(
+        light,
+        "async_track_time_interval",
+        lambda hass, action, interval: ticks.append(action) or (lambda: cancelled.append(action)),
+    )
+    hass = DummyHass()
+    hass.data = {"mergbw": {}}
+    first = light.MeRGBWLight("00:11:22:33:44:55", "First", hass, "hexagon_light")
+    second = light.MeRGBWLight("00:11:22:33:44:66", "Second", hass, "hexagon_light")
+    for entity in (first, second):
+        entity.async_write_ha_state = lambda: None
+
+    async def run():
+        await first.async_handle_set_circadian(True)
+        await second.async_handle_set_circadian(True)
+        assert len(ticks) == 1
+        await first.async_will_remove_from_hass()
+        assert cancelled == []
+        await second.async_handle_set_circadian(False)
+        assert cancelled == ticks
+        assert "circadian_tick" not in hass.data["mergbw"]
+
+    asyncio.run(run())
+    _enrolled, store = hass.data["mergbw"]["circadian_enrolled"]
+    # Removing an entity keeps its enrollment for the next setup.
+    assert store.saved == ["00:11:22:33:44:55"]
+
+
+def test_discovery_registers_prefix_name_matchers():
+    spec = util.spec_from_file_location(
+        "custom_components.mergbw.discovery", ROOT / "custom_components" / "mergbw" / "discovery.py"
+    )
+    discovery = util.module_from_spec(spec)
+    sys.modules[spec.name] = discovery
+    spec.loader.exec_module(discovery)
+    hass = DummyHass()
+    hass.data = {}
+    hass.bluetooth_callbacks = []
+    hass.bus = types.SimpleNamespace(async_listen_once=lambda *args: None)
+
+    index = discovery.async_get_discovery_index(hass)
+
+    names = [matcher.get("local_name") for matcher, _callback in hass.bluetooth_callbacks]
+    assert {"Hexagon*", "hexagon*", "Sunset*"} <= set(names)
+    _matcher, update = hass.bluetooth_callbacks[-1]
+    update(types.SimpleNamespace(address="AA", name="hexagon 1", service_uuids=[], rssi=-50), None)
+    assert [light.profile for light in index.candidates()] == ["hexagon_light"]
+
+
+def test_interrupted_transaction_resumes_after_one_reconnect():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+    entity._transport.coalescing = False
+
+    class Client:
+        is_connected = True
+
+        def __init__(self, fail_at=0):
+            self.fail_at = fail_at
+            self.writes = []
+
+        async def write_gatt_char(self, _uuid, data, response=False):
+            if len(self.writes) + 1 == self.fail_at:
+                raise ConnectionError("link lost")
+            self.writes.append(bytes(data))
+
+        async def disconnect(self):
+            self.is_connected = False
+
+    clients = [Client(fail_at=3), Client()]
+
+    async def ensure_connected():
+        if not (entity._client and entity._client.is_connected):
+            entity._client = clients.pop(0)
+        return entity._client
+
+    entity._ensure_connected = ensure_connected
+    first, second = clients
+
+    asyncio.run(entity.async_turn_on(rgb_color=(255, 0, 0), brightness=128))
+
+    packets = light.control.build_turn_on(entity._profile, (255, 0, 0), None, 128)
+    assert first.writes == packets[:2]
+    assert second.writes == packets[2:]
+    assert entity._rgb_color == (255, 0, 0) and entity._brightness == 128
+    assert entity.diagnostics()["transport"]["resume"]["resumed"] == 1
+
+
+def test_calibrated_light_recalibrates_preset_colours(monkeypatch):
+    import asyncio
+
+    from mergbw.presets import PresetLibrary
+
+    hass = DummyHass()
+    hass.data = {}
+    calibration = light.Calibration(red_gain=0.5)
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", calibration=calibration)
+    entity.async_write_ha_state = lambda: None
+    library = PresetLibrary()
+    library.save("red", {"rgb_color": [255, 0, 0], "brightness": 100})
+    bundle = library.bundle("red", "sunset_light")
+    packets = []
+
+    async def send(_client, _profile, data, _transport=None):
+        packets.extend(data)
+
+    async def run_with_client(handler):
+        await handler(None)
+
+    entity._run_with_client = run_with_client
+    monkeypatch.setattr(light.control, "send", send)
+
+    asyncio.run(entity.async_apply_preset(bundle))
+
+    assert entity._profile.build_color(255, 0, 0)[0] in packets
+    assert bundle.packets[1] not in packets
+    assert entity._rgb_color == (255, 0, 0)
+
+
+def test_calibrated_audio_stream_leaves_correction_to_the_engine(monkeypatch):
+    monkeypatch.setattr(light, "async_call_later", lambda hass, delay, action: lambda: None)
+    hass = DummyHass()
+    hass.data = {}
+    calibration = light.Calibration(red_gain=0.5)
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light", calibration=calibration)
+    stream = entity.audio_stream()
+    assert stream.tables is calibration.tables()
+    # The engine offers corrected colours, so encoding must not correct them again.
+    shared = entity._profile.shared
+    assert stream._encode((128, 0, 0), 64) == shared.build_color(128, 0, 0) + shared.build_brightness(64)
+
+
+def test_traced_turn_on_links_spans_to_the_context():
+    import asyncio
+    from types import SimpleNamespace
+
+    memory = light.tracing.MemoryExporter()
+    hass = DummyHass()
+    hass.data = {"mergbw": {"tracer": light.tracing.Tracer([memory])}}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+    entity._context = SimpleNamespace(id="ctx-1")
+    entity._transport.coalescing = False
+
+    class Client:
+        is_connected = True
+
+        async def write_gatt_char(self, _uuid, data, response=False):
+            pass
+
+    entity._client = Client()
+    asyncio.run(entity.async_turn_on(brightness=128))
+
+    spans = memory.spans()
+    names = [span["name"] for span in spans]
+    root = spans[-1]
+    assert root["name"].endswith("async_turn_on") and root["parent_id"] is None
+    assert {"queue_wait", "gatt_write", "state_write"} <= set(names)
+    assert {span["context_id"] for span in spans} == {"ctx-1"}
+    assert root["attributes"]["mac"] == "00:11:22:33:44:55"
+
+
+def test_optimistic_command_traces_the_background_write():
+    import asyncio
+    from types import SimpleNamespace
+
+    memory = light.tracing.MemoryExporter()
+    hass = DummyHass()
+    hass.data = {"mergbw": {"tracer": light.tracing.Tracer([memory])}}
+    tasks = []
+    hass.async_create_task = lambda coro: tasks.append(asyncio.ensure_future(coro)) or tasks[-1]
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light", optimistic=True)
+    entity.async_write_ha_state = lambda: None
+    entity._context = SimpleNamespace(id="ctx-1")
+    entity._transport.coalescing = False
+
+    class Client:
+        is_connected = True
+
+        async def write_gatt_char(self, _uuid, data, response=False):
+            pass
+
+    entity._client = Client()
+
+    async def run():
+        await entity.async_turn_on(brightness=128)
+        # The root span stays open until the background write is confirmed.
+        assert memory.spans() == []
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    spans = memory.spans()
+    root = spans[-1]
+    assert root["name"].endswith("async_turn_on") and root["parent_id"] is None
+    assert "gatt_write" in [span["name"] for span in spans]
+    assert all(span["parent_id"] is not None for span in spans[:-1])
+    assert {span["trace_id"] for span in spans} == {root["trace_id"]}
+    assert {span["context_id"] for span in spans} == {"ctx-1"}
+
+
+def test_identical_concurrent_commands_share_one_transaction():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+    sent = []
+
+    async def run_with_client(handler):
+        sent.append(handler)
+        await asyncio.sleep(0.01)
+
+    entity._run_with_client = run_with_client
+
+    async def run():
+        red, blue = {"rgb_color": (255, 0, 0)}, {"rgb_color": (0, 0, 255)}
+        await asyncio.gather(*(entity.async_turn_on(**red) for _ in range(3)))
+        # Only the newest command can be joined: the last red must be sent again.
+        await asyncio.gather(
+            entity.async_turn_on(**red), entity.async_turn_on(**blue), entity.async_turn_on(**red)
+        )
+
+    asyncio.run(run())
+    assert len(sent) == 4
+    assert entity.diagnostics()["single_flight"] == {"transactions": 4, "collapsed": 2}
+    assert entity._rgb_color == (255, 0, 0)
+
+
+def test_keyless_command_ends_the_single_flight_window():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+    entity._transport.coalescing = False
+
+    class Client:
+        is_connected = True
+
+        def __init__(self):
+            self.writes = []
+
+        async def write_gatt_char(self, _uuid, data, response=False):
+            self.writes.append(bytes(data))
+            await asyncio.sleep(0)
+
+    client = entity._client = Client()
+
+    async def run():
+        red = {"rgb_color": (255, 0, 0)}
+        await asyncio.gather(
+            entity.async_turn_on(**red), entity.async_handle_set_music_mode(2), entity.async_turn_on(**red)
+        )
+
+    asyncio.run(run())
+    color = entity._profile.build_color(255, 0, 0)[0]
+    # The second red is sent after the music mode, so the light ends up red.
+    assert client.writes.count(color) == 2
+    assert client.writes.index(entity._profile.build_music_mode(2)[0]) < len(client.writes) - 1
+    assert client.writes[-1] == color
+    assert entity.diagnostics()["single_flight"] == {"transactions": 2, "collapsed": 0}
+
+
+def test_collapsed_commands_share_the_failure():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light")
+    entity.async_write_ha_state = lambda: None
+
+    async def run_with_client(handler):
+        await asyncio.sleep(0)
+        raise HomeAssistantError("unreachable")
+
+    entity._run_with_client = run_with_client
+
+    async def run():
+        return await asyncio.gather(entity.async_turn_off(), entity.async_turn_off(), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [type(result) for result in results] == [HomeAssistantError, HomeAssistantError]
+    assert entity.diagnostics()["single_flight"]["collapsed"] == 1
+
+
+def test_snapshot_restore_sends_only_changed_attributes():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+    entity._transport.coalescing = False
+    writes = []
+
+    class Client:
+        is_connected = True
+
+        async def write_gatt_char(self, _uuid, data, response=False):
+            writes.append(bytes(data))
+
+    entity._client = Client()
+
+    async def run():
+        await entity.async_turn_on(brightness=200)
+        await entity.async_handle_set_scene_id(9, 2)
+        saved = entity.snapshot()
+        await entity.async_prewarm(30)
+        await entity.async_turn_on(rgb_color=(255, 0, 0))
+        writes.clear()
+        return await entity.async_restore_snapshot(saved)
+
+    changed = asyncio.run(run())
+    assert changed == ["scene"]
+    assert writes == entity._profile.build_scene_by_id(9, 2)
+    assert (entity._effect, entity._scene_param, entity._hold_until) == ("Scene 9", 2, 0.0)
+
+
+def test_prewarm_holds_the_link_only_once_connected():
+    import asyncio
+
+    hass = DummyHass()
+    hass.data = {}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "hexagon_light")
+    entity.async_write_ha_state = lambda: None
+
+    async def unreachable():
+        raise HomeAssistantError("unreachable")
+
+    entity._ensure_connected = unreachable
+    with pytest.raises(HomeAssistantError):
+        asyncio.run(entity.async_prewarm(30))
+    assert entity._hold_until == 0.0
+
+
+def test_commands_and_reconnects_feed_the_metrics_store(tmp_path):
+    import asyncio
+
+    from mergbw.metrics_store import MetricsStore
+
+    store = MetricsStore(str(tmp_path / "metrics.bin"), max_keys=4)
+    hass = DummyHass()
+    hass.data = {"mergbw": {"metrics": store}}
+    entity = light.MeRGBWLight("00:11:22:33:44:55", "Test", hass, "sunset_light")
+    entity.async_write_ha_state = lambda: None
+    entity._transport.adapter = "proxy-1"
+
+    class Client:
+        is_connected = True
+
+        async def write_gatt_char(self, _uuid, data, response=False):
+            raise ConnectionError("out of range")
+
+    entity._client = Client()
+    # Connecting ahead of a flash is not a command.
+    asyncio.run(entity.async_prewarm(30))
+    with pytest.raises(HomeAssistantError):
+        asyncio.run(entity.async_turn_off())
+
+    for key in ("00:11:22:33:44:55", "adapter:proxy-1"):
+        last_hour = store.summary(key)["last_hour"]
+        assert (last_hour["commands"], last_hour["failures"]) == (1, 1)
+
+
+def test_diagnostics_relabel_adapters_and_proxies(tmp_path):
+    import asyncio
+    import json
+    from types import SimpleNamespace
+
+    from mergbw.metrics_store import MetricsStore
+
+    def async_redact_data(data, to_redact):
+        if isinstance(data, dict):
+            return {
+                key: "**REDACTED**" if key in to_redact else async_redact_data(value, to_redact)
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [async_redact_data(value, to_redact) for value in data]
+        return data
+
+    diagnostics_stub = types.ModuleType("homeassistant.components.diagnostics")
+    diagnostics_stub.async_redact_data = async_redact_data
+    sys.modules.setdefault("homeassistant.components.diagnostics", diagnostics_stub)
+    spec = util.spec_from_file_location("custom_components.mergbw.diagnostics", LIGHT_PATH.with_name("diagnostics.py"))
+    diagnostics = util.module_from_spec(spec)
+    spec.loader.exec_module(diagnostics)
+
+    mac, proxy = "00:11:22:33:44:55", "esphome-kitchen-proxy"
+    store = MetricsStore(str(tmp_path / "metrics.bin"), max_keys=4)
+    store.record(f"adapter:{proxy}", command_ms=5.0)
+    memory = light.tracing.MemoryExporter()
+    tracer = light.tracing.Tracer([memory])
+    hass = DummyHass()
+    entity = light.MeRGBWLight(mac, "Test", hass, "hexagon_light")
+    entity._transport.adapter = proxy
+    scheduler = SimpleNamespace(metrics=lambda: {proxy: {"writes": 1, "device_writes": {mac: 1}}})
+    hass.data = {"mergbw": {"lights": {mac: entity}, "scheduler": scheduler, "metrics": store, "tracer": tracer}}
+    with tracer.start("async_turn_on", mac=mac), light.tracing.span("connect", adapter=proxy):
+        pass
+    entry = SimpleNamespace(title="Test", data={"mac": mac, "profile": "hexagon_light"})
+
+    result = asyncio.run(diagnostics.async_get_config_entry_diagnostics(hass, entry))
+    assert proxy not in json.dumps(result)
+    assert result["device"]["transport"]["adapter"] == "adapter_1"
+    assert result["scheduler"] == {"adapter_1": {"writes": 1, "device_writes": {"light_1": 1}}}
+    assert result["metrics"]["adapter_1"]["last_hour"]["commands"] == 1
+    assert result["traces"][0]["attributes"]["adapter"] == "adapter_1"
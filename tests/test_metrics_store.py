@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw.metrics_store import MetricsStore  # noqa: E402
+
+DAY = 86400
+NOW = 1_760_000_000
+
+
+def test_events_are_downsampled_into_minute_hour_and_day_buckets(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.bin"), max_keys=4)
+    store.record("AA", NOW, command_ms=40.0)
+    store.record("AA", NOW + 1, command_ms=80.0, failed=True)
+    store.record("AA", NOW + 120, connect_ms=900.0, reconnect=True)
+
+    minutes = store.buckets("AA", "minute", now=NOW + 120)
+    assert [bucket["commands"] for bucket in minutes] == [2, 0]
+    assert minutes[0]["latency_ms_mean"] == 60.0 and minutes[0]["latency_ms_max"] == 80.0
+    assert minutes[-1]["reconnects"] == 1 and minutes[-1]["connect_ms_mean"] == 900.0
+
+    last_hour = store.summary("AA", NOW + 120)["last_hour"]
+    assert (last_hour["commands"], last_hour["failures"], last_hour["failure_rate"]) == (2, 1, 0.5)
+    assert store.buckets("BB", "hour", now=NOW) == []
+
+
+def test_week_over_week_and_ring_reuse(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.bin"), max_keys=2, minutes=5, hours=4, days=14)
+    store.record("AA", NOW - 8 * DAY, command_ms=10.0, failed=True)
+    store.record("AA", NOW, command_ms=10.0)
+
+    summary = store.summary("AA", NOW)
+    assert summary["previous_week"]["failure_rate"] == 1.0
+    assert summary["this_week"]["failure_rate"] == 0.0
+    # Ten minutes later the five-slot minute ring has come round: old buckets are gone.
+    assert store.buckets("AA", "minute", now=NOW + 600) == []
+
+
+def test_store_survives_reopen_and_reuses_the_oldest_key(tmp_path):
+    path = str(tmp_path / "metrics.bin")
+    store = MetricsStore(path, max_keys=2)
+    store.record("AA", NOW, command_ms=5.0)
+    store.record("adapter:hci0", NOW + 10, command_ms=5.0)
+    store.close()
+
+    store = MetricsStore(path, max_keys=2)
+    assert store.keys() == ["AA", "adapter:hci0"]
+    assert store.summary("AA", NOW)["last_day"]["commands"] == 1
+    size = Path(path).stat().st_size
+
+    store.record("BB", NOW + 20, command_ms=5.0)
+    assert store.keys() == ["BB", "adapter:hci0"]
+    assert store.summary("BB", NOW + 20)["last_day"]["commands"] == 1
+    assert Path(path).stat().st_size == size
+    store.close()
+
+    # Another layout resets the file instead of misreading it.
+    assert MetricsStore(path, max_keys=3).keys() == []
+
+
+def test_long_keys_get_distinct_hashed_slots(tmp_path):
+    path = str(tmp_path / "metrics.bin")
+    store = MetricsStore(path, max_keys=4)
+    first, second = "adapter:" + "esphome-proxy-living-room-1", "adapter:" + "esphome-proxy-living-room-2"
+    store.record(first, NOW, command_ms=5.0)
+    store.record(second, NOW, command_ms=5.0, failed=True)
+    store.close()
+
+    store = MetricsStore(path, max_keys=4)
+    assert len(store.keys()) == 2 and all(len(key.encode()) <= 32 for key in store.keys())
+    assert first in store and second in store
+    assert store.summary(first, NOW)["last_day"]["failures"] == 0
+    assert store.summary(second, NOW)["last_day"]["failures"] == 1
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw import cli  # noqa: E402
+from mergbw.packet_trace import RX, TX, PacketTrace  # noqa: E402
+from mergbw.protocol import get_profile  # noqa: E402
+from mergbw.simulator import SimulatedClient  # noqa: E402
+from mergbw.transport import DeviceTransport  # noqa: E402
+
+
+def test_ring_buffer_keeps_latest_entries_in_order():
+    trace = PacketTrace(size=3)
+    for idx in range(5):
+        trace.record(TX, bytes([idx]))
+    entries = trace.export()
+    assert [entry["frame"] for entry in entries] == ["02", "03", "04"]
+    assert entries[0]["t"] == 0.0
+    assert trace.recorded == 5
+
+
+def test_transport_trace_replays_to_same_state(tmp_path, capsys):
+    profile = get_profile("hexagon_light")
+    client = SimulatedClient()
+    transport = DeviceTransport(profile, trace=PacketTrace())
+
+    async def run():
+        await client.start_notify(profile.notify_char_uuid, lambda _s, data: transport.handle_notify(data))
+        await transport.send(client, profile.build_power(True), profile.write_char_uuid)
+        await transport.send(client, profile.build_scene_by_id(7, 5), profile.write_char_uuid)
+        await transport.send(client, profile.build_brightness(100), profile.write_char_uuid)
+
+    asyncio.run(run())
+    entries = transport.trace.export()
+    assert {entry["kind"] for entry in entries} == {"tx", "rx"}
+    assert all(entry["outcome"] == "ok" for entry in entries)
+
+    diagnostics = tmp_path / "diagnostics.json"
+    diagnostics.write_text(json.dumps({"data": {"device": {"packet_trace": entries}}}))
+    assert cli.main(["--profile", "hexagon_light", "replay", "--simulate", "--speed", "0", str(diagnostics)]) == 0
+    out = capsys.readouterr().out
+    expected = {f"0x{cmd:02x}": payload.hex() for cmd, payload in sorted(client.state.items())}
+    assert "final state: " + json.dumps(expected) in out
+
+
+def test_rx_frames_are_recorded():
+    trace = PacketTrace(size=4)
+    trace.record(RX, b"\x55")
+    assert trace.export()[0]["kind"] == "rx"
@@ -0,0 +1,60 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw.presets import PresetLibrary  # noqa: E402
+from mergbw.protocol import decode_packet, get_profile  # noqa: E402
+
+
+def test_preset_compiled_per_supporting_profile():
+    library = PresetLibrary()
+    library.save("evening", {"scene_name": "Aurora", "scene_param": 0x1000, "brightness": 128})
+    hexagon = library.bundle("evening", "hexagon_light")
+    assert [packet[1] for packet in hexagon.packets] == [0x01, 0x06, 0x0F, 0x05]
+    assert decode_packet(hexagon.packets[2])[1] == b"\x10\x00"
+    assert dict(hexagon.updates) == {"_is_on": True, "_effect": "Aurora", "_scene_param": 0x1000, "_brightness": 128}
+    # Sunset has an Aurora scene but no scene parameter.
+    with pytest.raises(ValueError):
+        library.bundle("evening", "sunset_light")
+
+    library.save("red", {"rgb_color": [255, 0, 0]})
+    sunset = library.bundle("red", "auto")
+    assert sunset.packets == tuple(get_profile("sunset_light").build_power(True) + get_profile("sunset_light").build_color(255, 0, 0))
+
+
+def test_scene_name_preset_without_param_clears_the_stored_param():
+    library = PresetLibrary()
+    library.save("aurora", {"scene_name": "Aurora"})
+    bundle = library.bundle("aurora", "hexagon_light")
+    assert dict(bundle.updates) == {"_is_on": True, "_effect": "Aurora", "_scene_param": None}
+
+
+def test_invalid_presets_are_rejected():
+    library = PresetLibrary()
+    with pytest.raises(ValueError):
+        library.save("bad", {"rgb_color": [1, 2, 3], "scene_name": "Aurora"})
+    with pytest.raises(ValueError):
+        library.save("bad", {"power": False, "brightness": 10})
+    with pytest.raises(ValueError):
+        library.save("bad", {"scene_name": "No such scene"})
+    assert "bad" not in library
+
+
+def test_library_stores_definitions_and_recompiles_them_on_load():
+    library = PresetLibrary()
+    library.save("party", {"music_mode": "rhythm", "brightness": 255})
+    library.save("off", {"power": False})
+    stored = json.loads(json.dumps(library.to_dict()))
+    assert stored["party"] == {"definition": {"brightness": 255, "music_mode": "rhythm"}}
+    # Bundles persisted by an older release are ignored and rebuilt.
+    stored["off"]["bundles"] = {"sunset_light": {"packets": ["00"], "updates": {}}}
+    restored = PresetLibrary.from_dict(stored)
+    assert restored.names() == ["off", "party"]
+    assert restored.bundle("party", "hexagon_light") == library.bundle("party", "hexagon_light")
+    assert restored.bundle("off", "sunset_light") == library.bundle("off", "sunset_light")
+    assert dict(restored.bundle("off", "sunset_light").updates) == {"_is_on": False}
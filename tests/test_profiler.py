@@ -0,0 +1,57 @@
+import asyncio
+import cProfile
+import sys
+from importlib import util
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+PROFILER_PATH = ROOT / "custom_components" / "mergbw" / "profiler.py"
+spec = util.spec_from_file_location("custom_components.mergbw.profiler", PROFILER_PATH)
+profiler = util.module_from_spec(spec)
+assert spec and spec.loader
+spec.loader.exec_module(profiler)
+
+
+class DummyConfig:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, name: str) -> str:
+        return str(self.root / name)
+
+
+class DummyHass:
+    def __init__(self, root: Path):
+        self.config = DummyConfig(root)
+
+    async def async_add_executor_job(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def test_cpu_and_memory_reports_written(tmp_path):
+    hass = DummyHass(tmp_path)
+
+    async def run(mode):
+        return await profiler.async_profile(hass, 0.01, mode)
+
+    cpu_path = Path(asyncio.run(run(profiler.PROFILE_MODE_CPU)))
+    mem_path = Path(asyncio.run(run(profiler.PROFILE_MODE_MEMORY)))
+
+    assert cpu_path.parent == tmp_path
+    assert "Top functions by cumulative" in cpu_path.read_text()
+    assert "Top allocations by line" in mem_path.read_text()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="one profiler per thread since Python 3.12")
+def test_cpu_profile_fails_when_another_profiler_is_active(tmp_path):
+    hass = DummyHass(tmp_path)
+    other = cProfile.Profile()
+    other.enable()
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(profiler.async_profile(hass, 0.01, profiler.PROFILE_MODE_CPU))
+    finally:
+        other.disable()
+    assert list(tmp_path.iterdir()) == []
@@ -82,3 +82,12 @@ def test_hexagon_music_and_schedule():
     sched_pkt = p.build_schedule(True, 10, 5, 0x03, False, 20, 10, 0x7F)[0]
     assert sched_pkt[1] == 0x0A
     assert sched_pkt[4:12] == bytes([1, 10, 5, 0x03, 0, 20, 10, 0x7F])
+
+
+def test_decode_and_split_frames():
+    p = HexagonProfile()
+    scene = p.build_scene_by_id(0x0002, None)
+    assert protocol.split_frames(b"".join(scene)) == scene
+    assert protocol.decode_packet(scene[0]) == (0x06, b"\x00\x02")
+    corrupted = scene[0][:-1] + bytes([scene[0][-1] ^ 0xFF])
+    assert protocol.decode_packet(corrupted) is None
@@ -0,0 +1,28 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw import scale  # noqa: E402
+from test_light_validation import light  # noqa: E402 - light platform loaded against HA stubs
+
+BASELINE = Path(__file__).with_name("scale_baseline.json")
+
+
+def test_scale_memory_per_entity_within_baseline():
+    report = asyncio.run(scale.async_run(light, lights=300, rounds=2, import_time=False))
+
+    assert report["memory"]["profiles"] == 1
+    assert report["memory"]["locks"] == 300
+    assert report["broadcast"]["frames"] > 0
+    # Timings depend on the machine; memory per entity does not.
+    assert scale.compare(report, scale.load_baseline(BASELINE), sections=("memory",)) == []
+
+
+def test_compare_reports_growth_beyond_tolerance():
+    baseline = {"memory": {"bytes_per_entity": 1000}, "setup": {"us_per_entity": 10.0}, "import": None}
+    report = {"memory": {"bytes_per_entity": 1300}, "setup": {"us_per_entity": 19.0}, "import": None}
+
+    assert scale.compare(report, baseline) == ["memory.bytes_per_entity: 1300 > 1000 (+25% allowed)"]
@@ -0,0 +1,46 @@
+import sys
+from datetime import datetime, time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw.protocol import get_profile  # noqa: E402
+from mergbw.schedule import PowerSchedule, compile_rules, days_mask  # noqa: E402
+
+
+def test_days_mask_accepts_names_and_masks():
+    assert days_mask(["mon", "Wednesday", "sun"]) == 0b1000101
+    assert days_mask(0xFF) == 0x7F
+
+
+def test_rules_for_one_action_merge_weekdays():
+    schedule = compile_rules(
+        [
+            {"action": "on", "at": "06:45", "days": ["mon", "tue", "wed", "thu", "fri"]},
+            {"action": "on", "at": time(6, 45), "days": ["sat"]},
+            {"action": "off", "at": "22:15:00"},
+        ]
+    )
+    assert schedule == PowerSchedule(True, 6, 45, 0b0111111, True, 22, 15, 0x7F)
+    packet = get_profile("hexagon_light").build_schedule(*schedule.args())[0]
+    assert packet[1] == 0x0A
+
+
+def test_rules_needing_two_timers_are_rejected():
+    with pytest.raises(ValueError):
+        compile_rules([{"action": "on", "at": "07:00"}, {"action": "on", "at": "08:00", "days": ["sat"]}])
+
+
+def test_no_rules_disable_both_timers():
+    schedule = compile_rules([])
+    assert not schedule.on_enabled and not schedule.off_enabled
+    assert schedule.events() == []
+
+
+def test_power_at_respects_weekdays():
+    schedule = compile_rules([{"action": "off", "at": "23:00", "days": ["fri"]}])
+    assert schedule.power_at(datetime(2024, 1, 5, 23, 0)) is False
+    assert schedule.power_at(datetime(2024, 1, 4, 23, 0)) is None
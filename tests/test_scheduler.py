@@ -0,0 +1,62 @@
+import asyncio
+from importlib import util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEDULER_PATH = ROOT / "custom_components" / "mergbw" / "scheduler.py"
+spec = util.spec_from_file_location("mergbw_scheduler", SCHEDULER_PATH)
+scheduler_mod = util.module_from_spec(spec)
+assert spec and spec.loader
+spec.loader.exec_module(scheduler_mod)
+WriteScheduler = scheduler_mod.WriteScheduler
+
+
+def test_round_robin_between_devices_on_one_adapter():
+    order: list[str] = []
+
+    async def run():
+        scheduler = WriteScheduler(packets_per_second=0)
+
+        async def writer(device: str, count: int):
+            for _ in range(count):
+                async with scheduler.slot("hci0", device):
+                    order.append(device)
+                    await asyncio.sleep(0)
+
+        await asyncio.gather(writer("busy", 4), writer("quiet", 2))
+        return scheduler.metrics()
+
+    metrics = asyncio.run(run())
+
+    # The quiet light is interleaved instead of waiting for the busy one.
+    assert order[:4] == ["busy", "quiet", "busy", "quiet"]
+    assert metrics["hci0"]["writes"] == 6
+    assert metrics["hci0"]["device_writes"] == {"busy": 4, "quiet": 2}
+    assert metrics["hci0"]["queue_depth"] == 0
+
+
+def test_adapters_are_scheduled_independently():
+    async def run():
+        scheduler = WriteScheduler(packets_per_second=0)
+        async with scheduler.slot("hci0", "a"):
+            # A second adapter is not blocked by the first one.
+            async with scheduler.slot("proxy", "b"):
+                pass
+        return scheduler.metrics()
+
+    metrics = asyncio.run(run())
+    assert set(metrics) == {"hci0", "proxy"}
+
+
+def test_budget_paces_writes():
+    async def run():
+        scheduler = WriteScheduler(packets_per_second=100)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            async with scheduler.slot(None, "a"):
+                pass
+        return loop.time() - start
+
+    # Three writes at 100 pps need at least two 10 ms gaps.
+    assert asyncio.run(run()) >= 0.018
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw.protocol import get_profile  # noqa: E402
+from mergbw.snapshot import LightSnapshot, scene_id_of  # noqa: E402
+
+
+def test_restore_sends_only_the_colour_a_flash_changed():
+    profile = get_profile("hexagon_light")
+    saved = LightSnapshot(is_on=True, brightness=120, rgb_color=(0, 255, 0))
+    flash = LightSnapshot(is_on=True, brightness=120, rgb_color=(255, 0, 0))
+
+    packets, updates, changed = saved.restore(profile, flash)
+
+    assert packets == profile.build_color(0, 255, 0)
+    assert changed == ["color"]
+    assert updates["_rgb_color"] == (0, 255, 0) and updates["_is_on"] is True
+
+
+def test_restore_turns_back_off_or_does_nothing():
+    profile = get_profile("sunset_light")
+    saved = LightSnapshot(is_on=False, brightness=50, rgb_color=(1, 2, 3))
+
+    assert saved.restore(profile, LightSnapshot(is_on=True, rgb_color=(255, 0, 0))) == (
+        profile.build_power(False),
+        {"_is_on": False},
+        ["power"],
+    )
+    assert saved.restore(profile, LightSnapshot(is_on=False)) == ([], {}, [])
+
+
+def test_restore_resends_scene_id_and_music_mode():
+    profile = get_profile("hexagon_light")
+    flash = LightSnapshot(is_on=False, brightness=255, rgb_color=(255, 0, 0))
+
+    scene = LightSnapshot(is_on=True, brightness=255, effect="Scene 7", scene_param=3)
+    packets, _updates, changed = scene.restore(profile, flash)
+    assert packets == profile.build_power(True) + profile.build_scene_by_id(7, 3)
+    assert changed == ["power", "scene"]
+
+    music = LightSnapshot(is_on=True, brightness=80, music_mode="rhythm")
+    packets, updates, changed = music.restore(profile, flash)
+    assert packets == profile.build_power(True) + profile.build_music_mode("rhythm") + profile.build_brightness(80)
+    assert changed == ["power", "music_mode", "brightness"]
+    assert updates["_music_mode"] == "rhythm"
+
+
+def test_scene_id_of():
+    assert scene_id_of("Scene 12") == 12
+    assert scene_id_of("Rainbow") is None
+    assert scene_id_of(None) is None
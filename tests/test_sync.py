@@ -0,0 +1,62 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw.protocol import get_profile  # noqa: E402
+from mergbw.scheduler import WriteScheduler  # noqa: E402
+from mergbw.simulator import SimulatedClient  # noqa: E402
+from mergbw.sync import async_synchronized_apply  # noqa: E402
+from mergbw.transport import DeviceTransport  # noqa: E402
+
+
+def _participant(connect_delay, transport, client, packets, fail=False):
+    async def participant(staged, release):
+        await asyncio.sleep(connect_delay)
+        if fail:
+            raise RuntimeError("out of range")
+        staged()
+        await release.wait()
+        await transport.send(client, packets, get_profile("hexagon_light").write_char_uuid, paced=False)
+        return time.perf_counter()
+
+    return participant
+
+
+def test_release_waits_for_slowest_light_and_reports_skew():
+    profile = get_profile("hexagon_light")
+    packets = profile.build_scene("Rainbow")
+    # All lights share one adapter whose paced queue would spread them out.
+    scheduler = WriteScheduler(packets_per_second=5)
+    participants = {}
+    clients = {}
+    for idx, delay in enumerate((0.0, 0.05, 0.1, 0.15)):
+        transport = DeviceTransport(profile, scheduler, f"light{idx}")
+        clients[idx] = SimulatedClient(f"light{idx}")
+        asyncio.run(clients[idx].start_notify(profile.notify_char_uuid, lambda _s, data, t=transport: t.handle_notify(data)))
+        participants[f"light.panel_{idx}"] = _participant(delay, transport, clients[idx], packets)
+    participants["light.gone"] = _participant(0.01, None, None, packets, fail=True)
+
+    report = asyncio.run(async_synchronized_apply(participants, stage_timeout=2))
+
+    assert report["released"] == 4
+    assert set(report["failed"]) == {"light.gone"}
+    assert report["stage_ms"] >= 140
+    assert report["skew_ms"] < 50
+    assert all(client.frames == len(packets) for client in clients.values())
+
+
+def test_lights_not_staged_in_time_are_cancelled():
+    profile = get_profile("sunset_light")
+    transport = DeviceTransport(profile)
+    client = SimulatedClient("fast")
+    participants = {
+        "light.fast": _participant(0.0, transport, client, profile.build_power(True)),
+        "light.slow": _participant(5.0, DeviceTransport(profile), SimulatedClient("slow"), profile.build_power(True)),
+    }
+    report = asyncio.run(async_synchronized_apply(participants, stage_timeout=0.1))
+    assert report["released"] == 1
+    assert report["failed"] == {"light.slow": "not staged in time"}
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from mergbw import tracing  # noqa: E402
+from mergbw.protocol import get_profile  # noqa: E402
+from mergbw.simulator import SimulatedClient  # noqa: E402
+from mergbw.transport import DeviceTransport  # noqa: E402
+
+
+def test_child_spans_inherit_trace_and_context():
+    memory = tracing.MemoryExporter()
+    tracer = tracing.Tracer([memory])
+    profile = get_profile("hexagon_light")
+    transport = DeviceTransport(profile)
+    transport.coalescing = False
+
+    async def run():
+        with tracer.start("async_turn_on", context_id="ctx-1", mac="AA"):
+            with tracing.span("queue_wait"):
+                await asyncio.sleep(0)
+            await transport.send(SimulatedClient(), profile.build_power(True) + profile.build_brightness(10), profile.write_char_uuid)
+
+    asyncio.run(run())
+    spans = memory.spans()
+    root = spans[-1]
+    assert root["name"] == "async_turn_on" and root["parent_id"] is None
+    assert [span["name"] for span in spans[:-1]] == ["queue_wait", "pacing", "gatt_write", "pacing", "gatt_write"]
+    assert {span["trace_id"] for span in spans} == {root["trace_id"]}
+    assert {span["context_id"] for span in spans} == {"ctx-1"}
+    assert all(span["parent_id"] == root["span_id"] for span in spans[:-1])
+
+
+def test_span_is_a_noop_without_a_root():
+    with tracing.span("gatt_write") as span:
+        assert span is None
+    assert tracing.current() is None
+
+
+def test_errors_are_recorded_and_traces_filtered():
+    memory = tracing.MemoryExporter()
+    tracer = tracing.Tracer([memory])
+    with pytest.raises(ConnectionError), tracer.start("async_turn_off", mac="AA"), tracing.span("connect"):
+        raise ConnectionError("out of range")
+    with tracer.start("async_turn_off", mac="BB"):
+        pass
+
+    spans = memory.spans(lambda span: span["attributes"].get("mac") == "AA")
+    assert [span["name"] for span in spans] == ["connect", "async_turn_off"]
+    assert spans[0]["error"] == "ConnectionError: out of range"
+
+
+def test_json_lines_exporter_rotates(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.JsonLinesExporter(str(path), max_bytes=200, backups=2)
+    tracer = tracing.Tracer([exporter])
+    for index in range(6):
+        with tracer.start("command", index=index):
+            pass
+
+    assert path.exists() and (tmp_path / "traces.jsonl.1").exists()
+    line = json.loads(path.read_text().splitlines()[-1])
+    assert line["attributes"] == {"index": 5}
+    assert not (tmp_path / "traces.jsonl.3").exists()